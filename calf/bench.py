@@ -0,0 +1,260 @@
+"""
+Calf benchmarks.
+
+Measures the throughput of the lexer, parser and reader over generated corpora, separately for each
+stage: the parser is fed pre-lexed tokens, and the reader pre-parsed forms.  The "values" stage is
+the fused reader (`read_values`) from text to values.  Results may be written as JSON, and compared
+against an earlier run to spot regressions.
+
+    python -m calf.bench --size 1000000 --output bench.json
+    python -m calf.bench --compare bench.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from calf.lexer import lex_buffer
+from calf.parser import parse_stream
+from calf.reader import CalfReader, read_values
+
+
+def _symbol(rand):
+    return rand.choice(["foo", "bar", "baz", "qux", "map", "reduce", "let", "x", "y"]) + \
+        rand.choice(["", "-1", "?", "!", "*", "->str"])
+
+
+def nested_lists(size, rand):
+    """Deeply nested lists."""
+
+    chunks, n = [], 0
+    while n < size:
+        depth = rand.randint(50, 500)
+        form = "(" * depth + _symbol(rand) + ")" * depth + "\n"
+        chunks.append(form)
+        n += len(form)
+    return "".join(chunks)
+
+
+def wide_maps(size, rand):
+    """Maps with many keyword keys."""
+
+    chunks, n = [], 0
+    while n < size:
+        entries = " ".join(f":{_symbol(rand)}{i} {rand.randint(0, 1000)}" for i in range(200))
+        form = "{" + entries + "}\n"
+        chunks.append(form)
+        n += len(form)
+    return "".join(chunks)
+
+
+def long_strings(size, rand):
+    """Long string literals, some with escapes."""
+
+    chunks, n = [], 0
+    while n < size:
+        body = "lorem ipsum dolor sit amet " * rand.randint(10, 200)
+        if rand.random() < 0.5:
+            body += '\\n\\t\\"quoted\\"'
+        form = '"' + body + '"\n'
+        chunks.append(form)
+        n += len(form)
+    return "".join(chunks)
+
+
+def comments(size, rand):
+    """Code buried in comments."""
+
+    chunks, n = [], 0
+    while n < size:
+        form = f";; {'commentary ' * rand.randint(1, 10)}\n({_symbol(rand)}) ; trailing\n"
+        chunks.append(form)
+        n += len(form)
+    return "".join(chunks)
+
+
+def numbers(size, rand):
+    """Vectors of integers and floats."""
+
+    chunks, n = [], 0
+    while n < size:
+        form = "[" + " ".join(
+            str(rand.randint(-10 ** 6, 10 ** 6)) if rand.random() < 0.5
+            else repr(rand.uniform(-1e6, 1e6))
+            for _ in range(100)
+        ) + "]\n"
+        chunks.append(form)
+        n += len(form)
+    return "".join(chunks)
+
+
+def code(size, rand):
+    """Something like real code."""
+
+    chunks, n = [], 0
+    while n < size:
+        name = _symbol(rand)
+        form = (
+            f";; {name} does a thing\n"
+            f"(defn {name}\n"
+            f"  \"Docstring for {name}.\"\n"
+            f"  ^{{:private true}} [a b & more]\n"
+            f"  (let [x (+ a {rand.randint(0, 100)})\n"
+            f"        y {{:key 'value, :other [1 2.5 \"str\"]}}]\n"
+            f"    (if (pos? x) (ns/call x y) #tag [:kw b])))\n\n"
+        )
+        chunks.append(form)
+        n += len(form)
+    return "".join(chunks)
+
+
+CORPORA = {
+    "nested_lists": nested_lists,
+    "wide_maps": wide_maps,
+    "long_strings": long_strings,
+    "comments": comments,
+    "numbers": numbers,
+    "code": code,
+}
+
+
+def _time(f, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _peak(f):
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(text, repeat=3, memory=True):
+    """
+    Benchmarks each stage of reading `text`.
+
+    Returns a mapping of stage name to a dict of seconds, throughput rates and (if `memory`) peak
+    traced memory in bytes.
+    """
+
+    lex = lambda: list(lex_buffer(text))
+    seconds, tokens = _time(lex, repeat)
+
+    parse = lambda: list(parse_stream(iter(tokens)))
+    parse_seconds, forms = _time(parse, repeat)
+
+    read = lambda: list(CalfReader().read(forms))
+    read_seconds, _ = _time(read, repeat)
+
+    values = lambda: list(read_values(text, dispatch=lambda tag, value: value))
+    values_seconds, _ = _time(values, repeat)
+
+    counts = {"tokens": len(tokens), "forms": len(forms), "bytes": len(text.encode("utf-8"))}
+
+    results = {}
+    for stage, s, f in [
+        ("lex", seconds, lex),
+        ("parse", parse_seconds, parse),
+        ("read", read_seconds, read),
+        ("values", values_seconds, values),
+    ]:
+        r = {"seconds": s}
+        for unit, count in counts.items():
+            r[f"{unit}_per_second"] = count / s if s else None
+        if memory:
+            r["peak_bytes"] = _peak(f)
+        results[stage] = r
+
+    return dict(counts, stages=results)
+
+
+def run(size=100000, corpora=None, repeat=3, memory=True, seed=0):
+    """Benchmarks each of the named (default, all) corpora, generated to about `size` bytes."""
+
+    results = {}
+    for name in corpora or CORPORA:
+        text = CORPORA[name](size, random.Random(seed))
+        results[name] = bench(text, repeat, memory)
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "size": size,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def compare(old, new):
+    """Yields (corpus, stage, old seconds, new seconds) for the results common to two runs."""
+
+    for corpus, result in new["results"].items():
+        old_result = old["results"].get(corpus)
+        if not old_result:
+            continue
+        for stage, r in result["stages"].items():
+            old_r = old_result["stages"].get(stage)
+            if old_r:
+                yield corpus, stage, old_r["seconds"], r["seconds"]
+
+
+def _or_nan(x, scale=1):
+    # Rates are None where a stage took no measurable time, and peaks where memory wasn't measured
+    return x / scale if x is not None else float("nan")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--size", type=int, default=100000,
+                        help="approximate size of each corpus in bytes")
+    parser.add_argument("--corpus", action="append", choices=sorted(CORPORA),
+                        help="corpora to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="times to run each stage, reporting the best")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip measuring peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write JSON results to")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    opts = parser.parse_args(argv)
+
+    results = run(opts.size, opts.corpus, opts.repeat, not opts.no_memory, opts.seed)
+
+    print(f"{'corpus':<14} {'stage':<6} {'seconds':>9} {'tokens/s':>12} {'forms/s':>10} "
+          f"{'MB/s':>7} {'peak MB':>8}")
+    for corpus, result in results["results"].items():
+        for stage, r in result["stages"].items():
+            print(f"{corpus:<14} {stage:<6} {r['seconds']:>9.4f} "
+                  f"{_or_nan(r['tokens_per_second']):>12.0f} "
+                  f"{_or_nan(r['forms_per_second']):>10.0f} "
+                  f"{_or_nan(r['bytes_per_second'], 1e6):>7.2f} "
+                  f"{_or_nan(r.get('peak_bytes'), 1e6):>8.2f}")
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            old = json.load(f)
+        print()
+        print(f"{'corpus':<14} {'stage':<6} {'old':>9} {'new':>9} {'change':>8}")
+        for corpus, stage, old_s, new_s in compare(old, results):
+            change = new_s / old_s - 1 if old_s else float("nan")
+            print(f"{corpus:<14} {stage:<6} {old_s:>9.4f} {new_s:>9.4f} {change:>+8.1%}")
+
+    if opts.output:
+        with open(opts.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""
+A binary encoding of Calf values.
+
+Encodes the `calf.types` value space (symbols, keywords, maps, vectors, sets, strings, integers and
+floats) compactly, for shipping read forms between processes without printing and re-reading them.
+
+A stream is the magic bytes `CALF`, a varint format version, and then any number of values.  Each
+value is a tag byte followed by:
+
+  - INTEGER: a zigzag varint, of any size
+  - FLOAT: an IEEE 754 double, little endian
+  - STRING: a varint length, and that many bytes of UTF-8
+  - SYMBOL, KEYWORD: the namespace (a varint of its length plus one, zero being None) and name
+  - REF: a varint index into the table of symbols and keywords
+  - VECTOR, SET: a varint count, and that many values
+  - MAP: a varint count, and that many key, value pairs
+
+The first occurrence of each symbol and keyword in a stream is written out in full, and assigned the
+next index in the table.  Later occurrences are written as references.
+
+Neither encoding nor decoding recurses, so arbitrarily deep values may be encoded.  Decoding accepts
+any bytes-like object and reads a `memoryview` of it, so no input is copied.
+"""
+
+import struct
+
+from calf.types import Keyword, Map, Set, Symbol, Vector
+
+
+MAGIC = b"CALF"
+
+VERSION = 1
+
+INTEGER, FLOAT, STRING, SYMBOL, KEYWORD, REF, VECTOR, SET, MAP = range(1, 10)
+
+_DOUBLE = struct.Struct("<d")
+
+
+class DecodeError(ValueError):
+    """
+    Raised when decoding data which isn't a (complete) encoding of Calf values.
+    """
+
+
+class _Incomplete(Exception):
+    """
+    Raised internally when a value runs past the end of the data.
+
+    Decoding a value re-raises it with the position of the item the value ends within.
+    """
+
+
+def _varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _string(out, s):
+    data = s.encode("utf-8")
+    _varint(out, len(data))
+    out += data
+
+
+def _name(out, namespace, name):
+    if namespace is None:
+        out.append(0)
+    else:
+        data = namespace.encode("utf-8")
+        _varint(out, len(data) + 1)
+        out += data
+    _string(out, name)
+
+
+class Encoder(object):
+    """
+    Streaming encoder.
+
+    Each call to `encode()` returns the bytes encoding one more value of the stream, the first
+    including the stream header.  Symbols and keywords are shared across all the values encoded.
+    """
+
+    def __init__(self):
+        self._table = {}
+        self._started = False
+
+    def header(self) -> bytes:
+        """Returns the stream header, if it hasn't already been returned."""
+
+        if self._started:
+            return b""
+
+        out = bytearray(MAGIC)
+        _varint(out, VERSION)
+        self._started = True
+        return bytes(out)
+
+    def encode(self, value) -> bytes:
+        """Returns the encoding of `value`, as the next value of the stream."""
+
+        out = bytearray(self.header())
+
+        table = self._table
+        stack = [iter((value,))]
+        while stack:
+            v = next(stack[-1], _END)
+            if v is _END:
+                stack.pop()
+                continue
+
+            cls = type(v)
+            if cls is Symbol or cls is Keyword:
+                key = (cls, v.namespace, v.name)
+                ref = table.get(key)
+                if ref is not None:
+                    out.append(REF)
+                    _varint(out, ref)
+                else:
+                    table[key] = len(table)
+                    out.append(SYMBOL if cls is Symbol else KEYWORD)
+                    _name(out, v.namespace, v.name)
+
+            elif cls is str:
+                out.append(STRING)
+                _string(out, v)
+
+            elif cls is int:
+                out.append(INTEGER)
+                _varint(out, v << 1 if v >= 0 else (-v << 1) - 1)
+
+            elif cls is float:
+                out.append(FLOAT)
+                out += _DOUBLE.pack(v)
+
+            elif isinstance(v, Map):
+                out.append(MAP)
+                _varint(out, len(v))
+                stack.append(_items(v))
+
+            elif isinstance(v, (Vector, Set)):
+                out.append(VECTOR if isinstance(v, Vector) else SET)
+                _varint(out, len(v))
+                stack.append(iter(v))
+
+            # Subclasses of the scalar types, such as tokens
+            else:
+                base = next((b for b in (str, int, float) if isinstance(v, b)), None)
+                if base is None or isinstance(v, bool):
+                    raise TypeError(f"Can't encode {v!r} ({cls})")
+                stack.append(iter((base(v),)))
+
+        return bytes(out)
+
+
+_END = object()
+
+
+def _items(m):
+    for k, v in m.items():
+        yield k
+        yield v
+
+
+class Decoder(object):
+    """
+    Streaming decoder.
+
+    `feed()` accepts the bytes of a stream in arbitrary chunks, returning the values they complete.
+    `close()` signals the end of the stream, returning any remaining values, and raising
+    `DecodeError` if it ends within a value.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._table = []
+        self._started = False
+        # Frames of the collections of a value the buffer ends within. The buffer starts at the item
+        # they're waiting on, so decoding resumes there rather than at the start of the value.
+        self._stack = []
+
+    def feed(self, data) -> list:
+        """Adds data to the decoder, returning a list of the values it completes."""
+
+        self._buffer += data
+        return self._feed()
+
+    def _feed(self):
+        view = memoryview(self._buffer)
+        try:
+            values, pos = self._decode(view)
+        finally:
+            view.release()
+
+        del self._buffer[:pos]
+        return values
+
+    def close(self) -> list:
+        """Ends the stream, returning a list of any remaining values."""
+
+        values = self._feed()
+        if self._buffer or self._stack or not self._started:
+            raise DecodeError("Truncated stream")
+        return values
+
+    def _decode(self, view):
+        pos = 0
+        if not self._started:
+            try:
+                pos = _header(view)
+            except _Incomplete:
+                return [], 0
+            self._started = True
+
+        values = []
+        while pos < len(view):
+            try:
+                value, pos = _value(view, pos, self._table, self._stack)
+            except _Incomplete as e:
+                pos = e.args[0]
+                break
+            values.append(value)
+
+        return values, pos
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    try:
+        while True:
+            b = data[pos]
+            pos += 1
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n, pos
+            shift += 7
+    except IndexError:
+        raise _Incomplete()
+
+
+def _read_str(data, pos, n):
+    end = pos + n
+    if end > len(data):
+        raise _Incomplete()
+    try:
+        return str(data[pos:end], "utf-8"), end
+    except UnicodeDecodeError:
+        raise DecodeError(f"Bad UTF-8 string at {pos}")
+
+
+def _header(data):
+    if len(data) < len(MAGIC):
+        raise _Incomplete()
+    if bytes(data[: len(MAGIC)]) != MAGIC:
+        raise DecodeError("Not a Calf binary stream")
+
+    version, pos = _read_varint(data, len(MAGIC))
+    if version != VERSION:
+        raise DecodeError(f"Unsupported format version {version}")
+    return pos
+
+
+def _value(data, pos, table, stack=None):
+    """
+    Decodes one value starting at `pos`. Returns the pair (value, end).
+
+    `stack` holds the frames of any collections decoding is resumed within, and is left holding those
+    the data ends within.
+    """
+
+    # Frames are [tag, remaining, items] of collections being decoded
+    if stack is None:
+        stack = []
+    while True:
+        start = pos
+        try:
+            tag = data[pos]
+            pos += 1
+
+            if tag == INTEGER:
+                n, pos = _read_varint(data, pos)
+                value = (n >> 1) ^ -(n & 1)
+
+            elif tag == REF:
+                n, pos = _read_varint(data, pos)
+                try:
+                    value = table[n]
+                except IndexError:
+                    raise DecodeError(f"Bad reference {n} at {pos}")
+
+            elif tag == STRING:
+                n, pos = _read_varint(data, pos)
+                value, pos = _read_str(data, pos, n)
+
+            elif tag == FLOAT:
+                if pos + 8 > len(data):
+                    raise _Incomplete()
+                (value,), pos = _DOUBLE.unpack_from(data, pos), pos + 8
+
+            elif tag == VECTOR or tag == SET or tag == MAP:
+                n, pos = _read_varint(data, pos)
+                if n:
+                    stack.append([tag, n * 2 if tag == MAP else n, []])
+                    continue
+                value = Vector.of([]) if tag == VECTOR else Set.of([]) if tag == SET else Map.of({})
+
+            elif tag == SYMBOL or tag == KEYWORD:
+                n, pos = _read_varint(data, pos)
+                if n:
+                    namespace, pos = _read_str(data, pos, n - 1)
+                else:
+                    namespace = None
+                n, pos = _read_varint(data, pos)
+                name, pos = _read_str(data, pos, n)
+                value = (Symbol if tag == SYMBOL else Keyword)(name, namespace)
+                table.append(value)
+
+            else:
+                raise DecodeError(f"Bad tag {tag} at {pos - 1}")
+
+        except (_Incomplete, IndexError):
+            raise _Incomplete(start)
+
+        while stack:
+            frame = stack[-1]
+            frame[2].append(value)
+            frame[1] -= 1
+            if frame[1]:
+                break
+
+            stack.pop()
+            tag, _, items = frame
+            if tag == VECTOR:
+                value = Vector.of(items)
+            elif tag == SET:
+                value = Set.of(items)
+            else:
+                i = iter(items)
+                value = Map.of(dict(zip(i, i)))
+
+        else:
+            return value, pos
+
+
+def dumps(values) -> bytes:
+    """Returns the encoding of a sequence of values."""
+
+    encoder = Encoder()
+    return encoder.header() + b"".join(encoder.encode(v) for v in values)
+
+
+def dump(values, fp):
+    """Writes the encoding of a sequence of values to a binary file, a value at a time."""
+
+    encoder = Encoder()
+    fp.write(encoder.header())
+    for value in values:
+        fp.write(encoder.encode(value))
+
+
+def iterloads(data):
+    """
+    Lazily decodes the values encoded in a bytes-like object.
+
+    Reads the data through a `memoryview`, without copying it.
+    """
+
+    data = memoryview(data).cast("B")
+    table = []
+    try:
+        pos = _header(data)
+        while pos < len(data):
+            value, pos = _value(data, pos, table)
+            yield value
+    except _Incomplete:
+        raise DecodeError("Truncated stream")
+
+
+def loads(data) -> list:
+    """Returns a list of the values encoded in a bytes-like object."""
+
+    return list(iterloads(data))
+
+
+def load(fp, size=1 << 16):
+    """Lazily decodes the values encoded in a binary file, reading it `size` bytes at a time."""
+
+    decoder = Decoder()
+    while True:
+        chunk = fp.read(size)
+        if not chunk:
+            break
+        yield from decoder.feed(chunk)
+    yield from decoder.close()
@@ -0,0 +1,178 @@
+"""
+A persistent, on-disk cache of parsed and read forms.
+
+Entries are keyed by a hash of the cache format, the grammar, the source name and the source text,
+so editing a file or the grammar (`calf.grammar.TOKENS`) simply misses the cache.  Entries are written atomically, so
+any number of processes may share one cache directory.  The directory is kept under a size bound by
+evicting the least recently used entries.
+
+Entries are pickles, so a cache directory must only be shared by trusting parties.
+"""
+
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+
+from calf.grammar import MATCHING, TOKENS
+
+# The version of the cached values. Bump it whenever the classes of tokens or values, or how they're
+# pickled, change.
+FORMAT_VERSION = "1"
+
+GRAMMAR_VERSION = hashlib.sha256(repr((TOKENS, MATCHING)).encode("utf-8")).hexdigest()
+
+
+def default_cache_dir():
+    """$CALF_CACHE_DIR, or else ~/.cache/calf."""
+
+    return os.environ.get("CALF_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "calf"
+    )
+
+
+def decode_source(data):
+    """Decodes the bytes of a source file as they would be read in text mode."""
+
+    return io.IncrementalNewlineDecoder(None, translate=True).decode(
+        data.decode("utf-8"), final=True
+    )
+
+
+class CalfCache(object):
+    """
+    A directory of cached values.
+
+    `max_size` bounds the total size in bytes of the entries in the directory.  Rather than scanning
+    the directory on every `put`, the total is estimated from the first scan plus the size of each
+    entry written since.  The directory is only scanned again once the estimate passes `max_size`,
+    evicting entries down to three quarters of it.  Entries written by other processes are only
+    counted by the next scan.
+    """
+
+    SUFFIX = ".calfc"
+
+    def __init__(self, path=None, max_size=256 * 1024 * 1024):
+        self.path = path or default_cache_dir()
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+        # The estimated total size of the entries, or None before the directory is first scanned
+        self._size = None
+
+    def key(self, kind, source, data):
+        """The key of the `kind` (e.g. "parse") of result of the bytes `data` read from `source`."""
+
+        h = hashlib.sha256()
+        for part in (FORMAT_VERSION, GRAMMAR_VERSION, kind, str(source)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        h.update(data)
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key + self.SUFFIX)
+
+    def get(self, key, default=None):
+        """Returns the value cached under `key`, or `default`."""
+
+        entry = self._entry(key)
+        try:
+            f = open(entry, "rb")
+        except OSError:
+            return default
+
+        # Entries may be truncated, or written by other versions, which can raise almost anything
+        try:
+            with f:
+                value = pickle.load(f)
+        except Exception:
+            try:
+                os.unlink(entry)
+            except OSError:
+                pass
+            return default
+
+        # Entries are evicted least recently used first
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+        return value
+
+    def put(self, key, value):
+        """Caches `value` under `key`, evicting old entries as required."""
+
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp, self._entry(key))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        if self._size is not None:
+            self._size += size
+        if self._size is None or self._size > self.max_size:
+            # Leave some slack, so that the next few puts don't each rescan
+            self.evict(self.max_size * 3 // 4)
+
+    def evict(self, target=None):
+        """Removes least recently used entries until the cache fits in `target` (or `max_size`)."""
+
+        if target is None:
+            target = self.max_size
+
+        entries = []
+        for e in os.scandir(self.path):
+            if e.name.endswith(self.SUFFIX):
+                try:
+                    stat = e.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, e.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                # Another process may have gotten there first
+                pass
+            total -= size
+
+        self._size = total
+
+    def clear(self):
+        for e in os.scandir(self.path):
+            if e.name.endswith(self.SUFFIX):
+                try:
+                    os.unlink(e.path)
+                except OSError:
+                    pass
+        self._size = 0
+
+    def cached(self, kind, path, compute):
+        """
+        Returns the cached `kind` of result for the file at `path`, or computes it from the file's
+        text with `compute` and caches it.
+        """
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        key = self.key(kind, path, data)
+        miss = object()
+        value = self.get(key, miss)
+        if value is miss:
+            value = compute(decode_source(data))
+            self.put(key, value)
+        return value
@@ -0,0 +1,447 @@
+"""
+A lossless concrete syntax tree.
+
+Refactoring tools want to edit a tree and print it back out, leaving everything they didn't touch
+(whitespace and comments included) exactly as it was.  Parse trees are poorly suited to this: every
+token carries its absolute position, so an edit must move every token after it.
+
+This is a "red/green" tree.  Green nodes are immutable, know only their kind, children and width
+(their length in characters), and are hash-consed by a `GreenCache`, so that equal subtrees are a
+single object, shared between all the versions of a tree and all the places they occur.  Red nodes
+are thin, lazily created wrappers giving a green node its parent and absolute offset within one
+version of the tree.
+
+Editing a node builds new green nodes for it and its ancestors only, and returns a new tree.  The
+old tree is unchanged, and shares everything else with the new one.
+
+    >>> tree = parse_tree("(foo bar) ; baz")
+    >>> bar = tree.find(5)
+    >>> bar.text(), bar.offset
+    ('bar', 5)
+    >>> tree.replace(bar, "qux").text()
+    '(foo qux) ; baz'
+"""
+
+from bisect import bisect_right
+from heapq import heappop, heappush
+from itertools import accumulate
+from operator import attrgetter
+import weakref
+
+from calf.grammar import MATCHING
+from calf.io.reader import LineIndex
+from calf.lexer import lex_buffer
+from calf.parser import parse_stream
+from calf.token import (
+    CalfDictToken,
+    CalfDispatchToken,
+    CalfListToken,
+    CalfMetaToken,
+    CalfQuoteToken,
+    CalfStrToken,
+)
+
+
+_width = attrgetter("width")
+
+
+class GreenToken(object):
+    """A leaf of a green tree: a token of some kind (such as "SYMBOL" or "WHITESPACE"), and its text."""
+
+    __slots__ = ("kind", "text", "width", "__weakref__")
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+        self.width = len(text)
+
+    children = ()
+
+    def __repr__(self):
+        return f"<GreenToken:{self.kind} {self.text!r}>"
+
+
+class GreenNode(object):
+    """
+    An interior node of a green tree: a node of some kind (a collection or reader macro type, or
+    "ROOT"), and its children, including delimiters, whitespace and comments.
+    """
+
+    __slots__ = ("kind", "children", "width", "_offsets", "__weakref__")
+
+    def __init__(self, kind, children):
+        self.kind = kind
+        self.children = children
+        self.width = sum(map(_width, children))
+        self._offsets = None
+
+    @property
+    def offsets(self):
+        """The offset of each child, relative to the start of the node."""
+
+        if self._offsets is None:
+            self._offsets = [0]
+            self._offsets.extend(accumulate(map(_width, self.children[:-1])))
+        return self._offsets
+
+    def __repr__(self):
+        return f"<GreenNode:{self.kind} {len(self.children)} children, width {self.width}>"
+
+
+def green_text(green):
+    """Returns the text of a green node."""
+
+    if isinstance(green, GreenToken):
+        return green.text
+
+    chunks = []
+    stack = [iter(green.children)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, GreenToken):
+                chunks.append(child.text)
+            else:
+                stack.append(iter(child.children))
+                break
+        else:
+            stack.pop()
+    return "".join(chunks)
+
+
+class GreenCache(object):
+    """
+    Hash-conses green nodes, so that there's only ever one live node of a given kind and children.
+
+    As children are themselves hash-consed, nodes are found by the identity of their children.  The
+    cache holds nodes weakly, so it only shares nodes while some tree still uses them.
+    """
+
+    def __init__(self):
+        self._tokens = weakref.WeakValueDictionary()
+        self._nodes = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._tokens) + len(self._nodes)
+
+    def token(self, kind, text):
+        key = (kind, text)
+        green = self._tokens.get(key)
+        if green is None:
+            self.misses += 1
+            green = self._tokens[key] = GreenToken(kind, text)
+        else:
+            self.hits += 1
+        return green
+
+    def node(self, kind, children):
+        children = tuple(children)
+        key = (kind, children)
+        green = self._nodes.get(key)
+        if green is None:
+            self.misses += 1
+            green = self._nodes[key] = GreenNode(kind, children)
+        else:
+            self.hits += 1
+        return green
+
+    def stats(self):
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+
+# The cache shared by default between all trees
+CACHE = GreenCache()
+
+_OPENS = {
+    "LIST": "PAREN_LEFT",
+    "SQLIST": "BRACKET_LEFT",
+    "DICT": "BRACE_LEFT",
+}
+
+_TEXTS = {
+    "PAREN_LEFT": "(",
+    "PAREN_RIGHT": ")",
+    "BRACKET_LEFT": "[",
+    "BRACKET_RIGHT": "]",
+    "BRACE_LEFT": "{",
+    "BRACE_RIGHT": "}",
+    "META": "^",
+    "MACRO_DISPATCH": "#",
+    "SINGLE_QUOTE": "'",
+}
+
+
+def _parts(form):
+    """The (open, children, close) of a parsed form, or None if it's a token."""
+
+    if isinstance(form, CalfListToken):
+        open = _OPENS[form.type]
+        return open, form, MATCHING[open]
+    elif isinstance(form, CalfDictToken):
+        elements = getattr(form, "elements", None)
+        if elements is None:
+            elements = [x for pair in form.value for x in pair]
+        return "BRACE_LEFT", elements, "BRACE_RIGHT"
+    elif isinstance(form, CalfMetaToken):
+        return "META", getattr(form, "elements", None) or [form.meta, form.value], None
+    elif isinstance(form, CalfDispatchToken):
+        return "MACRO_DISPATCH", getattr(form, "elements", None) or [form.tag, form.value], None
+    elif isinstance(form, CalfQuoteToken):
+        return "SINGLE_QUOTE", getattr(form, "elements", None) or [form.value], None
+
+
+def green_forms(forms, cache=None):
+    """
+    Builds the green nodes of a sequence of parsed forms.
+
+    The forms should have been parsed with whitespace and comments kept (see `parse_stream`), for
+    the green nodes to be lossless.
+    """
+
+    cache = cache or CACHE
+    token = cache.token
+
+    greens = []
+    # Frames are (kind, close token type, remaining children, green children)
+    stack = [(None, None, iter(forms), greens)]
+    while stack:
+        kind, close, children, built = stack[-1]
+        for form in children:
+            parts = _parts(form)
+            if parts is None:
+                text = form.raw if isinstance(form, CalfStrToken) else form.value
+                built.append(token(form.type, text))
+            else:
+                open, elements, closing = parts
+                stack.append((form.type, closing, iter(elements), [token(open, _TEXTS[open])]))
+                break
+        else:
+            stack.pop()
+            if stack:
+                if close is not None:
+                    built.append(token(close, _TEXTS[close]))
+                stack[-1][3].append(cache.node(kind, built))
+
+    return greens
+
+
+def green_buffer(buffer, source="<Buffer>", cache=None):
+    """Parses a buffer into a "ROOT" green node of its forms, whitespace and comments."""
+
+    cache = cache or CACHE
+    forms = parse_stream(lex_buffer(buffer, source),
+                         discard_whitespace=False,
+                         discard_comments=False)
+    return cache.node("ROOT", green_forms(forms, cache))
+
+
+class RedNode(object):
+    """
+    A green node at a position in a `SyntaxTree`.
+
+    Red nodes are made on demand, as the tree is walked, and aren't shared between versions.
+    """
+
+    __slots__ = ("green", "parent", "index", "offset", "tree", "_children")
+
+    def __init__(self, green, parent, index, offset, tree):
+        self.green = green
+        self.parent = parent
+        self.index = index
+        self.offset = offset
+        self.tree = tree
+        self._children = None
+
+    def __repr__(self):
+        return f"<RedNode:{self.kind} {self.offset}:{self.end}>"
+
+    @property
+    def kind(self):
+        return self.green.kind
+
+    @property
+    def width(self):
+        return self.green.width
+
+    @property
+    def end(self):
+        return self.offset + self.green.width
+
+    @property
+    def is_token(self):
+        return isinstance(self.green, GreenToken)
+
+    @property
+    def line(self):
+        """The (1-indexed) line on which the node starts."""
+        return self.tree.lines.line(self.offset)
+
+    @property
+    def column(self):
+        """The (0-indexed) column at which the node starts."""
+        return self.tree.lines.column(self.offset)
+
+    def __len__(self):
+        return len(self.green.children)
+
+    def child(self, i):
+        """The red node of the `i`th child of this node.  Only the children visited are made."""
+
+        if self._children is None:
+            self._children = [None] * len(self.green.children)
+        red = self._children[i]
+        if red is None:
+            red = self._children[i] = RedNode(
+                self.green.children[i], self, i, self.offset + self.green.offsets[i], self.tree
+            )
+        return red
+
+    @property
+    def children(self):
+        """The red nodes of the children of this node."""
+        return [self.child(i) for i in range(len(self.green.children))]
+
+    def text(self):
+        return green_text(self.green)
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def walk(self):
+        """Produces this node and all its descendants, in order."""
+
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def find(self, offset):
+        """Returns the innermost node (a token) spanning `offset`, or None if it's out of range."""
+
+        if not self.offset <= offset < self.end:
+            return None
+
+        node = self
+        while not node.is_token:
+            node = node.child(bisect_right(node.green.offsets, offset - node.offset) - 1)
+        return node
+
+
+class SyntaxTree(object):
+    """
+    One version of a lossless syntax tree.
+
+    `root` is the red node of the "ROOT" green node, whose children are the top level forms,
+    whitespace and comments of the buffer.
+    """
+
+    def __init__(self, green, source="<Buffer>", cache=None):
+        self.green = green
+        self.source = source
+        self.cache = cache or CACHE
+        self.root = RedNode(green, None, 0, 0, self)
+        self._lines = None
+
+    def __repr__(self):
+        return f"<SyntaxTree {self.source!r} width {self.green.width}>"
+
+    @property
+    def lines(self):
+        """The `LineIndex` of the text of the tree, built on demand."""
+
+        if self._lines is None:
+            self._lines = LineIndex(self.text())
+        return self._lines
+
+    def text(self):
+        return green_text(self.green)
+
+    def find(self, offset):
+        return self.root.find(offset)
+
+    def parse(self, text):
+        """Parses text into green nodes, sharing them with this tree where possible."""
+
+        return list(green_buffer(text, self.source, self.cache).children)
+
+    def replace(self, node, *replacements):
+        """
+        Returns a new version of the tree, in which `node` (a red node of this version) is replaced
+        by any number of green nodes, or text to be parsed into them.
+
+        Only `node` and its ancestors are rebuilt.  Everything else is shared with this version.  The
+        new version isn't re-parsed, so it's up to the caller that its text still parses.
+        """
+
+        return self.edit([(node, replacements)])
+
+    def edit(self, edits):
+        """
+        Returns a new version of the tree, with many nodes replaced at once.
+
+        `edits` are pairs of a red node of this version, and a sequence of its replacements (as for
+        `replace`).  Each ancestor of the nodes is rebuilt once, however many of them it contains.
+        Raises ValueError if one of the nodes contains another.
+        """
+
+        # The replaced children of each parent, by index, keyed by the parent's id
+        parents = {}
+        # A heap of (-depth, id) of the parents, so that the deepest are rebuilt first, after all
+        # their descendants
+        pending = []
+        for node, replacements in edits:
+            if node.tree is not self:
+                raise ValueError("Can't replace a node of another version of the tree")
+            elif node.parent is None:
+                raise ValueError("Can't replace the root of a tree")
+
+            greens = []
+            for r in replacements:
+                if isinstance(r, str):
+                    greens.extend(self.parse(r))
+                else:
+                    greens.append(r)
+
+            parent = node.parent
+            if id(parent) not in parents:
+                parents[id(parent)] = (parent, {})
+                heappush(pending, (-sum(1 for _ in parent.ancestors()), id(parent)))
+            parents[id(parent)][1][node.index] = greens
+
+        cache = self.cache
+        green = self.green
+        while pending:
+            depth, key = heappop(pending)
+            parent, replaced = parents[key]
+            children = []
+            for i, child in enumerate(parent.green.children):
+                children.extend(replaced.get(i, (child,)))
+            green = cache.node(parent.kind, children)
+
+            grandparent = parent.parent
+            if grandparent is not None:
+                entry = parents.get(id(grandparent))
+                if entry is None:
+                    entry = parents[id(grandparent)] = (grandparent, {})
+                    heappush(pending, (depth + 1, id(grandparent)))
+                elif parent.index in entry[1]:
+                    raise ValueError(f"Overlapping edits of {parent!r}")
+                entry[1][parent.index] = (green,)
+
+        return SyntaxTree(green, self.source, cache)
+
+    def remove(self, node):
+        """Returns a new version of the tree, without `node`."""
+
+        return self.replace(node)
+
+
+def parse_tree(buffer, source="<Buffer>", cache=None) -> SyntaxTree:
+    """Parses a buffer into a `SyntaxTree`.  Raises the same errors as `parse_stream`."""
+
+    return SyntaxTree(green_buffer(buffer, source, cache), source, cache)
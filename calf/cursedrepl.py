@@ -5,6 +5,8 @@ Some shared scaffolding for building terminal "REPL" drivers.
 import curses
 from curses.textpad import Textbox, rectangle
 
+from calf.scanner import is_complete
+
 
 def curse_repl(handle_buffer):
 
@@ -24,7 +26,7 @@ def curse_repl(handle_buffer):
             maxy, maxx = stdscr.getmaxyx()
             stdscr.clear()
 
-            stdscr.addstr(0, 0, "Enter example: (hit Ctrl-G to execute, Ctrl-C to exit)", curses.A_BOLD)
+            stdscr.addstr(0, 0, "Enter example: (hit Enter after a complete example or Ctrl-G to execute, Ctrl-C to exit)", curses.A_BOLD)
             editwin = curses.newwin(5, maxx - 4,
                                     2, 2)
             rectangle(stdscr,
@@ -66,8 +68,17 @@ def curse_repl(handle_buffer):
 
             # Readf rom the user
             box = Textbox(editwin)
+
+            def validate(ch):
+                # Enter executes a complete example, rather than starting a new line
+                if ch == ord("\n"):
+                    buff = box.gather().strip()
+                    if buff and is_complete(buff):
+                        return 7  # Ctrl-G
+                return ch
+
             try:
-                box.edit()
+                box.edit(validate)
             except KeyboardInterrupt:
                 break
 
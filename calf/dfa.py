@@ -0,0 +1,475 @@
+"""
+A lazily constructed DFA over a Calf token grammar.
+
+The lexer's contract is "incremental": a token is the longest run of characters such that EVERY
+prefix of the run is fully matched by at least one rule which also matched all the shorter prefixes.
+When more than one rule survives to the end of a token, the "first" rule in token list order wins.
+
+Rather than re-running `re.fullmatch` for every rule against every prefix, this module compiles all
+the rules of a grammar into one Thompson NFA, and then builds DFA states out of it on demand (subset
+construction) as characters are actually seen.  Each DFA state is a set of NFA states, after
+discarding the states of any rule which failed to match the prefix consumed so far.  Transitions are
+memoized per character, so steady state lexing costs one dict lookup per character.
+
+Only the subset of Python regex syntax which can be expressed as a regular language is supported.
+Grammars using anchors, backreferences, lookaround or inline flags raise `GrammarCompileError`, and
+the lexer falls back to its incremental regex engine for them.
+
+Either way a grammar is compiled once, to a `CompiledGrammar` (see `compile_grammar()`), which holds
+the compiled pattern of each rule, the DFA if any, and an index of the rules each character may
+start, which prunes the rules the incremental engine tries.
+"""
+
+import re
+
+from calf import profiling
+from calf.grammar import TOKENS
+from calf.util import memoize
+
+
+class GrammarCompileError(ValueError):
+    """
+    Raised when a token pattern cannot be compiled to an automaton.
+    """
+
+
+_QUANTIFIER = re.compile(r"\{(\d*)(,(\d*))?\}")
+
+_ESCAPE_WIDTHS = {"x": 2, "u": 4, "U": 8}
+
+
+class _PatternParser(object):
+    """
+    A recursive descent parser for the regular subset of Python's regex syntax.
+
+    Produces a small tuple AST:
+
+      ("atom", source)        - a single character matching the regex `source`
+      ("cat", [nodes])        - concatenation
+      ("alt", [nodes])        - alternation
+      ("rep", node, min, max) - repetition, max of None being unbounded
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.pos = 0
+
+    def error(self, msg):
+        return GrammarCompileError(
+            "%s at %d in pattern %r" % (msg, self.pos, self.pattern)
+        )
+
+    def peek(self):
+        if self.pos < len(self.pattern):
+            return self.pattern[self.pos]
+
+    def parse(self):
+        node = self.alt()
+        if self.pos != len(self.pattern):
+            raise self.error("Unbalanced parenthesis")
+        return node
+
+    def alt(self):
+        branches = [self.cat()]
+        while self.peek() == "|":
+            self.pos += 1
+            branches.append(self.cat())
+        return branches[0] if len(branches) == 1 else ("alt", branches)
+
+    def cat(self):
+        items = []
+        while self.peek() is not None and self.peek() not in "|)":
+            items.append(self.quantified())
+        return items[0] if len(items) == 1 else ("cat", items)
+
+    def quantified(self):
+        node = self.atom()
+
+        while True:
+            chr = self.peek()
+            if chr == "*":
+                self.pos += 1
+                node = ("rep", node, 0, None)
+            elif chr == "+":
+                self.pos += 1
+                node = ("rep", node, 1, None)
+            elif chr == "?":
+                self.pos += 1
+                node = ("rep", node, 0, 1)
+            elif chr == "{" and self._quantifier():
+                m = _QUANTIFIER.match(self.pattern, self.pos)
+                self.pos = m.end()
+                lo = int(m.group(1) or 0)
+                if m.group(2) is None:
+                    hi = lo
+                else:
+                    hi = int(m.group(3)) if m.group(3) else None
+                node = ("rep", node, lo, hi)
+            else:
+                return node
+
+            # Laziness doesn't change the language being matched, only which match is found.
+            if self.peek() == "?":
+                self.pos += 1
+            elif self.peek() == "+":
+                raise self.error("Possessive quantifiers are not supported")
+
+    def _quantifier(self):
+        m = _QUANTIFIER.match(self.pattern, self.pos)
+        return m is not None and (m.group(1) or m.group(2) is not None)
+
+    def atom(self):
+        start = self.pos
+        chr = self.peek()
+
+        if chr == "(":
+            self.pos += 1
+            if self.pattern.startswith("?:", self.pos):
+                self.pos += 2
+            elif self.pattern.startswith("?P<", self.pos):
+                end = self.pattern.find(">", self.pos)
+                if end == -1:
+                    raise self.error("Unterminated group name")
+                self.pos = end + 1
+            elif self.peek() == "?":
+                raise self.error("Unsupported group")
+            node = self.alt()
+            if self.peek() != ")":
+                raise self.error("Missing )")
+            self.pos += 1
+            return node
+
+        elif chr == "[":
+            self.pos += 1
+            if self.peek() == "^":
+                self.pos += 1
+            # A leading ] is a literal member of the class
+            if self.peek() == "]":
+                self.pos += 1
+            while self.peek() != "]":
+                if self.peek() is None:
+                    raise self.error("Unterminated character set")
+                if self.peek() == "\\":
+                    self.pos += 1
+                self.pos += 1
+            self.pos += 1
+
+        elif chr == "\\":
+            self.pos += 1
+            esc = self.peek()
+            if esc is None:
+                raise self.error("Dangling escape")
+            elif esc in "AbBZ" or esc.isdigit():
+                raise self.error("Unsupported escape")
+            elif esc in _ESCAPE_WIDTHS:
+                self.pos += _ESCAPE_WIDTHS[esc]
+            elif esc == "N":
+                self.pos = self.pattern.find("}", self.pos)
+                if self.pos == -1:
+                    raise self.error("Unterminated named escape")
+            self.pos += 1
+
+        elif chr in "^$":
+            raise self.error("Anchors are not supported")
+
+        elif chr in "*+?":
+            raise self.error("Nothing to repeat")
+
+        else:
+            self.pos += 1
+
+        return ("atom", self.pattern[start : self.pos])
+
+
+class DfaState(object):
+    """
+    A state of the lazy DFA.
+
+    `rule` is the index of the first grammar rule matching the text consumed to reach this state, or
+    None for the start state.  `transitions` memoizes the successor state per character, None being
+    the dead state.
+    """
+
+    __slots__ = ("nfa_states", "rule", "transitions")
+
+    def __init__(self, nfa_states, rule):
+        self.nfa_states = nfa_states
+        self.rule = rule
+        self.transitions = {}
+
+    def __repr__(self):
+        return "<DfaState %r %d>" % (self.rule, len(self.nfa_states))
+
+
+class Dfa(object):
+    """
+    A compiled token grammar.
+
+    Use `compile_tokens()` rather than constructing these directly, so that compiled grammars (and
+    the DFA states they have discovered) are shared.
+    """
+
+    def __init__(self, tokens=TOKENS):
+        self.tokens = [tuple(t) for t in tokens]
+        self.patterns = [re.compile(pat) for pat, _ in self.tokens]
+
+        self._eps = []
+        self._edges = []
+        self._preds = {}
+        self._owner = []
+        self._accepts = set()
+
+        starts = []
+        for idx, (pat, _) in enumerate(self.tokens):
+            ast = _PatternParser(pat).parse()
+            start, end = self._build(ast, idx)
+            starts.append(start)
+            self._accepts.add(end)
+
+        self._states = {}
+        self.start = self._intern(self._closure(starts), None)
+
+    def _state(self, rule):
+        self._eps.append([])
+        self._edges.append([])
+        self._owner.append(rule)
+        return len(self._eps) - 1
+
+    def _pred(self, source):
+        pred = self._preds.get(source)
+        if pred is None:
+            try:
+                pred = self._preds[source] = re.compile(source).fullmatch
+            except re.error as e:
+                raise GrammarCompileError("Bad atom %r: %s" % (source, e))
+        return pred
+
+    def _build(self, node, rule):
+        """Thompson construction. Returns the (start, end) states of a fragment."""
+
+        kind = node[0]
+        if kind == "atom":
+            s, e = self._state(rule), self._state(rule)
+            self._edges[s].append((self._pred(node[1]), e))
+            return s, e
+
+        elif kind == "cat":
+            s = e = self._state(rule)
+            for child in node[1]:
+                cs, ce = self._build(child, rule)
+                self._eps[e].append(cs)
+                e = ce
+            return s, e
+
+        elif kind == "alt":
+            s, e = self._state(rule), self._state(rule)
+            for child in node[1]:
+                cs, ce = self._build(child, rule)
+                self._eps[s].append(cs)
+                self._eps[ce].append(e)
+            return s, e
+
+        elif kind == "rep":
+            _, child, lo, hi = node
+            s = e = self._state(rule)
+            for _ in range(lo):
+                cs, ce = self._build(child, rule)
+                self._eps[e].append(cs)
+                e = ce
+
+            if hi is None:
+                cs, ce = self._build(child, rule)
+                tail = self._state(rule)
+                self._eps[e].extend([cs, tail])
+                self._eps[ce].extend([cs, tail])
+                e = tail
+
+            else:
+                tail = self._state(rule)
+                for _ in range(hi - lo):
+                    cs, ce = self._build(child, rule)
+                    self._eps[e].extend([cs, tail])
+                    e = ce
+                self._eps[e].append(tail)
+                e = tail
+
+            return s, e
+
+        raise GrammarCompileError("Unknown node %r" % (kind,))
+
+    def _closure(self, states):
+        seen = set(states)
+        todo = list(states)
+        while todo:
+            for t in self._eps[todo.pop()]:
+                if t not in seen:
+                    seen.add(t)
+                    todo.append(t)
+        return seen
+
+    def _intern(self, nfa_states, rule):
+        key = frozenset(nfa_states)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = DfaState(key, rule)
+        return state
+
+    def step(self, state, chr):
+        """
+        Returns the state reached from `state` by consuming `chr`, or None if no rule which has
+        matched every prefix so far also matches with `chr` appended.
+        """
+
+        try:
+            return state.transitions[chr]
+        except KeyError:
+            pass
+
+        moved = set()
+        calls = 0
+        for s in state.nfa_states:
+            for pred, t in self._edges[s]:
+                calls += 1
+                if pred(chr):
+                    moved.add(t)
+        if profiling.ACTIVE is not None:
+            profiling.ACTIVE.count_regex(calls)
+        moved = self._closure(moved)
+
+        # Rules which fail to match this prefix are candidates no longer
+        matching = {self._owner[s] for s in moved if s in self._accepts}
+        if matching:
+            nxt = self._intern(
+                (s for s in moved if self._owner[s] in matching), min(matching)
+            )
+        else:
+            nxt = None
+
+        state.transitions[chr] = nxt
+        return nxt
+
+    def scan(self, buffer, pos=0, endpos=None):
+        """
+        Scans the longest token starting at `pos` in `buffer`.
+
+        Returns a pair (end, rule) where rule is the index of the matched rule in `self.tokens`, or
+        None if no rule matches the character at `pos`.
+        """
+
+        end, state = self.resume(self.start, buffer, pos, endpos)
+        return end, state.rule
+
+    def resume(self, state, buffer, pos=0, endpos=None):
+        """
+        Continues a scan from `state`, consuming characters of `buffer` from `pos` for as long as some
+        rule still matches.
+
+        Returns a pair (end, state) of the offset at which the scan stopped and the last live state.
+        Lets a token which is split across several buffers be scanned without re-reading its start.
+        """
+
+        endpos = len(buffer) if endpos is None else endpos
+        transitions = state.transitions
+        i = pos
+        while i < endpos:
+            try:
+                nxt = transitions[buffer[i]]
+            except KeyError:
+                nxt = self.step(state, buffer[i])
+            if nxt is None:
+                break
+            state = nxt
+            transitions = nxt.transitions
+            i += 1
+
+        return i, state
+
+
+class CompiledGrammar(object):
+    """
+    A compiled token grammar.
+
+    `patterns` are the compiled patterns of the rules of `tokens`, and `dfa` the grammar's `Dfa`, or
+    None if the grammar can't be represented as an automaton.  `candidates()` indexes the rules by
+    the first character of a token.
+
+    Use `compile_grammar()` rather than constructing these directly, so that compiled grammars are
+    shared.
+    """
+
+    def __init__(self, tokens=TOKENS):
+        self.tokens = [tuple(t) for t in tokens]
+        try:
+            self.dfa = compile_tokens(self.tokens)
+        except GrammarCompileError:
+            self.dfa = None
+        self.patterns = (
+            self.dfa.patterns
+            if self.dfa is not None
+            else [re.compile(pat) for pat, _ in self.tokens]
+        )
+        self._candidates = {}
+
+    def candidates(self, chr):
+        """
+        Returns the indices of the rules which may match a token starting with `chr`, in rule order.
+
+        As every prefix of a token must be matched by its rule, these are the rules matching `chr`
+        alone.  Memoized per character, so each rule is only ever tried once against a character.
+        """
+
+        try:
+            return self._candidates[chr]
+        except KeyError:
+            pass
+
+        if profiling.ACTIVE is not None:
+            profiling.ACTIVE.count_regex(len(self.patterns))
+        rules = self._candidates[chr] = tuple(
+            idx for idx, pat in enumerate(self.patterns) if pat.fullmatch(chr)
+        )
+        return rules
+
+    def __repr__(self):
+        return "<CompiledGrammar %d rules%s>" % (
+            len(self.tokens),
+            "" if self.dfa is not None else " (no DFA)",
+        )
+
+
+def _key(tokens):
+    if isinstance(tokens, CompiledGrammar):
+        tokens = tokens.tokens
+    return tuple(tuple(t) for t in tokens)
+
+
+@memoize
+def _compile_tokens(tokens):
+    return Dfa(tokens)
+
+
+def compile_tokens(tokens=TOKENS):
+    """
+    Returns the (shared) `Dfa` for a token grammar, or `CompiledGrammar`.
+
+    Raises `GrammarCompileError` if the grammar can't be represented as an automaton.
+    """
+
+    return _compile_tokens(_key(tokens))
+
+
+@memoize
+def _compile_grammar(tokens):
+    return CompiledGrammar(tokens)
+
+
+def compile_grammar(tokens=TOKENS):
+    """
+    Returns the (shared) `CompiledGrammar` for a token grammar.
+
+    A `CompiledGrammar` is returned as-is.
+    """
+
+    if isinstance(tokens, CompiledGrammar):
+        return tokens
+    return _compile_grammar(_key(tokens))
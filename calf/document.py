@@ -0,0 +1,174 @@
+"""
+Editable parsed buffers.
+
+Editors and similar tools re-parse a buffer after every change.  A `CalfDocument` holds a buffer
+together with the top level forms parsed from it, and applies edits by re-lexing and re-parsing
+only the top level forms an edit damages.
+
+The tokens of each top level form have offsets relative to a `LineSegment` of their own, so a form
+is moved by moving its segment rather than every token.  The segments of the forms following the
+last edit share a `Shift`, so the forms following an edit are all moved at once.  Moving the forms
+between the last edit and the next costs time proportional to their number, as moving the gap of a
+gap buffer does, so a run of nearby edits each costs time proportional to the forms it re-parses.
+"""
+
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+from calf.grammar import WHITESPACE_TYPES
+from calf.io.reader import EditableLineIndex, LineSegment, Shift
+from calf.lexer import CalfBufferLexer
+from calf.parser import parse_stream
+from calf.token import *
+
+
+def _rebase(form, segment):
+    """Makes the positions of every token in a form relative to `segment`."""
+
+    base = segment.base
+    stack = [form]
+    while stack:
+        t = stack.pop()
+        t.start_position -= base
+        t.lines = segment
+
+        if isinstance(t, CalfBlockToken):
+            t.end_position -= base
+
+        if isinstance(t, CalfListToken):
+            stack.extend(t)
+        elif isinstance(t, CalfDictToken):
+            for k, v in t.value:
+                stack.append(k)
+                stack.append(v)
+        elif isinstance(t, CalfMetaToken):
+            stack.append(t.meta)
+            stack.append(t.value)
+        elif isinstance(t, CalfDispatchToken):
+            stack.append(t.tag)
+            stack.append(t.value)
+        elif isinstance(t, CalfQuoteToken):
+            stack.append(t.value)
+
+
+class _Ends(object):
+    """A (bisectable) view of the end offsets of a document's forms."""
+
+    def __init__(self, document):
+        self.document = document
+
+    def __len__(self):
+        return len(self.document.segments)
+
+    def __getitem__(self, i):
+        return self.document.segments[i].base + self.document.widths[i]
+
+
+class _Starts(_Ends):
+    """A (bisectable) view of the start offsets of a document's forms."""
+
+    def __getitem__(self, i):
+        return self.document.segments[i].base
+
+
+class CalfDocument(object):
+    """
+    A buffer, and the top level forms parsed from it.
+
+    `forms[i]` spans the `widths[i]` characters from `segments[i].base`.  Whitespace and comments
+    are discarded, as for `parse_buffer`.
+    """
+
+    def __init__(self, text, source="<Buffer>"):
+        self.text = text
+        self.source = source
+        self.lines = EditableLineIndex(text)
+        # The segments from index _gap on are displaced by _moved, and the others by _fixed, which
+        # never moves
+        self._fixed, self._moved = Shift(), Shift()
+        self.forms, self.segments, self.widths = [], [], []
+        self.forms, self.segments, self.widths, _ = self._parse(text, 0, 0, None, self._moved)
+        self._gap = 0
+
+    def __iter__(self):
+        return iter(self.forms)
+
+    def __len__(self):
+        return len(self.forms)
+
+    def _parse(self, text, start, delta, resync, shift):
+        """
+        Parses the top level forms of `text` from the offset `start`.
+
+        Stops early if a form would begin where (after shifting by `delta`) one of the existing
+        forms from index `resync` on began, as the rest of the existing forms are then unchanged.
+
+        The segments of the new forms are displaced by `shift`.
+
+        Returns the new forms, their segments and widths, and the index of the existing form parsing
+        resynchronized on.
+        """
+
+        lexer = CalfBufferLexer(text, self.source, offset=start, lines=self.lines)
+        forms, segments, widths = [], [], []
+        starts = _Starts(self)
+        k = resync
+
+        for token in lexer:
+            if token.type in WHITESPACE_TYPES:
+                continue
+
+            if k is not None:
+                target = token.start_position - delta
+                while k < len(starts) and starts[k] < target:
+                    k += 1
+                if k < len(starts) and starts[k] == target:
+                    return forms, segments, widths, k
+
+            form = next(parse_stream(chain([token], lexer)))
+            segment = LineSegment(self.lines, token.start_position, shift)
+            _rebase(form, segment)
+            forms.append(form)
+            segments.append(segment)
+            widths.append(lexer.offset - segment.base)
+
+        return forms, segments, widths, len(self.forms)
+
+    def edit(self, offset, removed, text):
+        """
+        Replaces the `removed` characters at `offset` with `text`.
+
+        Re-parses only the top level forms touching the edit, and any following forms which the
+        edit changes the meaning of (for instance by removing a closing paren).  Returns the list of
+        new forms.
+
+        Propagates all errors, leaving the document unchanged.
+        """
+
+        new_text = self.text[:offset] + text + self.text[offset + removed :]
+        delta = len(text) - removed
+
+        # Forms ending strictly before the edit are unaffected by it, as is the token following
+        # each of them.  Forms starting strictly after the edit may be reused.
+        i = bisect_left(_Ends(self), offset)
+        start = _Ends(self)[i - 1] if i else 0
+        resync = bisect_right(_Starts(self), offset + removed)
+
+        # Positions are resolved lazily, so the line index needn't be updated until parsing succeeds
+        forms, segments, widths, k = self._parse(new_text, start, delta, resync, self._fixed)
+        self.lines.replace(offset, removed, text)
+
+        # Move the gap to the first form following the edit, and then all the following forms
+        gap = self._gap
+        for segment in self.segments[gap:k]:
+            segment.move(self._fixed)
+        for segment in self.segments[k:gap]:
+            segment.move(self._moved)
+        self._moved.delta += delta
+
+        self.forms[i:k] = forms
+        self.segments[i:k] = segments
+        self.widths[i:k] = widths
+        self._gap = i + len(segments)
+        self.text = new_text
+        return forms
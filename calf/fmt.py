@@ -0,0 +1,478 @@
+"""
+Calf printing.
+
+Prints read values (see `calf.reader`) and parsed token trees (see `calf.parser`) back out as Calf
+text, in one of three modes:
+
+  - "compact": each top level form on a single line
+  - "pretty": forms too wide for the line broken over several lines, and indented
+  - "lossless": token trees parsed with their whitespace and comments (`discard_whitespace=False`,
+    `discard_comments=False`) printed exactly as they were read
+
+Printing never recurses, so arbitrarily deep forms may be printed, and never builds the text of a
+form.  Output is collected into chunks which are written to the file object in large blocks.
+
+    python -m calf.fmt --pretty foo.calf
+"""
+
+import argparse
+from array import array
+import io
+import sys
+
+from calf import numeric
+from calf.lexer import lex_buffer
+from calf.parser import parse_stream
+from calf.token import (
+    CalfArrayToken,
+    CalfDictToken,
+    CalfDispatchToken,
+    CalfListToken,
+    CalfMetaToken,
+    CalfQuoteToken,
+    CalfStrToken,
+    CalfToken,
+)
+from calf.types import Keyword, Map, Set, Symbol, Vector
+
+
+MODES = ("compact", "pretty", "lossless")
+
+# The kinds of node, as returned by _node
+_ATOM, _COMMENT, _SPACE, _COLL, _PREFIX = range(5)
+
+# The layouts of broken collections: the head and then indented arguments, and key value pairs
+_CALL, _MAP = "call", "map"
+
+_INF = float("inf")
+
+_CHUNK = 4096
+
+_BRACKETS = {"LIST": ("(", ")"), "SQLIST": ("[", "]")}
+
+_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def quote(s: str) -> str:
+    """
+    Returns a string literal reading as `s`.
+
+    Unprintable characters are escaped, so that the literal is a single line of printable text.
+    """
+
+    if s.isprintable() and '"' not in s and "\\" not in s:
+        return '"' + s + '"'
+
+    chars = ['"']
+    for c in s:
+        e = _ESCAPES.get(c)
+        if e is not None:
+            chars.append(e)
+        elif c.isprintable():
+            chars.append(c)
+        elif ord(c) < 0x100:
+            chars.append("\\x%02x" % ord(c))
+        elif ord(c) < 0x10000:
+            chars.append("\\u%04x" % ord(c))
+        else:
+            chars.append("\\U%08x" % ord(c))
+
+    # A backslash before the closing quote would escape it, as far as the lexer is concerned
+    if chars[-1] == "\\\\" and s.endswith("\\"):
+        chars[-1] = "\\x5c"
+
+    chars.append('"')
+    return "".join(chars)
+
+
+def _name(x):
+    return x.name if x.namespace is None else f"{x.namespace}/{x.name}"
+
+
+def _keyword(x):
+    if x.name is None:
+        return ":"
+    return ":" + _name(x)
+
+
+def _float(x):
+    text = float.__repr__(x)
+    if text in ("inf", "-inf", "nan"):
+        raise ValueError(f"Can't print {text}, which has no literal")
+    return text
+
+
+# Each node is a tuple (kind, text or open, close, children, layout)
+
+
+def _token_list(t):
+    open, close = _BRACKETS[t.type]
+    for child in t:
+        type = getattr(child, "type", None)
+        if type not in ("WHITESPACE", "COMMENT"):
+            return _COLL, open, close, t, _CALL if type == "SYMBOL" else None
+    return _COLL, open, close, t, None
+
+
+def _elements(t):
+    # The forms of the token, including any whitespace and comments, where they were kept
+    return getattr(t, "elements", None)
+
+
+def _token_dict(t):
+    return _COLL, "{", "}", _elements(t) or [x for pair in t.value for x in pair], _MAP
+
+
+def _token_str(t):
+    # A """ string runs to the end of its line, so isn't reused where it mightn't end one
+    raw = getattr(t, "raw", None)
+    if raw is None or raw.startswith('"""'):
+        raw = quote(t)
+    return _ATOM, raw, None, None, None
+
+
+def _lex_token(t):
+    if t.type == "WHITESPACE":
+        return _SPACE, t.value, None, None, None
+    elif t.type == "COMMENT":
+        return _COMMENT, t.value, None, None, None
+    return _ATOM, t.value, None, None, None
+
+
+def _node_type(cls):
+    """Returns the function returning the node of values of class `cls`."""
+
+    if issubclass(cls, CalfToken):
+        if issubclass(cls, CalfStrToken):
+            return _token_str
+        elif issubclass(cls, CalfListToken):
+            return _token_list
+        elif issubclass(cls, CalfDictToken):
+            return _token_dict
+        elif issubclass(cls, CalfMetaToken):
+            return lambda t: (_PREFIX, "^", "", _elements(t) or [t.meta, t.value], None)
+        elif issubclass(cls, CalfDispatchToken):
+            return lambda t: (_PREFIX, "#", "", _elements(t) or [t.tag, t.value], None)
+        elif issubclass(cls, CalfQuoteToken):
+            return lambda t: (_PREFIX, "'", "", _elements(t) or [t.value], None)
+        elif issubclass(cls, CalfArrayToken):
+            return lambda t: (_COLL, "[", "]", t.value.tolist(), None)
+        return _lex_token
+
+    elif issubclass(cls, Symbol):
+        return lambda x: (_ATOM, _name(x), None, None, None)
+    elif issubclass(cls, Keyword):
+        return lambda x: (_ATOM, _keyword(x), None, None, None)
+    elif issubclass(cls, str):
+        return lambda x: (_ATOM, quote(x), None, None, None)
+    elif issubclass(cls, bool):
+        pass
+    elif issubclass(cls, int):
+        return lambda x: (_ATOM, int.__repr__(x), None, None, None)
+    elif issubclass(cls, float):
+        return lambda x: (_ATOM, _float(x), None, None, None)
+    elif issubclass(cls, Vector):
+        return lambda x: (_COLL, "[", "]", x, None)
+    elif issubclass(cls, Map):
+        return lambda x: (_COLL, "{", "}", [e for item in x.items() for e in item], _MAP)
+    elif issubclass(cls, array) or (numeric.numpy and issubclass(cls, numeric.numpy.ndarray)):
+        return lambda x: (_COLL, "[", "]", x.tolist(), None)
+
+    if issubclass(cls, Set):
+        return lambda x: _unprintable(x, "sets have no literal")
+    return _unprintable
+
+
+def _unprintable(x, why=None):
+    raise TypeError(f"Can't print {x!r} ({why or type(x)})")
+
+
+_NODE_TYPES = {}
+
+
+def _node(x):
+    f = _NODE_TYPES.get(type(x))
+    if f is None:
+        f = _NODE_TYPES[type(x)] = _node_type(type(x))
+    return f(x)
+
+
+class _Buffer(object):
+    """Chunks of output, to be written to a file object in blocks."""
+
+    def __init__(self, fp, size=_CHUNK):
+        self.fp = fp
+        self.size = size
+        self.chunks = []
+
+    def flush(self):
+        self.fp.write("".join(self.chunks))
+        self.chunks.clear()
+
+
+def _write_flat(form, buf, lossless):
+    chunks, size = buf.chunks, buf.size
+    write = chunks.append
+
+    # Frames are [children, close, whether the next child is the first]
+    stack = [[iter((form,)), "", True]]
+    while stack:
+        frame = stack[-1]
+        for child in frame[0]:
+            if len(chunks) >= size:
+                buf.flush()
+
+            kind, text, close, children, _ = _node(child)
+            if lossless:
+                write(child.raw if isinstance(child, CalfStrToken) else text)
+            elif kind is _SPACE:
+                continue
+            else:
+                if not frame[2]:
+                    write(" ")
+                frame[2] = False
+
+                if kind is _COMMENT:
+                    write(text.rstrip("\r\n"))
+                    write("\n")
+                    frame[2] = True
+                else:
+                    write(text)
+
+            if kind >= _COLL:
+                stack.append([iter(children), close, True])
+                break
+
+        else:
+            stack.pop()
+            write(frame[1])
+
+
+def _measure(form):
+    """Returns the width of every collection in `form` when printed flat, keyed by id."""
+
+    memo = {}
+    parts = _node(form)
+    if parts[0] < _COLL:
+        return memo
+
+    # Frames are (node, parts, children, [width of children, number of children])
+    stack = [(form, parts, iter(parts[3]), [0, 0])]
+    while stack:
+        node, parts, children, acc = stack[-1]
+        for child in children:
+            p = _node(child)
+            kind = p[0]
+            if kind >= _COLL:
+                stack.append((child, p, iter(p[3]), [0, 0]))
+                break
+            elif kind is _ATOM:
+                acc[0] += len(p[1])
+                acc[1] += 1
+            elif kind is _COMMENT:
+                # A comment runs to the end of the line, so can't be printed flat
+                acc[0] = _INF
+                acc[1] += 1
+
+        else:
+            stack.pop()
+            width = len(parts[1]) + len(parts[2]) + acc[0] + max(acc[1] - 1, 0)
+            # Keeping the node keeps its id unique
+            memo[id(node)] = (width, parts, node)
+            if stack:
+                acc = stack[-1][3]
+                acc[0] += width
+                acc[1] += 1
+
+    return memo
+
+
+# Pretty printing operations
+_NODE, _TEXT, _LINE = range(3)
+
+
+def _is_comment(x):
+    return getattr(x, "type", None) == "COMMENT"
+
+
+def _write_pretty(form, buf, width):
+    chunks, size = buf.chunks, buf.size
+    write = chunks.append
+    memo = _measure(form)
+
+    col = 0
+    # Whether a comment was just written, so that the line must end
+    newline = False
+    # Operations are (op, node or text, the indent of any line started before it)
+    stack = [(_NODE, form, 0)]
+    while stack:
+        if len(chunks) >= size:
+            buf.flush()
+
+        op, x, indent = stack.pop()
+        if op is _LINE or newline:
+            write("\n" + " " * indent)
+            col, newline = indent, False
+            if op is _LINE:
+                continue
+
+        if op is _TEXT:
+            write(x)
+            col += len(x)
+            continue
+
+        entry = memo.get(id(x))
+        if entry is None:
+            kind, text = _node(x)[:2]
+            if kind is _ATOM:
+                write(text)
+                col += len(text)
+            elif kind is _COMMENT:
+                write(text.rstrip("\r\n"))
+                newline = True
+            continue
+
+        w, (kind, open, close, children, layout), _ = entry
+        if col + w <= width:
+            _write_flat(x, buf, False)
+            col += w
+            continue
+
+        start = col
+        write(open)
+        col += len(open)
+        inner = col
+
+        kids = [k for k in children if _node(k)[0] is not _SPACE]
+        ops = []
+        if kind is _PREFIX:
+            for i, k in enumerate(kids):
+                if i and not _is_comment(kids[i - 1]):
+                    ops.append((_TEXT, " ", start))
+                ops.append((_NODE, k, start))
+
+        elif layout is _CALL and len(kids) > 1:
+            # Atoms following the head (such as a name) stay on its line, where they fit
+            inner = start + 2
+            end = col + len(kids[0].value)
+            ops.append((_NODE, kids[0], inner))
+            i = 1
+            while i < len(kids) and id(kids[i]) not in memo:
+                kind, text = _node(kids[i])[:2]
+                if kind is not _ATOM or end + 1 + len(text) > width:
+                    break
+                ops.append((_TEXT, " ", inner))
+                ops.append((_NODE, kids[i], inner))
+                end += 1 + len(text)
+                i += 1
+            for k in kids[i:]:
+                ops.append((_LINE, None, inner))
+                ops.append((_NODE, k, inner))
+
+        elif layout is _MAP and not any(_is_comment(k) for k in kids):
+            for i in range(0, len(kids), 2):
+                if i:
+                    ops.append((_LINE, None, inner))
+                ops.append((_NODE, kids[i], inner))
+                ops.append((_TEXT, " ", inner))
+                ops.append((_NODE, kids[i + 1], inner))
+
+        else:
+            for i, k in enumerate(kids):
+                if i:
+                    ops.append((_LINE, None, inner))
+                ops.append((_NODE, k, inner))
+
+        if close:
+            ops.append((_TEXT, close, inner))
+        stack.extend(reversed(ops))
+
+
+def dump(forms, fp, mode="pretty", width=80):
+    """
+    Prints a sequence of values or tokens to a text file object.
+
+    In the compact and pretty modes, each top level form is followed by a newline, and any
+    whitespace tokens are ignored.  In lossless mode, nothing is printed which wasn't read.
+    Pretty printed forms are kept within `width` columns where they can be.
+
+    Raises TypeError on values which have no Calf syntax, such as sets.
+    """
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}")
+
+    buf = _Buffer(fp)
+    for form in forms:
+        if mode == "lossless":
+            _write_flat(form, buf, True)
+        elif mode == "compact":
+            _write_flat(form, buf, False)
+            if not _is_comment(form):
+                buf.chunks.append("\n")
+        else:
+            _write_pretty(form, buf, width)
+            buf.chunks.append("\n")
+
+        if len(buf.chunks) >= buf.size:
+            buf.flush()
+
+    buf.flush()
+
+
+def dumps(forms, mode="pretty", width=80) -> str:
+    """Returns the text of a sequence of values or tokens (see `dump`)."""
+
+    fp = io.StringIO()
+    dump(forms, fp, mode, width)
+    return fp.getvalue()
+
+
+def format_buffer(buffer, fp, source="<Buffer>", mode="pretty", width=80):
+    """
+    Parses a buffer, keeping comments, and prints its forms to a text file object.
+
+    In lossless mode whitespace is kept too, and the buffer is reproduced exactly.
+    """
+
+    dump(parse_stream(lex_buffer(buffer, source),
+                      discard_whitespace=mode != "lossless",
+                      discard_comments=False),
+         fp, mode, width)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Formats Calf source files.")
+    parser.add_argument("files", nargs="*", help="files to format (default: stdin)")
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument("--pretty", dest="mode", action="store_const", const="pretty",
+                       help="break and indent forms to fit the width (the default)")
+    modes.add_argument("--compact", dest="mode", action="store_const", const="compact",
+                       help="print each top level form on one line")
+    modes.add_argument("--lossless", dest="mode", action="store_const", const="lossless",
+                       help="print the source exactly as it was read")
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("-i", "--in-place", action="store_true",
+                        help="rewrite the files, rather than printing to stdout")
+    opts = parser.parse_args(argv)
+    mode = opts.mode or "pretty"
+
+    if not opts.files:
+        format_buffer(sys.stdin.read(), sys.stdout, "<stdin>", mode, opts.width)
+        return
+
+    for file in opts.files:
+        with open(file) as f:
+            buffer = f.read()
+
+        if opts.in_place:
+            out = io.StringIO()
+            format_buffer(buffer, out, file, mode, opts.width)
+            with open(file, "w") as f:
+                f.write(out.getvalue())
+        else:
+            format_buffer(buffer, sys.stdout, file, mode, opts.width)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,12 @@
 Various Reader class instances.
 """
 
+from bisect import bisect_right
+import codecs
+import io
+import mmap
+import os
+
 
 class Position(object):
     def __init__(self, offset, line, column):
@@ -16,6 +22,174 @@ class Position(object):
         return self.__repr__()
 
 
+class LineIndex(object):
+    """A table of the offsets at which lines start in a buffer. Maps offsets to lines and columns."""
+
+    def __init__(self, buffer):
+        starts = [0]
+        find = buffer.find
+        i = find("\n")
+        while i != -1:
+            starts.append(i + 1)
+            i = find("\n", i + 1)
+        self.starts = starts
+
+    def offset(self, offset):
+        return offset
+
+    def line(self, offset):
+        """The (1-indexed) line on which `offset` falls."""
+        return bisect_right(self.starts, offset)
+
+    def column(self, offset):
+        """The (0-indexed) column at which `offset` falls."""
+        return offset - self.starts[bisect_right(self.starts, offset) - 1]
+
+
+class EditableLineIndex(LineIndex):
+    """
+    A LineIndex which can be updated for edits to its buffer.
+
+    The line starts following the last edit are stored unshifted by it, as a gap buffer stores text,
+    so an edit costs time proportional to the lines it replaces and the lines between it and the
+    last edit, rather than to the lines of the whole buffer.
+    """
+
+    def __init__(self, buffer):
+        super().__init__(buffer)
+        # The starts from index _gap on are stored less _shift
+        self._gap = len(self.starts)
+        self._shift = 0
+
+    def line(self, offset):
+        starts, gap = self.starts, self._gap
+        if gap < len(starts) and offset >= starts[gap] + self._shift:
+            return bisect_right(starts, offset - self._shift, gap)
+        return bisect_right(starts, offset, 0, gap)
+
+    def column(self, offset):
+        i = self.line(offset) - 1
+        return offset - self.starts[i] - (self._shift if i >= self._gap else 0)
+
+    def replace(self, offset, removed, text):
+        """Updates the line starts for replacing `removed` characters at `offset` with `text`."""
+
+        lo = self.line(offset)
+        hi = self.line(offset + removed)
+
+        # Move the gap to just after the replaced lines
+        starts, gap, shift = self.starts, self._gap, self._shift
+        for i in range(gap, hi):
+            starts[i] += shift
+        for i in range(hi, gap):
+            starts[i] -= shift
+
+        inserted = []
+        i = text.find("\n")
+        while i != -1:
+            inserted.append(offset + i + 1)
+            i = text.find("\n", i + 1)
+
+        starts[lo:hi] = inserted
+        self._gap = lo + len(inserted)
+        self._shift = shift + len(text) - removed
+
+
+class Shift(object):
+    """A displacement shared by any number of LineSegments, which moves them all at once."""
+
+    __slots__ = ("delta",)
+
+    def __init__(self, delta=0):
+        self.delta = delta
+
+
+class LineSegment(object):
+    """
+    Resolves offsets relative to a movable `base` offset against a LineIndex.
+
+    Lets all the positions within a span of text be moved at once, by moving the base.  The base is
+    displaced by a `Shift`, which may be shared with other segments to move them all at once too.
+    """
+
+    __slots__ = ("lines", "start", "shift")
+
+    def __init__(self, lines, base, shift=None):
+        self.lines = lines
+        self.shift = shift if shift is not None else Shift()
+        self.start = base - self.shift.delta
+
+    @property
+    def base(self):
+        return self.start + self.shift.delta
+
+    def move(self, shift):
+        """Changes the Shift displacing the segment, leaving its base where it is."""
+
+        base = self.base
+        self.shift = shift
+        self.start = base - shift.delta
+
+    def offset(self, offset):
+        return self.base + offset
+
+    def line(self, offset):
+        return self.lines.line(self.base + offset)
+
+    def column(self, offset):
+        return self.lines.column(self.base + offset)
+
+
+class ChunkLines(object):
+    """
+    Resolves offsets into a chunk of a larger buffer to offsets, lines and columns in the buffer.
+
+    `lines` indexes just the chunk, which begins at `offset`, `line` and `column` of the buffer.
+    """
+
+    def __init__(self, lines, offset, line, column):
+        self.lines = lines
+        self.base = offset
+        self.base_line = line
+        self.base_column = column
+
+    def offset(self, offset):
+        return self.base + offset
+
+    def line(self, offset):
+        return self.base_line + self.lines.line(offset) - 1
+
+    def column(self, offset):
+        column = self.lines.column(offset)
+        if self.lines.line(offset) == 1:
+            column += self.base_column
+        return column
+
+
+class OffsetPosition(object):
+    """A Position which computes its line and column lazily, from an offset and a LineIndex."""
+
+    __slots__ = ("offset", "lines")
+
+    def __init__(self, offset, lines):
+        self.offset = offset
+        self.lines = lines
+
+    @property
+    def line(self):
+        return self.lines.line(self.offset)
+
+    @property
+    def column(self):
+        return self.lines.column(self.offset)
+
+    def __repr__(self):
+        return "<Pos %r (%r:%r)>" % (self.offset, self.line, self.column)
+
+    def __str__(self):
+        return self.__repr__()
+
+
 class PosReader(object):
     """A wrapper for anything that can be read from. Tracks offset, line and column information."""
 
@@ -99,3 +273,29 @@ class PeekPosReader(PosReader):
     def position(self):
         """The position of the last character read."""
         return self.reader.position
+
+
+def read_file_chunks(path, size=1 << 16, encoding="utf-8"):
+    """
+    Lazily decodes a file into text chunks of up to `size` bytes each.
+
+    The file is memory mapped rather than read, so only the pages currently being decoded need be
+    resident.  Newlines are translated as for a file opened in text mode.
+    """
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            decoder = io.IncrementalNewlineDecoder(
+                codecs.getincrementaldecoder(encoding)(), translate=True
+            )
+            for start in range(0, len(m), size):
+                chunk = decoder.decode(m[start : start + size])
+                if chunk:
+                    yield chunk
+
+            chunk = decoder.decode(b"", final=True)
+            if chunk:
+                yield chunk
@@ -6,16 +6,30 @@ well as buffer position information appropriate for either full AST parsing, los
 parsing, linting or other use.
 """
 
+import codecs
 import io
-import re
 import sys
 
-from calf.token import CalfToken
-from calf.io.reader import PeekPosReader
+from calf import profiling
+from calf.token import CalfLexToken, MoreCache, TokenTable
+from calf.io.reader import (
+    LineIndex,
+    OffsetPosition,
+    PeekPosReader,
+    Position,
+    read_file_chunks,
+)
 from calf.grammar import TOKENS
+from calf.dfa import CompiledGrammar, compile_grammar, compile_tokens
 from calf.util import *
 
 
+def intern_source(source):
+    """Interns source names, so that all the tokens read from one source share a single string."""
+
+    return sys.intern(source) if isinstance(source, str) else source
+
+
 class CalfLexer:
     """
     Lexer object.
@@ -27,6 +41,9 @@ class CalfLexer:
 
     Rule order is used to decide conflicts.  If multiple patterns would match an input, the "first"
     in token list order wins.
+
+    Grammars are compiled to a DFA (see `calf.dfa`) where possible.  Grammars which use regex
+    features the DFA can't express are lexed with the incremental regex engine instead.
     """
 
     def __init__(self, stream, source=None, metadata=None, tokens=TOKENS):
@@ -35,60 +52,109 @@ class CalfLexer:
         self._stream = (
             PeekPosReader(stream) if not isinstance(stream, PeekPosReader) else stream
         )
-        self.source = source
+        self.source = intern_source(source)
         self.metadata = metadata or {}
-        self.tokens = tokens
+        self.grammar = compile_grammar(tokens)
+        self.tokens = self.grammar.tokens
+        self._more = MoreCache(metadata)
+        self._dfa = self.grammar.dfa
+
+    def _token(self, pat, type, buffer, position):
+        return CalfLexToken(
+            type, buffer, self.source, position, self._more(pat, buffer)
+        )
 
     def __next__(self):
         """
         Tries to scan the next token off of the backing stream.
 
-        Starting with a list of all available tokens, an empty buffer and a single new character
-        peeked from the backing stream, reads more character so long as adding the next character
-        still leaves one or more possible matching "candidates" (token patterns).
+        Steps the compiled DFA one character at a time for so long as some rule still matches, then
+        generates a token of the first rule matching the consumed text.
+        """
+
+        if self._dfa is None:
+            return self._next_incremental()
+
+        dfa = self._dfa
+        buffer = []
+        state = dfa.start
+        position, chr = self._stream.peek()
+
+        while chr:
+            nxt = dfa.step(state, chr)
+            if nxt is None:
+                break
+
+            buffer.append(chr)
+            state = nxt
+
+            # consume the 'current' character for side-effects
+            self._stream.read()
+
+            # set chr to be the next peeked character
+            _, chr = self._stream.peek()
+
+        if state.rule is None:
+            raise ValueError(
+                "Entered invalid state - no candidates for %r at %r!" % (chr, position)
+            )
+
+        _, type = dfa.tokens[state.rule]
+        return self._token(dfa.patterns[state.rule], type, "".join(buffer), position)
+
+    def _next_incremental(self):
+        """
+        Tries to scan the next token off of the backing stream.
+
+        Starting with the candidate rules for a single new character peeked from the backing stream
+        (see `CompiledGrammar.candidates`) and an empty buffer, reads more characters so long as
+        adding the next character still leaves one or more possible matching "candidates" (token
+        patterns).
 
         When adding the next character from the stream would build an invalid token, a token of the
-        resulting single candidate type is generated.
+        resulting first candidate type is generated.
 
-        At the end of input, if we have a single candidate remaining, a final token of that type is
+        At the end of input, if we have a candidate remaining, a final token of that type is
         generated.  Otherwise we are in an incomplete input state either due to incomplete input or
         a grammar conflict.
         """
 
+        grammar = self.grammar
+        patterns = grammar.patterns
         buffer = ""
-        candidates = self.tokens
+        candidates = ()
         position, chr = self._stream.peek()
 
         while chr:
-            if not candidates:
-                raise ValueError("Entered invalid state - no candidates!")
-
             buff2 = buffer + chr
-            can2 = [t for t in candidates if re.fullmatch(t[0], buff2)]
+            if not buffer:
+                can2 = grammar.candidates(chr)
+                if not can2:
+                    raise ValueError(
+                        "Entered invalid state - no candidates for %r at %r!" % (chr, position)
+                    )
+            else:
+                can2 = [i for i in candidates if patterns[i].fullmatch(buff2)]
+                if profiling.ACTIVE is not None:
+                    profiling.ACTIVE.count_regex(len(candidates))
 
             # Try to include the last read character to support longest-wins grammars
-            if not can2 and len(candidates) >= 1:
-                pat, type = candidates[0]
-                groups = re.match(re.compile(pat), buffer).groupdict()
-                groups.update(self.metadata)
-                return CalfToken(type, buffer, self.source, position, groups)
+            if not can2:
+                break
 
-            else:
-                # Update the buffers
-                buffer = buff2
-                candidates = can2
+            # Update the buffers
+            buffer = buff2
+            candidates = can2
 
-                # consume the 'current' character for side-effects
-                self._stream.read()
+            # consume the 'current' character for side-effects
+            self._stream.read()
 
-                # set chr to be the next peeked character
-                _, chr = self._stream.peek()
+            # set chr to be the next peeked character
+            _, chr = self._stream.peek()
 
-        if len(candidates) >= 1:
-            pat, type = candidates[0]
-            groups = re.match(re.compile(pat), buffer).groupdict()
-            groups.update(self.metadata)
-            return CalfToken(type, buffer, self.source, position, groups)
+        if candidates:
+            rule = candidates[0]
+            return self._token(patterns[rule], self.tokens[rule][1], buffer, position)
 
         else:
             raise ValueError(
@@ -103,18 +169,237 @@ class CalfLexer:
         Will not mask any exceptions from the backing reader.
         """
 
+        profile = profiling.ACTIVE
+        tokens = self._tokens()
+        return tokens if profile is None else profile.stage("lex", tokens, self.source)
+
+    def _tokens(self):
         # While the character stream isn't empty
         while self._stream.peek()[1] != "":
             yield next(self)
 
 
+class CalfBufferLexer(object):
+    """
+    Whole buffer lexer object.
+
+    Lexes text which is already in memory by offset, rather than by reading it a character at a
+    time.  Token positions are plain offsets.  Line and column information is computed lazily from
+    a table of line start offsets, which is built once per buffer.
+
+    Accepts a `str`, or `bytes`-like objects (such as an `mmap`) which are decoded as UTF-8.  Lexing
+    may begin at any token boundary `offset`, and an existing LineIndex of the buffer may be given.
+
+    Raises `calf.dfa.GrammarCompileError` if the token grammar can't be compiled to a DFA, and
+    ValueError if the buffer contains text no rule matches.
+    """
+
+    def __init__(
+        self, buffer, source=None, metadata=None, tokens=TOKENS, offset=0, lines=None
+    ):
+        if not isinstance(buffer, str):
+            buffer = str(buffer, "utf-8")
+
+        self.buffer = buffer
+        self.source = intern_source(source)
+        self.metadata = metadata or {}
+        self.tokens = tokens
+        self.lines = lines if lines is not None else LineIndex(buffer)
+        self.offset = offset
+        self._dfa = compile_tokens(tokens)
+        self._more = MoreCache(metadata)
+
+    def __next__(self):
+        """
+        Scans the next token out of the buffer.
+        """
+
+        start = self.offset
+        if start >= len(self.buffer):
+            raise StopIteration
+
+        end, rule = self._dfa.scan(self.buffer, start)
+        if rule is None:
+            raise ValueError(
+                "Entered invalid state - no candidates for %r at %r!"
+                % (self.buffer[start], OffsetPosition(start, self.lines))
+            )
+
+        self.offset = end
+        value = self.buffer[start:end]
+        return CalfLexToken(
+            self._dfa.tokens[rule][1],
+            value,
+            self.source,
+            start,
+            self._more(self._dfa.patterns[rule], value),
+            self.lines,
+        )
+
+    def __iter__(self):
+        return self
+
+
+class CalfIncrementalLexer(object):
+    """
+    Push lexer object.
+
+    Accepts text in arbitrary chunks via `feed()`, returning the tokens completed by each chunk.  A
+    token which may yet be continued by the next chunk is held back, along with the DFA state
+    reached scanning it, so no text is ever scanned twice.  Only the text of the pending token is
+    retained between chunks, as a list of pieces which are joined once the token ends, so each chunk
+    costs time proportional to its length however long the token.
+
+    Chunks may also be bytes, which are decoded as `encoding` (and may split characters).
+
+    `close()` signals the end of input, and returns the final pending token if any.
+    """
+
+    def __init__(self, source=None, metadata=None, tokens=TOKENS, encoding="utf-8"):
+        self.source = intern_source(source)
+        self.metadata = metadata or {}
+        self.tokens = tokens
+        self.encoding = encoding
+        self._more = MoreCache(metadata)
+        self.offset = 0
+        self.line = 1
+        self.column = 0
+        self._dfa = compile_tokens(tokens)
+        self._decoder = None
+        self._pending = []
+        self._state = self._dfa.start
+
+    def _emit(self, value):
+        rule = self._state.rule
+        token = CalfLexToken(
+            self._dfa.tokens[rule][1],
+            value,
+            self.source,
+            Position(self.offset, self.line, self.column),
+            self._more(self._dfa.patterns[rule], value),
+        )
+
+        self.offset += len(value)
+        newlines = value.count("\n")
+        if newlines:
+            self.line += newlines
+            self.column = len(value) - value.rfind("\n") - 1
+        else:
+            self.column += len(value)
+
+        self._state = self._dfa.start
+        return token
+
+    def _scan(self, text, final):
+        tokens = []
+        resume = self._dfa.resume
+        pos, length = 0, len(text)
+        while pos < length or (final and self._pending):
+            end, self._state = resume(self._state, text, pos)
+            if end == length and not final:
+                self._pending.append(text[pos:])
+                break
+
+            if self._pending:
+                self._pending.append(text[pos:end])
+                value = "".join(self._pending)
+                self._pending.clear()
+            else:
+                value = text[pos:end]
+
+            if self._state.rule is None:
+                raise ValueError(
+                    "Entered invalid state - no candidates for %r at %r!"
+                    % (
+                        value[:1] or text[pos],
+                        Position(self.offset, self.line, self.column),
+                    )
+                )
+
+            tokens.append(self._emit(value))
+            pos = end
+
+        return tokens
+
+    def _decode(self, chunk, final=False):
+        if isinstance(chunk, str):
+            return chunk
+        if self._decoder is None:
+            self._decoder = codecs.getincrementaldecoder(self.encoding)()
+        return self._decoder.decode(chunk, final)
+
+    def feed(self, text):
+        """
+        Adds text (or bytes) to the lexer, returning a list of all the tokens it completes.
+        """
+
+        return self._scan(self._decode(text), False)
+
+    def close(self):
+        """
+        Ends the input, returning a list of any remaining tokens.
+        """
+
+        text = self._decode(b"", True) if self._decoder is not None else ""
+        return self._scan(text, True)
+
+
+def lex_table(buffer, source="<Buffer>", metadata=None, tokens=TOKENS):
+    """
+    Lexes all the text in a buffer into a `TokenTable`, without building token objects.
+    """
+
+    if not isinstance(buffer, str):
+        buffer = str(buffer, "utf-8")
+
+    dfa = compile_tokens(tokens)
+    table = TokenTable(
+        buffer,
+        intern_source(source),
+        [(type, pattern) for (_, type), pattern in zip(dfa.tokens, dfa.patterns)],
+        metadata,
+        LineIndex(buffer),
+    )
+
+    scan, append = dfa.scan, table.append
+    pos, end = 0, len(buffer)
+    while pos < end:
+        start = pos
+        pos, rule = scan(buffer, start)
+        if rule is None:
+            raise ValueError(
+                "Entered invalid state - no candidates for %r at %r!"
+                % (buffer[pos], OffsetPosition(pos, table.lines))
+            )
+        append(rule, start, pos)
+
+    return table
+
+
+def lex_chunks(chunks, source=None, metadata=None):
+    """
+    Returns the lazy sequence of tokens resulting from lexing an iterable of text chunks.
+    """
+
+    def tokens():
+        lexer = CalfIncrementalLexer(source, metadata)
+        for chunk in chunks:
+            yield from lexer.feed(chunk)
+        yield from lexer.close()
+
+    profile = profiling.ACTIVE
+    return tokens() if profile is None else profile.stage("lex", tokens(), source)
+
+
 def lex_file(path, metadata=None):
     """
-    Returns the sequence of tokens resulting from lexing all text in the named file.
+    Returns the lazy sequence of tokens resulting from lexing all text in the named file.
+
+    The file is memory mapped and decoded a chunk at a time, so lexing a file requires memory
+    proportional to the longest token rather than to the file.
     """
 
-    with open(path, "r") as f:
-        return list(CalfLexer(f, path, {}))
+    return lex_chunks(read_file_chunks(path), path, metadata)
 
 
 def lex_buffer(buffer, source="<Buffer>", metadata=None):
@@ -122,7 +407,9 @@ def lex_buffer(buffer, source="<Buffer>", metadata=None):
     Returns the lazy sequence of tokens resulting from lexing all the text in a buffer.
     """
 
-    return CalfLexer(io.StringIO(buffer), source, metadata)
+    lexer = CalfBufferLexer(buffer, source, metadata)
+    profile = profiling.ACTIVE
+    return lexer if profile is None else profile.stage("lex", lexer)
 
 
 def main():
@@ -0,0 +1,114 @@
+"""
+Bulk decoding of numeric literals.
+
+Data files are often mostly long vectors of numbers, which the lexer turns into one token object per
+element, the parser into one `CalfIntegerToken` or `CalfFloatToken` per element, and the reader into
+one `int` or `float` per element.
+
+`CalfNumericLexer` instead recognizes lists and vectors whose elements are all integers, or all
+floats, and decodes them straight from the source text into a single `array.array` (or, optionally,
+NumPy array).  Each such literal becomes one `CalfArrayToken`, which the reader produces as its
+array.  Any other literal is lexed as usual.
+
+Only elements the lexer would read as the same number are decoded in bulk: ASCII digits with an
+optional sign, fraction and exponent, separated by whitespace and commas.  Lists containing comments,
+mixed integers and floats, or integers which don't fit in 64 bits are left to the usual machinery.
+"""
+
+from array import array
+import re
+
+from calf.lexer import CalfBufferLexer
+from calf.token import NO_MORE, CalfArrayToken
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+_SEP = r"(?:[,\t ]|\n\r?)"
+
+_INTEGER = r"[+-]?[0-9]+"
+
+_FLOAT = r"[+-]?[0-9]+(?:\.[0-9]*(?:[eE][+-]?[0-9]+)?|[eE][+-]?[0-9]+)"
+
+
+def _literal(element):
+    # Each element must be followed by a separator or the close, so that it is a whole token
+    body = r"{s}*(?:{e}(?:{s}+{e})*{s}*)?".format(s=_SEP, e=element)
+    return re.compile(r"\[({b})\]|\(({b})\)".format(b=body))
+
+
+_INTEGER_LITERAL = _literal(_INTEGER)
+
+_FLOAT_LITERAL = _literal(_FLOAT)
+
+ARRAY_TYPES = {
+    "array": {"INTEGER": "q", "FLOAT": "d"},
+    "numpy": {"INTEGER": "int64", "FLOAT": "float64"},
+}
+
+
+def decode_array(buffer, pos=0, kind="array"):
+    """
+    Decodes a homogeneous, non-empty numeric list or vector literal starting at `pos` in `buffer`.
+
+    Returns a triple (end, element type, array), or None if there is no such literal at `pos`.
+    `kind` is either "array" for an `array.array`, or "numpy" for a NumPy array.
+    """
+
+    for element, pattern in (("INTEGER", _INTEGER_LITERAL), ("FLOAT", _FLOAT_LITERAL)):
+        m = pattern.match(buffer, pos)
+        if m is not None:
+            break
+    else:
+        return None
+
+    elements = (m.group(1) if m.group(1) is not None else m.group(2)).replace(",", " ").split()
+    if not elements:
+        return None
+
+    try:
+        if element == "INTEGER":
+            values = array("q", map(int, elements))
+        else:
+            values = array("d", map(float, elements))
+    except OverflowError:
+        return None
+
+    if kind == "numpy":
+        values = numpy.frombuffer(values, dtype=ARRAY_TYPES[kind][element])
+
+    return m.end(), element, values
+
+
+class CalfNumericLexer(CalfBufferLexer):
+    """
+    Whole buffer lexer object, which lexes homogeneous numeric lists and vectors as single
+    `CalfArrayToken`s.
+
+    `arrays` is "array" for `array.array` values, or "numpy" for NumPy arrays.  Raises ValueError if
+    NumPy arrays are requested but NumPy isn't installed.
+    """
+
+    def __init__(self, buffer, source=None, metadata=None, arrays="array", **kwargs):
+        super().__init__(buffer, source, metadata, **kwargs)
+        if arrays not in ARRAY_TYPES:
+            raise ValueError(f"Unknown array kind {arrays!r}")
+        elif arrays == "numpy" and numpy is None:
+            raise ValueError("NumPy arrays requested, but NumPy isn't installed")
+        self.arrays = arrays
+
+    def __next__(self):
+        start = self.offset
+        if start < len(self.buffer) and self.buffer[start] in "[(":
+            decoded = decode_array(self.buffer, start, self.arrays)
+            if decoded is not None:
+                end, element, values = decoded
+                self.offset = end
+                return CalfArrayToken(
+                    "ARRAY", values, self.source, start, NO_MORE, self.lines, element
+                )
+
+        return super().__next__()
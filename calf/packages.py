@@ -6,13 +6,31 @@ provide statically understandable, repeatable builds.
 
 However the loading infrastructure is designed to simultaneously support from-source builds
 appropriate to interactive development workflows and monorepos.
+
+Packages are laid out on the load path as `<path>/<name>/<version>/`, any `.calf` files under which
+are the package's modules.  Loading is lazy.  Scanning the load path only indexes which symbols
+each package defines, by lexing the heads of top level forms.  A package is only read when one of
+its symbols is first resolved.
 """
 
 from collections import namedtuple
+import os
+import re
+
+from calf.lexer import CalfBufferLexer
+from calf.grammar import WHITESPACE_TYPES
+from calf.reader import read_file
+from calf.scanner import form_boundaries
+from calf.types import Symbol, Vector
 
 
-class CalfLoaderConfig(namedtuple("CalfLoaderConfig", ["paths"])):
+class CalfLoaderConfig(namedtuple("CalfLoaderConfig", ["paths", "cache"], defaults=[None])):
     """
+  The configuration of a loader.
+
+  `paths` is the load path, a list of directories of packages.  Packages found on earlier paths
+  shadow those found on later paths.  `cache` is an optional `calf.cache.CalfCache` used when
+  reading modules.
   """
 
 
@@ -24,8 +42,24 @@ class CalfDelayedPackage(
 
   Rather than eagerly analyze packages, it may be profitable to use lazy loading / lazy resolution
   of symbols. It may also be possible to cache analyzing some packages.
+
+  `metadata` holds the package's index: "modules", the paths of its module files, and "symbols",
+  a mapping of each symbol defined at the top level of a module to the module defining it.
   """
 
+    def force(self, config):
+        """Reads every module of the package, producing a `CalfPackage`."""
+
+        return CalfPackage(
+            self.name,
+            self.version,
+            self.metadata,
+            {
+                module: list(read_file(module, cache=config.cache))
+                for module in self.metadata["modules"]
+            },
+        )
+
 
 class CalfPackage(
     namedtuple("CalfPackage", ["name", "version", "metadata", "modules"])
@@ -33,8 +67,124 @@ class CalfPackage(
     """
   This structure represents the result of forcing the load of a package, and is the product of
   either loading a package directly, or a package becoming a direct dependency and being forced.
+
+  `modules` maps the path of each module to the forms read from it.
+  """
+
+    def definition(self, name):
+        """Returns the top level form defining `name`, or None."""
+
+        module = self.metadata["symbols"].get(name)
+        for form in self.modules.get(module, ()):
+            if _defined_name(form) == name:
+                return form
+
+
+# The names of the forms which define their first argument
+_DEFINERS = frozenset([
+    "def",
+    "defn",
+    "defmacro",
+    "defonce",
+    "defmulti",
+    "defprotocol",
+    "defrecord",
+    "deftype",
+])
+
+_TRIVIA = re.compile(r"(?:[\s,]|;[^\n\r]*)*")
+
+
+def _defined_name(form):
+    if (isinstance(form, Vector)
+            and len(form) >= 2
+            and isinstance(form[0], Symbol)
+            and isinstance(form[1], Symbol)
+            and form[0].name in _DEFINERS):
+        return form[1].name
+
+
+def scan_definitions(text, source=None):
+    """
+  Returns the names of the symbols defined at the top level of some text by `(def name ...)`,
+  `(defn name ...)` and similar forms, without reading it.
+
+  Only the first few tokens of each top level form are lexed.
+  """
+
+    names = []
+    lexer = CalfBufferLexer(text, source)
+    start = _TRIVIA.match(text).end()
+    for end in form_boundaries(text):
+        head = []
+        lexer.offset = start
+        for token in lexer:
+            if token.offset >= end:
+                break
+            elif token.type not in WHITESPACE_TYPES:
+                head.append(token)
+                if len(head) == 3:
+                    break
+
+        if (len(head) == 3
+                and head[0].type == "PAREN_LEFT"
+                and head[1].type == "SYMBOL"
+                and head[2].type == "SYMBOL"
+                and head[1].more["name"] in _DEFINERS):
+            names.append(head[2].more["name"])
+
+        start = _TRIVIA.match(text, end).end()
+
+    return names
+
+
+def _version_key(version):
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part)
+            for part in re.split(r"[.\-]", version)]
+
+
+def _subdirectories(path):
+    """The sorted names of the directories in `path`."""
+
+    with os.scandir(path) as entries:
+        return sorted(entry.name for entry in entries if entry.is_dir())
+
+
+def index_packages(config):
+    """
+  Scans the load path, returning a mapping of package name to a mapping of version to
+  `CalfDelayedPackage`.
   """
 
+    index = {}
+    for root in config.paths:
+        if not os.path.isdir(root):
+            continue
+
+        # Stray files (READMEs, .DS_Store) may sit beside the package and version directories
+        for name in _subdirectories(root):
+            for version in _subdirectories(os.path.join(root, name)):
+                path = os.path.join(root, name, version)
+                if version in index.get(name, {}):
+                    continue
+
+                modules, symbols = [], {}
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    for filename in sorted(filenames):
+                        if filename.endswith(".calf"):
+                            module = os.path.join(dirpath, filename)
+                            modules.append(module)
+                            with open(module, "r") as f:
+                                for symbol in scan_definitions(f.read(), module):
+                                    symbols.setdefault(symbol, module)
+
+                index.setdefault(name, {})[version] = CalfDelayedPackage(
+                    name, version, {"modules": modules, "symbols": symbols}, path
+                )
+
+    return index
+
 
 def parse_package_requirement(config, env, requirement):
     """
@@ -43,9 +193,16 @@ def parse_package_requirement(config, env, requirement):
   :param requirement:
   :returns:
 
-  
+  Parses a requirement, either "name" or "name@version", into a pair (name, version).  If no
+  version is given, the version of the package already in the environment (if any) is used, else
+  None.
   """
 
+    name, _, version = requirement.partition("@")
+    if not version:
+        version = env[name].version if name in env else None
+    return name, version or None
+
 
 def analyze_package(config, env, package):
     """
@@ -57,3 +214,65 @@ def analyze_package(config, env, package):
   Given a loader configuration and an environment to load into, analyzes the requested package,
   returning an updated environment.
   """
+
+    if isinstance(package, CalfDelayedPackage):
+        package = package.force(config)
+    return dict(env, **{package.name: package})
+
+
+class CalfLoader(object):
+    """
+  Resolves symbols to their definitions, forcing packages only as their symbols are resolved.
+
+  `env` maps the name of each required package to its `CalfDelayedPackage`, or to its `CalfPackage`
+  once forced.
+  """
+
+    def __init__(self, config, requirements=()):
+        self.config = config
+        self.index = index_packages(config)
+        self.env = {}
+        for requirement in requirements:
+            self.require(requirement)
+
+    def require(self, requirement):
+        """Adds a package to the environment, without loading it. Defaults to the latest version."""
+
+        name, version = parse_package_requirement(self.config, self.env, requirement)
+        versions = self.index.get(name)
+        if not versions:
+            raise KeyError(f"No package {name!r} on the load path")
+
+        if version is None:
+            version = max(versions, key=_version_key)
+        elif version not in versions:
+            raise KeyError(f"No version {version!r} of package {name!r} on the load path")
+
+        current = self.env.get(name)
+        if current is None or current.version != version:
+            self.env[name] = versions[version]
+        return self.env[name]
+
+    def package(self, name):
+        """Returns the named package of the environment, forcing it if need be."""
+
+        if isinstance(self.env[name], CalfDelayedPackage):
+            self.env = analyze_package(self.config, self.env, self.env[name])
+        return self.env[name]
+
+    def resolve(self, symbol: Symbol):
+        """
+  Returns the form defining a symbol, or None.
+
+  A symbol with a namespace is resolved in the package of that name.  Otherwise, the first package
+  of the environment defining it is used.
+  """
+
+        if symbol.namespace is not None:
+            candidates = [symbol.namespace] if symbol.namespace in self.env else []
+        else:
+            candidates = list(self.env)
+
+        for name in candidates:
+            if symbol.name in self.env[name].metadata["symbols"]:
+                return self.package(name).definition(symbol.name)
@@ -3,13 +3,20 @@ The Calf parser.
 """
 
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from itertools import tee
 import logging
+import os
+import re
 import sys
 from typing import NamedTuple, Callable
+import unicodedata
 
-from calf.lexer import CalfLexer, lex_buffer, lex_file
+from calf import profiling
+from calf.io.reader import ChunkLines, LineIndex
+from calf.lexer import CalfBufferLexer, CalfIncrementalLexer, CalfLexer, lex_buffer, lex_file
 from calf.grammar import MATCHING, WHITESPACE_TYPES
+from calf.scanner import split_forms
 from calf.token import *
 
 
@@ -18,13 +25,23 @@ log = logging.getLogger(__name__)
 
 def mk_list(contents, open=None, close=None):
     return CalfListToken(
-        "LIST", contents, open.source, open.start_position, close.start_position
+        "LIST",
+        contents,
+        open.source,
+        open.start_position,
+        close.start_position,
+        open.lines,
     )
 
 
 def mk_sqlist(contents, open=None, close=None):
     return CalfListToken(
-        "SQLIST", contents, open.source, open.start_position, close.start_position
+        "SQLIST",
+        contents,
+        open.source,
+        open.start_position,
+        close.start_position,
+        open.lines,
     )
 
 
@@ -34,37 +51,164 @@ def pairwise(l: list) -> iter:
 
 
 def mk_dict(contents, open=None, close=None):
-    # FIXME (arrdem 2021-03-14):
-    #   Raise a real SyntaxError of some sort.
-    assert len(contents) % 2 == 0, "Improper dict!"
-    return CalfDictToken(
+    # Whitespace and comments (if not discarded) are kept in `elements`, but
+    # aren't keys or values.
+    forms = [f for f in contents if f.type not in WHITESPACE_TYPES]
+
+    if len(forms) % 2 != 0:
+        raise CalfParseError("Improper dict!", open)
+    token = CalfDictToken(
         "DICT",
-        list(pairwise(contents)),
+        list(pairwise(forms)),
         open.source,
         open.start_position,
         close.start_position,
+        open.lines,
     )
+    if len(forms) != len(contents):
+        token.elements = contents
+    return token
+
+
+# Escapes standing for a single character, as in Python string literals. An
+# escaped newline is a line continuation, standing for nothing.
+_ESCAPES = {
+    "\\": "\\",
+    "'": "'",
+    '"': '"',
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "\n": "",
+}
 
-def mk_str(token):
-    buff = token.value
+# The number of hex digits of each hex escape
+_HEX_ESCAPES = {"x": 2, "u": 4, "U": 8}
 
-    if buff.startswith('"""') and not buff.endswith('"""'):
-        raise ValueError('Unterminated tripple quote string')
+_HEX_DIGITS = "0123456789abcdefABCDEF"
 
-    elif buff.startswith('"') and not buff.endswith('"'):
-        raise ValueError('Unterminated quote string')
+_OCTAL_DIGITS = "01234567"
 
-    elif not buff.startswith('"') or buff == '"' or buff == '"""':
-        raise ValueError('Illegal string')
+# Text in which every escape is recognized and escapes an ASCII character, and
+# no octal escape is greater than \377
+_PLAIN_ESCAPES = re.compile(r"[^\\]*(?:\\(?:[\\'\"abfnrtv\nxuUN0-3]|[4-7](?![0-7]{2}))[^\\]*)*")
+
+# The most escapes decoded by _unescape before the codec is faster
+_FEW_ESCAPES = 4
+
+
+def decode_str(buff, start=0, end=None):
+    """Returns the value of the text of a STRING token.
+
+    Decodes `buff[start:end]`, so that the text needn't be sliced out of a
+    larger buffer. Escapes are as for Python string literals, and any other
+    character (including any non-ASCII character) stands for itself. Text
+    without escapes is returned as a single slice of `buff`.
+
+    """
+
+    end = len(buff) if end is None else end
+    if buff.startswith('"""', start, end):
+        if not buff.endswith('"""', start, end):
+            raise ValueError('Unterminated tripple quote string')
+        elif end - start == 3:
+            raise ValueError('Illegal string')
+        quote = 3
+
+    elif buff.startswith('"', start, end):
+        if not buff.endswith('"', start, end):
+            raise ValueError('Unterminated quote string')
+        elif end - start == 1:
+            raise ValueError('Illegal string')
+        quote = 1
 
-    if buff.startswith('"""'):
-        buff = buff[3:-3]
     else:
-        buff = buff[1:-1]
+        raise ValueError('Illegal string')
 
-    buff = buff.encode("utf-8").decode("unicode_escape")  # Handle escape codes
+    start, end = start + quote, max(start + quote, end - quote)
+    escapes = buff.count("\\", start, end)
+    if not escapes:
+        return buff[start:end]
+
+    # Decoding escapes one at a time is fastest for the usual few escapes, but
+    # copying the text through the unicode_escape codec is several times
+    # faster for text with many of them.
+    elif escapes <= _FEW_ESCAPES:
+        return _unescape(buff, start, end)
+
+    # The codec decodes ASCII text as Python would, so encode any other
+    # characters as escapes. It warns of unrecognized escapes, and would take
+    # an escaped non-ASCII character for the escape replacing it, so leave
+    # those, and errors, to _unescape.
+    if _PLAIN_ESCAPES.fullmatch(buff, start, end):
+        try:
+            return buff[start:end].encode("ascii", "backslashreplace").decode("unicode_escape")
+        except UnicodeDecodeError:
+            pass
+
+    return _unescape(buff, start, end)
+
+
+def _unescape(buff, start, end):
+    """Decodes the escapes of `buff[start:end]`, one at a time."""
+
+    i = buff.find("\\", start, end)
+    chunks = []
+    while i != -1:
+        chunks.append(buff[start:i])
+        c = buff[i + 1:i + 2] if i + 1 < end else ""
+        start = i + 2
+
+        e = _ESCAPES.get(c)
+        if e is not None:
+            chunks.append(e)
+
+        elif c in _HEX_ESCAPES:
+            digits = buff[start:min(start + _HEX_ESCAPES[c], end)]
+            if len(digits) != _HEX_ESCAPES[c] or digits.strip(_HEX_DIGITS):
+                raise ValueError(f"Truncated \\{c} escape at {i}")
+            elif int(digits, 16) > sys.maxunicode:
+                raise ValueError(f"Illegal unicode character \\{c}{digits} at {i}")
+            chunks.append(chr(int(digits, 16)))
+            start += len(digits)
+
+        elif c and c in _OCTAL_DIGITS:
+            j = i + 1
+            while j < min(i + 4, end) and buff[j] in _OCTAL_DIGITS:
+                j += 1
+            chunks.append(chr(int(buff[i + 1:j], 8)))
+            start = j
+
+        elif c == "N":
+            close = buff.find("}", start, end)
+            if not buff.startswith("{", start, end) or close == -1:
+                raise ValueError(f"Malformed \\N escape at {i}")
+            try:
+                chunks.append(unicodedata.lookup(buff[start + 1:close]))
+            except KeyError:
+                raise ValueError(f"Unknown unicode character name in \\N escape at {i}")
+            start = close + 1
 
-    return CalfStrToken(token, buff)
+        elif not c:
+            raise ValueError(f"Dangling \\ at {i}")
+
+        # Unrecognized escapes are left as they are
+        else:
+            chunks.append("\\")
+            start = i + 1
+
+        i = buff.find("\\", start, end)
+
+    chunks.append(buff[start:end])
+    return "".join(chunks)
+
+
+def mk_str(token):
+    return CalfStrToken(token, decode_str(token.value))
 
 
 CTORS = {
@@ -91,6 +235,18 @@ class CalfParseError(Exception):
     def __str__(self):
         return f"Parse error at {self.token.loc()}: " + super().__str__()
 
+    def __reduce__(self):
+        # The constructors of parse errors don't take their args, so restore
+        # them as-is. Lets parse errors cross process boundaries.
+        return (_restore_error, (type(self), self.args, self.__dict__))
+
+
+def _restore_error(cls, args, state):
+    e = cls.__new__(cls)
+    e.args = args
+    e.__dict__.update(state)
+    return e
+
 
 class CalfUnexpectedCloseParseError(CalfParseError):
     """
@@ -119,6 +275,54 @@ class CalfMissingCloseParseError(CalfParseError):
         self.expected_close_token = expected_close_token
 
 
+def mk_meta(token, meta, value):
+    return CalfMetaToken(token, meta, value)
+
+
+def mk_dispatch(token, tag, value):
+    return CalfDispatchToken(token, tag, value)
+
+
+def mk_quote(token, quoted):
+    return CalfQuoteToken(token, quoted)
+
+
+# Built in reader macros, being prefixes which apply to the following form(s).
+#
+# Each maps to its constructor, and the errors to raise if the input ends
+# before each of its operands.
+PREFIXES = {
+    "META": (
+        mk_meta,
+        ["^ not followed by meta value", "^ not followed by value"],
+    ),
+    "MACRO_DISPATCH": (
+        mk_dispatch,
+        ["# not followed by dispatch value", "# not followed by value"],
+    ),
+    "SINGLE_QUOTE": (
+        mk_quote,
+        ["' not followed by quoted form"],
+    ),
+}
+
+
+CLOSES = set(MATCHING.values())
+
+
+def _table_tokens(stream, discard_whitespace, discard_comments):
+    # Tokens which would be discarded are never built out of a TokenTable
+    if isinstance(stream, TokenTable):
+        skip = set()
+        if discard_whitespace:
+            skip.add("WHITESPACE")
+        if discard_comments:
+            skip.add("COMMENT")
+        stream = stream.tokens(skip)
+
+    return stream
+
+
 def parse_stream(stream,
                  discard_whitespace: bool = True,
                  discard_comments: bool = True,
@@ -130,90 +334,360 @@ def parse_stream(stream,
     included. Whether WHITESPACE tokens are included or not, the tokens of the
     tree will reflect original source locations.
 
+    The stream may also be a `TokenTable`, in which case discarded tokens are
+    never built at all.
+
+    `stack` is a list of (closing type, open token) pairs for collections which
+    enclose the stream. A close token for the innermost of them is produced as
+    the final form.
+
+    The parser is not recursive. It keeps an explicit stack of frames for open
+    collections and for reader macros awaiting their operands, so the cost of
+    each token does not depend on how deeply it is nested.
+
     """
 
-    stack = stack or []
+    stream = _table_tokens(stream, discard_whitespace, discard_comments)
+
+    profile = profiling.ACTIVE
+    if profile is None:
+        yield from _parse_stream(stream, discard_whitespace, discard_comments, stack)
+        return
+
+    if not isinstance(stream, profiling.Stage):
+        stream = profile.stage("lex", stream)
+    yield from profile.stage(
+        "parse",
+        _parse_stream(stream, discard_whitespace, discard_comments, stack),
+        stream.source)
+
+
+def _parse_stream(stream, discard_whitespace, discard_comments, stack):
+    frames = []
+    yield from _parse_forms(stream, frames, [], stack or [],
+                            discard_whitespace, discard_comments)
+
+    error = _incomplete(frames)
+    if error is not None:
+        raise error
+
+
+def _parse_forms(stream, frames, opens, outer, discard_whitespace, discard_comments):
+    """Parses tokens onto a stack of frames, producing each completed top level form.
+
+    Frames are (closing type, open token, forms) for collections, and (None,
+    macro token, operands) for reader macros. `opens` holds just the collection
+    frames, and `outer` the (closing type, open token) pairs of collections
+    enclosing the stream (see `parse_stream`). Open frames are left on the
+    stacks when the stream ends, so parsing may be resumed with more tokens.
+
+    """
 
-    def recur(_stack = None):
-        yield from parse_stream(stream,
-                                discard_whitespace,
-                                discard_comments,
-                                _stack or stack)
+    def unexpected_close(token):
+        candidates = outer + [(f[0], f[1]) for f in opens]
+        matching = next(reversed([t[1] for t in candidates if t[0] == token.type]), None)
+        return CalfUnexpectedCloseParseError(token, matching)
 
     for token in stream:
+        type = token.type
+
         # Whitespace discarding
-        if token.type == "WHITESPACE" and discard_whitespace:
+        if type == "WHITESPACE" and discard_whitespace:
             continue
 
-        elif token.type == "COMMENT" and discard_comments:
+        elif type == "COMMENT" and discard_comments:
             continue
 
         # Built in reader macros
-        elif token.type == "META":
-            try:
-                meta_t = next(recur())
-            except StopIteration:
-                raise CalfParseError("^ not followed by meta value", token)
-
-            try:
-                value_t = next(recur())
-            except StopIteration:
-                raise CalfParseError("^ not followed by value", token)
+        elif type in PREFIXES:
+            frames.append((None, token, []))
+            continue
 
-            yield CalfMetaToken(token, meta_t, value_t)
+        # Compounds
+        elif type in MATCHING:
+            frame = (MATCHING[type], token, [])
+            frames.append(frame)
+            opens.append(frame)
+            continue
 
-        elif token.type == "MACRO_DISPATCH":
-            try:
-                dispatch_t = next(recur())
-            except StopIteration:
-                raise CalfParseError("# not followed by dispatch value", token)
+        elif type in CLOSES:
+            # Case of matching the immediate open
+            if frames and frames[-1][0] is not None:
+                balancing, open, elements = frames[-1]
+                if balancing != type:
+                    raise unexpected_close(token)
+
+                frames.pop()
+                opens.pop()
+                form = CTORS[open.type](elements, open, token)
+
+            # Case of a close where a reader macro expected an operand, or at
+            # the top level. Either it closes the enclosing collection, in
+            # which case it is the operand, or it's wrong.
+            else:
+                enclosing = opens[-1][0] if opens else (outer[-1][0] if outer else None)
+                if type != enclosing:
+                    raise unexpected_close(token)
 
-            try:
-                value_t = next(recur())
-            except StopIteration:
-                raise CalfParseError("^ not followed by value", token)
+                elif not frames:
+                    yield token
+                    return
 
-            yield CalfDispatchToken(token, dispatch_t, value_t)
+                form = token
 
-        elif token.type == "SINGLE_QUOTE":
-            try:
-                quoted_t = next(recur())
-            except StopIteration:
-                raise CalfParseError("' not followed by quoted form", token)
+        # Atoms
+        elif type in CTORS:
+            form = CTORS[type](token)
 
-            yield CalfQuoteToken(token, quoted_t)
+        else:
+            form = token
 
-        # Compounds
-        elif token.type in MATCHING.keys():
-            balancing = MATCHING[token.type]
-            elements = list(recur(stack + [(balancing, token)]))
-            # Elements MUST have at least the close token in it
-            if not elements:
-                raise CalfMissingCloseParseError(balancing, token)
+        # Hand the completed form to the innermost frame, completing any
+        # reader macros it's the last operand of.
+        while True:
+            if not frames:
+                yield form
+                break
 
-            elements, close = elements[:-1], elements[-1]
-            if close.type != MATCHING[token.type]:
-                raise CalfMissingCloseParseError(balancing, token)
+            balancing, top, forms = frames[-1]
+            forms.append(form)
+            if balancing is not None:
+                break
 
-            yield CTORS[token.type](elements, token, close)
+            # Kept whitespace and comments aren't operands, but are kept in
+            # the macro's `elements`.
+            if type in WHITESPACE_TYPES:
+                break
 
-        elif token.type in MATCHING.values():
-            # Case of matching the immediate open
-            if stack and token.type == stack[-1][0]:
-                yield token
+            ctor, errors = PREFIXES[top.type]
+            operands = forms if discard_whitespace and discard_comments else _operands(forms)
+            if len(operands) < len(errors):
                 break
 
-            # Case of maybe matching something else, but definitely being wrong
+            frames.pop()
+            form = ctor(top, *operands)
+            if operands is not forms:
+                form.elements = forms
+
+
+def _incomplete(frames):
+    """The error for input ending with `frames` open, if any."""
+
+    if frames:
+        balancing, token, forms = frames[-1]
+        if balancing is not None:
+            return CalfMissingCloseParseError(balancing, token)
+
+        return CalfParseError(PREFIXES[token.type][1][len(_operands(forms))], token)
+
+
+def _operands(forms):
+    if any(f.type in WHITESPACE_TYPES for f in forms):
+        return [f for f in forms if f.type not in WHITESPACE_TYPES]
+    return forms
+
+
+class ParseEvent(NamedTuple):
+    """An event of `parse_events`.
+
+    `kind` is one of "start_list", "end_list", "start_map", "end_map", "atom",
+    "meta", "dispatch" or "quote". `token` is the open or close token of a
+    collection, the token of a reader macro, or the (constructed) atom.
+    `depth` is the number of collections enclosing the event.
+
+    """
+
+    kind: str
+    token: CalfToken
+    depth: int
+
+    @property
+    def offset(self):
+        return self.token.offset
+
+
+# Kinds of the events of opening and closing each type of collection
+EVENTS = {
+    "PAREN_LEFT": "start_list",
+    "BRACKET_LEFT": "start_list",
+    "BRACE_LEFT": "start_map",
+    "PAREN_RIGHT": "end_list",
+    "BRACKET_RIGHT": "end_list",
+    "BRACE_RIGHT": "end_map",
+    "META": "meta",
+    "MACRO_DISPATCH": "dispatch",
+    "SINGLE_QUOTE": "quote",
+}
+
+
+def parse_events(stream,
+                 discard_whitespace: bool = True,
+                 discard_comments: bool = True):
+    """Parses a token stream, producing a lazy sequence of `ParseEvent`s.
+
+    Rather than building forms, reports the start and end of each collection
+    and each atom as they're parsed. Only the stack of open collections and
+    reader macros is kept, so arbitrarily large collections may be streamed
+    over in constant memory.
+
+    Reader macros are reported by a single event, which is followed by the
+    events of their operands: two for "meta" and "dispatch", one for "quote".
+    Whitespace and comments which aren't discarded are atoms.
+
+    Raises the same errors as `parse_stream`, as the tokens causing them are
+    reached. As maps aren't built, collections used as map keys are no error.
+
+    """
+
+    stream = _table_tokens(stream, discard_whitespace, discard_comments)
+
+    # Frames are [closing type, open token, elements] for collections, and
+    # [None, macro token, remaining operands] for reader macros.
+    frames = []
+    opens = []
+
+    for token in stream:
+        type = token.type
+
+        if type == "WHITESPACE" and discard_whitespace:
+            continue
+
+        elif type == "COMMENT" and discard_comments:
+            continue
+
+        elif type in PREFIXES:
+            yield ParseEvent(EVENTS[type], token, len(opens))
+            frames.append([None, token, len(PREFIXES[type][1])])
+            continue
+
+        elif type in MATCHING:
+            yield ParseEvent(EVENTS[type], token, len(opens))
+            frame = [MATCHING[type], token, 0]
+            frames.append(frame)
+            opens.append(frame)
+            continue
+
+        elif type in CLOSES:
+            if frames and frames[-1][0] is not None and frames[-1][0] == type:
+                frame = frames.pop()
+                opens.pop()
+                if type == MATCHING["BRACE_LEFT"]:
+                    if frame[2] % 2 != 0:
+                        raise CalfParseError("Improper dict!", frame[1])
+                yield ParseEvent(EVENTS[type], token, len(opens))
+
+            # As for parse_stream, a close where a reader macro expected an
+            # operand is the operand if it closes the enclosing collection.
+            elif frames and frames[-1][0] is None and opens and opens[-1][0] == type:
+                yield ParseEvent("atom", token, len(opens))
+
             else:
-                matching = next(reversed([t[1] for t in stack if t[0] == token.type]), None)
+                matching = next(reversed([f[1] for f in opens if f[0] == type]), None)
                 raise CalfUnexpectedCloseParseError(token, matching)
 
-        # Atoms
-        elif token.type in CTORS:
-            yield CTORS[token.type](token)
-
         else:
-            yield token
+            yield ParseEvent("atom", CTORS[type](token) if type in CTORS else token, len(opens))
+
+            # Kept whitespace and comments are neither elements nor operands
+            if type in WHITESPACE_TYPES:
+                continue
+
+        # A form is complete. Count it against the innermost collection, and
+        # any reader macros it's the last operand of.
+        while frames:
+            frame = frames[-1]
+            if frame[0] is not None:
+                frame[2] += 1
+                break
+
+            frame[2] -= 1
+            if frame[2]:
+                break
+            frames.pop()
+
+    if frames:
+        balancing, token, remaining = frames[-1]
+        if balancing is not None:
+            raise CalfMissingCloseParseError(balancing, token)
+
+        errors = PREFIXES[token.type][1]
+        raise CalfParseError(errors[len(errors) - remaining], token)
+
+
+class CalfPushParser(object):
+    """Push parser object.
+
+    Accepts text (or bytes) in arbitrary chunks via `feed()`, returning the
+    top level forms completed by each chunk. Partial tokens are held back by a
+    `CalfIncrementalLexer`, and open collections and reader macros on a frame
+    stack, as for `parse_stream`, so no text is scanned twice and each chunk
+    costs time proportional to its length.
+
+    `close()` signals the end of input, returning any remaining forms and
+    raising if a collection or reader macro is incomplete.
+
+    Forms are parsed as `parse_stream` would parse the whole text, raising the
+    same errors. Forms completed by a chunk before an error are returned by
+    `feed()`, and the error raised by the next call. Once raised, an error is
+    raised again by every later call.
+
+    """
+
+    def __init__(self,
+                 source=None,
+                 discard_whitespace: bool = True,
+                 discard_comments: bool = True,
+                 metadata=None,
+                 encoding="utf-8"):
+        self.lexer = CalfIncrementalLexer(source, metadata, encoding=encoding)
+        self.discard_whitespace = discard_whitespace
+        self.discard_comments = discard_comments
+        # Frames are as for _parse_forms
+        self._frames = []
+        self._opens = []
+        self._error = None
+
+    @property
+    def error(self):
+        """The error to be raised by the next call, if any."""
+
+        return self._error
+
+    def feed(self, chunk) -> list:
+        """Adds a chunk of text, returning a list of the forms it completes."""
+
+        if self._error is not None:
+            raise self._error
+        return self._parse(self.lexer.feed, chunk)
+
+    def close(self) -> list:
+        """Ends the input, returning a list of any remaining forms.
+
+        Raises any error, rather than returning the forms before it.
+
+        """
+
+        if self._error is not None:
+            raise self._error
+
+        forms = self._parse(self.lexer.close)
+        error = self._error or _incomplete(self._frames)
+        if error is not None:
+            raise error
+        return forms
+
+    def _parse(self, lex, *args):
+        # Lexing and parsing errors both leave the parser's state unusable, so
+        # either is kept to be raised again
+        done = []
+        try:
+            done.extend(_parse_forms(lex(*args), self._frames, self._opens, [],
+                                     self.discard_whitespace, self.discard_comments))
+        except Exception as e:
+            self._error = e
+            if not done:
+                raise
+        return done
 
 
 def parse_buffer(buffer,
@@ -230,12 +704,65 @@ def parse_buffer(buffer,
                             discard_comments)
 
 
-def parse_file(file):
+def _parse_chunk(chunk, source, offset, line, column):
+    lines = ChunkLines(LineIndex(chunk), offset, line, column)
+    return list(parse_stream(CalfBufferLexer(chunk, source, lines=lines)))
+
+
+def parse_parallel(buffer, source="<Buffer>", workers=None):
+    """
+    Parses a buffer in parallel, producing a lazy sequence of all parsed top level forms.
+
+    The buffer is split between top level forms (see `calf.scanner`) into chunks which are parsed
+    by a pool of `workers` processes (by default, one per CPU).  The tokens of every form carry
+    their offsets, lines and columns within the whole buffer.
+
+    Propagates all errors.
+    """
+
+    workers = workers or os.cpu_count() or 1
+
+    chunks = []
+    line, prev = 1, 0
+    for start, end in split_forms(buffer, workers * 4):
+        line += buffer.count("\n", prev, start)
+        column = start - (buffer.rfind("\n", 0, start) + 1)
+        chunks.append((buffer[start:end], source, start, line, column))
+        prev = start
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from _parse_chunk(*chunk)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        for forms in executor.map(_parse_chunk, *zip(*chunks)):
+            yield from forms
+
+
+def parse_file(file, workers=None, cache=None):
     """
     Parses a file, producing a lazy sequence of all parsed level forms.
+
+    If `workers` is given, the file is parsed in parallel by `parse_parallel`.
+
+    If a `calf.cache.CalfCache` is given, the forms are fetched from or stored
+    to it.
     """
 
-    yield from parse_stream(lex_file(file))
+    if cache is not None:
+        yield from cache.cached(
+            "parse",
+            file,
+            lambda text: list(parse_parallel(text, file, workers) if workers
+                              else parse_stream(lex_buffer(text, file))))
+
+    elif workers:
+        with open(file, "r") as f:
+            yield from parse_parallel(f.read(), file, workers)
+
+    else:
+        yield from parse_stream(lex_file(file))
 
 
 def main():
@@ -0,0 +1,232 @@
+"""
+Calf profiling.
+
+Opt-in instrumentation of the read pipeline.  Within a `profile()` context (or for the whole process,
+if the environment variable `CALF_PROFILE` is set), the lexer, parser and reader record per source:
+
+  - the number of tokens lexed, by type
+  - the time spent in each stage, exclusive of the stages it pulls from
+  - the number of objects each stage produced, and the net memory blocks it allocated
+  - the number of regex evaluations
+  - the maximum collection nesting depth
+
+    >>> with profile() as p:
+    ...     forms = list(read_buffer("(foo [1 2])", "example"))
+    >>> p.stats("example").tokens["INTEGER"]
+    2
+
+When no profile is active, each pipeline entry point pays for one global lookup per call, and nothing
+per token.  Iterators record into the profile which was active when they were created.
+
+`CALF_PROFILE=1` prints a report to stderr at exit.  Any other value is taken as a path, to which the
+counters are written as JSON at exit.
+"""
+
+import atexit
+from collections import Counter
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+
+from calf.grammar import MATCHING
+
+
+# The Profile being recorded into, if any.
+ACTIVE = None
+
+STAGES = ("lex", "parse", "read")
+
+CLOSES = set(MATCHING.values())
+
+
+class SourceStats(object):
+    """
+    The counters of one source.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.tokens = Counter()
+        self.seconds = Counter()
+        self.objects = Counter()
+        self.blocks = Counter()
+        self.regex_calls = 0
+        self.max_depth = 0
+        self._depth = 0
+
+    def as_dict(self):
+        return {
+            "source": self.source,
+            "tokens": dict(self.tokens),
+            "seconds": dict(self.seconds),
+            "objects": dict(self.objects),
+            "blocks": dict(self.blocks),
+            "regex_calls": self.regex_calls,
+            "max_depth": self.max_depth,
+        }
+
+
+class Profile(object):
+    """
+    Counters for every source read while the profile was active.
+
+    Stages nest: the parser pulls tokens from the lexer, and the reader recurses into itself.  Time
+    and memory are charged to the innermost stage, so that the stages' figures sum to the total.
+    """
+
+    def __init__(self):
+        self.sources = {}
+        # Frames of [stats or None, child seconds, child blocks, regex calls] for running stages
+        self._stack = []
+
+    def stats(self, source):
+        """Returns the `SourceStats` of a source, creating them if need be."""
+
+        stats = self.sources.get(source)
+        if stats is None:
+            stats = self.sources[source] = SourceStats(source)
+        return stats
+
+    def count_regex(self, n=1):
+        """Records `n` regex evaluations against the running stage."""
+
+        if self._stack:
+            self._stack[-1][3] += n
+        else:
+            self.stats(None).regex_calls += n
+
+    def _enter(self, stats):
+        frame = [stats, 0.0, 0, 0]
+        self._stack.append(frame)
+        return frame, sys.getallocatedblocks(), time.perf_counter()
+
+    def _exit(self, name, frame, blocks, start, item, done):
+        elapsed = time.perf_counter() - start
+        allocated = sys.getallocatedblocks() - blocks
+        self._stack.pop()
+        if self._stack:
+            parent = self._stack[-1]
+            parent[1] += elapsed
+            parent[2] += allocated
+
+        stats = frame[0] or self.stats(getattr(item, "source", None))
+        stats.seconds[name] += elapsed - frame[1]
+        stats.blocks[name] += allocated - frame[2]
+        stats.regex_calls += frame[3]
+        if not done:
+            stats.objects[name] += 1
+        return stats
+
+    def stage(self, name, iterator, source=None):
+        """
+        Wraps an iterator, charging the work of producing each item to stage `name`.
+
+        Items are charged to `source`, or to the `source` attribute of the iterator or else the item.
+        Tokens produced by the "lex" stage are also counted by type.
+        """
+
+        if source is None:
+            source = getattr(iterator, "source", None)
+        return Stage(self, name, iterator, source)
+
+    def map(self, name, f, iterable):
+        """
+        Lazily applies `f` to each item, charging the work to stage `name` and the item's source.
+        """
+
+        for item in iterable:
+            frame, blocks, start = self._enter(self.stats(getattr(item, "source", None)))
+            try:
+                value = f(item)
+            finally:
+                self._exit(name, frame, blocks, start, item, False)
+            yield value
+
+    def as_dict(self):
+        """Returns the counters of every source, as a JSON compatible dict."""
+
+        return {str(source): stats.as_dict() for source, stats in self.sources.items()}
+
+    def dump(self, fp):
+        """Writes the counters of every source as JSON."""
+
+        json.dump(self.as_dict(), fp, indent=2)
+
+    def report(self, file=None):
+        """Prints a summary table of the counters of every source."""
+
+        file = file or sys.stderr
+        print(f"{'source':<32} {'tokens':>8} {'depth':>6} {'regex':>7} "
+              + " ".join(f"{s + ' s':>9} {s + ' objs':>10}" for s in STAGES),
+              file=file)
+        for source, stats in self.sources.items():
+            print(f"{str(source)[-32:]:<32} {sum(stats.tokens.values()):>8} "
+                  f"{stats.max_depth:>6} {stats.regex_calls:>7} "
+                  + " ".join(f"{stats.seconds[s]:>9.4f} {stats.objects[s]:>10}"
+                             for s in STAGES),
+                  file=file)
+
+
+class Stage(object):
+    """An iterator instrumented by `Profile.stage`."""
+
+    def __init__(self, profile, name, iterator, source):
+        self.profile = profile
+        self.name = name
+        self.source = source
+        self._iterator = iter(iterator)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        profile = self.profile
+        frame, blocks, start = profile._enter(
+            profile.stats(self.source) if self.source is not None else None
+        )
+        item, done = None, False
+        try:
+            item = next(self._iterator)
+        except BaseException:
+            done = True
+            raise
+        finally:
+            stats = profile._exit(self.name, frame, blocks, start, item, done)
+            if self.name == "lex" and item is not None:
+                type = item.type
+                stats.tokens[type] += 1
+                if type in MATCHING:
+                    stats._depth += 1
+                    stats.max_depth = max(stats.max_depth, stats._depth)
+                elif type in CLOSES:
+                    stats._depth -= 1
+        return item
+
+
+@contextmanager
+def profile():
+    """
+    Records into a new `Profile` for the duration of the context.
+    """
+
+    global ACTIVE
+    previous, ACTIVE = ACTIVE, Profile()
+    try:
+        yield ACTIVE
+    finally:
+        ACTIVE = previous
+
+
+def _dump_at_exit(profile, target):
+    if target == "1":
+        profile.report()
+    else:
+        with open(target, "w") as f:
+            profile.dump(f)
+
+
+if os.environ.get("CALF_PROFILE"):
+    ACTIVE = Profile()
+    atexit.register(_dump_at_exit, ACTIVE, os.environ["CALF_PROFILE"])
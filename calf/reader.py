@@ -6,13 +6,40 @@ discarding information.
 
 """
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+import os
 from typing import *
 
-from calf.lexer import lex_buffer, lex_file
-from calf.parser import parse_stream
+from calf import profiling
+from calf.dfa import compile_tokens
+from calf.grammar import MATCHING
+from calf.io.reader import LineIndex, OffsetPosition
+from calf.lexer import intern_source, lex_buffer, lex_file
+from calf.numeric import CalfNumericLexer
+from calf.parser import (
+    PREFIXES,
+    CalfMissingCloseParseError,
+    CalfPushParser,
+    CalfParseError,
+    CalfUnexpectedCloseParseError,
+    decode_str,
+    parse_stream,
+)
 from calf.token import *
 from calf.types import *
 
+_NOTHING = object()
+
+_NO_HOOKS = {}
+
+
+def _operand(t):
+    # The operand of a reader macro, as the elements of a collection
+    return iter((t.value,))
+
+
 class CalfReader(object):
     def handle_keyword(self, t: CalfToken) -> Any:
         """Convert a token to an Object value for a symbol.
@@ -61,6 +88,15 @@ class CalfReader(object):
 
         return self.read1(t.value)
 
+    def handle_array(self, t: CalfArrayToken) -> Any:
+        """Handle a numeric list or vector which was decoded in bulk.
+
+        The default implementation produces the array of its elements.
+
+        """
+
+        return t.value
+
     def make_quote(self):
         """Factory. Returns the quote or equivalent symbol. May use `self.make_symbol()` to do so."""
 
@@ -71,54 +107,231 @@ class CalfReader(object):
 
         return Vector.of([self.make_quote(), self.read1(t.value)])
 
-    def read1(self, t: CalfToken) -> Any:
-        # Note: 'square' and 'round' lists are treated the same. This should be
-        # a hook. Should {} be a "list" too until it gets reader hooked into
-        # being a mapping or a set?
-        if isinstance(t, CalfListToken):
-            return Vector.of(self.read(t.value))
+    def handle_list(self, t: CalfListToken, values: list) -> Any:
+        """Handle a () or [] list, given the values read from its elements.
 
-        elif isinstance(t, CalfDictToken):
-            return Map.of([(self.read1(k), self.read1(v))
-                           for k, v in t.items()])
+        Note: 'square' and 'round' lists are treated the same. Should {} be a
+        "list" too until it gets reader hooked into being a mapping or a set?
 
-        # Magical pairwise stuff
-        elif isinstance(t, CalfQuoteToken):
-            return self.handle_quote(t)
+        """
 
-        elif isinstance(t, CalfMetaToken):
-            return self.handle_meta(t)
+        return Vector.of(values)
 
-        elif isinstance(t, CalfDispatchToken):
-            return self.handle_dispatch(t)
+    def handle_dict(self, t: CalfDictToken, values: list) -> Any:
+        """Handle a {} map, given the values read from its keys and values in
+        alternation.
 
-        # Stuff with real factories
-        elif isinstance(t, CalfKeywordToken):
-            return self.handle_keyword(t)
+        """
 
-        elif isinstance(t, CalfSymbolToken):
-            return self.handle_symbol(t)
+        i = iter(values)
+        return Map.of(list(zip(i, i)))
+
+    def handle_str(self, t: CalfStrToken) -> Any:
+        return str(t)
+
+    def handle_integer(self, t: CalfIntegerToken) -> Any:
+        return int(t)
+
+    def handle_float(self, t: CalfFloatToken) -> Any:
+        return float(t)
+
+    # Token classes, and the names of the methods which read them. Tokens of
+    # other classes are read by the method of their nearest base class here.
+    HANDLERS = {
+        CalfStrToken: "handle_str",
+        CalfIntegerToken: "handle_integer",
+        CalfFloatToken: "handle_float",
+        CalfSymbolToken: "handle_symbol",
+        CalfKeywordToken: "handle_keyword",
+        CalfQuoteToken: "handle_quote",
+        CalfMetaToken: "handle_meta",
+        CalfDispatchToken: "handle_dispatch",
+        CalfArrayToken: "handle_array",
+        CalfListToken: "handle_list",
+        CalfDictToken: "handle_dict",
+    }
+
+    # Collection token classes, and how to iterate their elements.
+    CHILDREN = {
+        CalfListToken: lambda t: iter(t.value),
+        CalfDictToken: lambda t: chain.from_iterable(t.items()),
+    }
+
+    def _read_meta(self, t: CalfMetaToken, values: list) -> Any:
+        # handle_meta, given the value read from the token's operand
+        return values[0]
+
+    def _read_quote(self, t: CalfQuoteToken, values: list) -> Any:
+        # handle_quote, given the value read from the token's operand
+        return Vector.of([self.make_quote(), values[0]])
+
+    # Hooks which read the operands of reader macros themselves, and the methods which do the same
+    # given the values read from them. Unless a hook is overridden, the operand is read on the same
+    # stack as the elements of collections.
+    OPERAND_HOOKS = {
+        "handle_meta": "_read_meta",
+        "handle_quote": "_read_quote",
+    }
+
+    def _dispatch(self, table, cls, hooks):
+        for base in cls.__mro__:
+            name = self.HANDLERS.get(base)
+            if name is None:
+                continue
+
+            hook = hooks.get(name)
+            if hook is not None:
+                # Hooks set on the instance aren't passed the reader
+                handler = lambda self, *args, hook=hook: hook(*args)
+            else:
+                handler = getattr(type(self), name)
+
+            children = self.CHILDREN.get(base)
+            if name in self.OPERAND_HOOKS and handler is getattr(CalfReader, name):
+                handler = getattr(CalfReader, self.OPERAND_HOOKS[name])
+                children = _operand
+
+            entry = table[cls] = (handler, children)
+            return entry
+
+        return None
 
-        # Terminals
-        elif isinstance(t, CalfStrToken):
-            return str(t)
+    def read1(self, t: CalfToken) -> Any:
+        """Read one token tree into a value.
 
-        elif isinstance(t, CalfIntegerToken):
-            return int(t)
+        Each token is read by the hook its class maps to in `HANDLERS`, found
+        with a single lookup in a table of the hooks of this reader's class,
+        built as token classes are first read. Collections, and the operands
+        of quotes and metadata (unless their hooks are overridden), are read
+        without recursion, so that deeply nested trees can't exhaust the stack.
 
-        elif isinstance(t, CalfFloatToken):
-            return float(t)
+        """
 
+        # Hooks may also be set on the instance, in which case the table is
+        # built just for this call
+        hooks = getattr(self, "__dict__", _NO_HOOKS)
+        if hooks and not hooks.keys().isdisjoint(self.HANDLERS.values()):
+            table = {}
         else:
-            raise ValueError(f"Unsupported token type {t!r} ({type(t)})")
+            hooks = _NO_HOOKS
+            table = type(self).__dict__.get("_handlers")
+            if table is None:
+                table = {}
+                type(self)._handlers = table
+
+        # Frames of (handler, token, remaining elements or operands, values)
+        stack = []
+        while True:
+            cls = type(t)
+            entry = table.get(cls) or self._dispatch(table, cls, hooks)
+            if entry is None:
+                raise ValueError(f"Unsupported token type {t!r} ({type(t)})")
+
+            handler, children = entry
+            if children is None:
+                value = handler(self, t)
+            else:
+                stack.append((handler, t, children(t), []))
+                value = _NOTHING
+
+            while stack:
+                handler, token, elements, values = stack[-1]
+                if value is not _NOTHING:
+                    values.append(value)
+
+                t = next(elements, _NOTHING)
+                if t is not _NOTHING:
+                    break
+
+                stack.pop()
+                value = handler(self, token, values)
+
+            else:
+                return value
 
     def read(self, stream):
         """Given a sequence of tokens, read 'em."""
 
+        profile = profiling.ACTIVE
+        if profile is not None:
+            yield from profile.map("read", self.read1, stream)
+            return
+
         for t in stream:
             yield self.read1(t)
 
 
+class InternTable(object):
+    """A bounded table of canonical instances of a `Symbol`-like type.
+
+    Calling the table with a name and namespace returns the canonical instance
+    for that (namespace, name), constructing it on first use. Once the table
+    holds `limit` instances, the least recently used is dropped, after which
+    its (namespace, name) will get a new canonical instance.
+
+    Symbols and keywords are tuples, which can't be weakly referenced, hence
+    the bound rather than a weak-value table.
+
+    """
+
+    def __init__(self, cls, limit: int = 1 << 16):
+        self.cls = cls
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self._table = OrderedDict()
+
+    def __len__(self):
+        return len(self._table)
+
+    def __call__(self, name: str, namespace: str = None):
+        key = (namespace, name)
+        value = self._table.get(key)
+        if value is not None:
+            self.hits += 1
+            self._table.move_to_end(key)
+            return value
+
+        self.misses += 1
+        if len(self._table) >= self.limit:
+            self._table.popitem(last=False)
+        value = self._table[key] = self.cls.of(name, namespace)
+        return value
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+
+class CalfInterningReader(CalfReader):
+    """A reader which interns symbols and keywords.
+
+    Every occurrence of a symbol (or keyword) read by one reader is the same
+    object, so long as no more than `limit` distinct symbols (or keywords) are
+    in use. Identity may be used to compare them, and repeated symbols cost
+    only one object.
+
+    """
+
+    def __init__(self, limit: int = 1 << 16):
+        self.symbols = InternTable(Symbol, limit)
+        self.keywords = InternTable(Keyword, limit)
+
+    def handle_keyword(self, t: CalfToken) -> Any:
+        return self.keywords(t.more.get("name"), t.more.get("namespace"))
+
+    def handle_symbol(self, t: CalfToken) -> Any:
+        return self.symbols(t.more.get("name"), t.more.get("namespace"))
+
+    def make_quote(self):
+        return self.symbols("quote")
+
+    def stats(self) -> dict:
+        """Returns the hit and miss counts and sizes of the interning tables."""
+
+        return {"symbols": self.symbols.stats(),
+                "keywords": self.keywords.stats()}
+
+
 def read_stream(stream,
                 reader: CalfReader = None):
     """Read from a stream of parsed tokens.
@@ -129,20 +342,362 @@ def read_stream(stream,
     yield from reader.read(stream)
 
 
-def read_buffer(buffer):
+def read_buffer(buffer, source="<Buffer>", arrays=None,
+                reader: CalfReader = None):
     """Read from a buffer, producing a lazy sequence of all top level forms.
 
+    If `arrays` is "array" (or "numpy"), lists and vectors of only integers or
+    only floats are read as `array.array`s (or NumPy arrays), decoded in bulk
+    by `calf.numeric.CalfNumericLexer`.
+
     """
 
-    yield from read_stream(parse_stream(lex_buffer(buffer)))
+    if arrays:
+        tokens = CalfNumericLexer(buffer, source, arrays=arrays)
+    else:
+        tokens = lex_buffer(buffer, source)
+
+    yield from read_stream(parse_stream(tokens), reader)
 
 
-def read_file(file):
+def read_file(file, cache=None, arrays=None):
     """Read from a file, producing a lazy sequence of all top level forms.
 
+    If a `calf.cache.CalfCache` is given, the forms are fetched from or stored
+    to it. `arrays` is as for `read_buffer`.
+
+    """
+
+    if cache is not None:
+        yield from cache.cached(
+            f"read-{arrays}" if arrays else "read",
+            file,
+            lambda text: list(read_buffer(text, file, arrays)))
+
+    elif arrays:
+        with open(file, "r", encoding="utf-8") as f:
+            yield from read_buffer(f.read(), file, arrays)
+
+    else:
+        yield from read_stream(parse_stream(lex_file(file)))
+
+
+# How read_values handles each token type
+_SKIP, _SYMBOL, _KEYWORD, _INTEGER, _FLOAT, _STRING = range(6)
+_LIST, _MAP, _CLOSE, _QUOTE, _META, _TAGGED = range(6, 12)
+
+_KINDS = {
+    "WHITESPACE": _SKIP,
+    "COMMENT": _SKIP,
+    "SYMBOL": _SYMBOL,
+    "KEYWORD": _KEYWORD,
+    "INTEGER": _INTEGER,
+    "FLOAT": _FLOAT,
+    "STRING": _STRING,
+    "PAREN_LEFT": _LIST,
+    "BRACKET_LEFT": _LIST,
+    "BRACE_LEFT": _MAP,
+    "PAREN_RIGHT": _CLOSE,
+    "BRACKET_RIGHT": _CLOSE,
+    "BRACE_RIGHT": _CLOSE,
+    "SINGLE_QUOTE": _QUOTE,
+    "META": _META,
+    "MACRO_DISPATCH": _TAGGED,
+}
+
+# The number of operands of each reader macro
+_OPERANDS = {_QUOTE: 1, _META: 2, _TAGGED: 2}
+
+
+class _Operand(NamedTuple):
+    """A close token standing as the operand of a reader macro."""
+
+    start: int
+    end: int
+    rule: int
+
+
+def _read_values(buffer, source, dispatch):
+    dfa = compile_tokens()
+    scan = dfa.scan
+    types = [type for _, type in dfa.tokens]
+    kinds = [_KINDS[type] for type in types]
+    more = MoreCache()
+    lines = []
+
+    def token(start, end, rule):
+        if not lines:
+            lines.append(LineIndex(buffer))
+        value = buffer[start:end]
+        return CalfLexToken(types[rule], value, source, start,
+                            more(dfa.patterns[rule], value), lines[0])
+
+    def unexpected_close(start, end, rule):
+        candidates = [f for f in opens if f[5] == types[rule]]
+        return CalfUnexpectedCloseParseError(
+            token(start, end, rule),
+            token(*candidates[-1][1:4]) if candidates else None)
+
+    # The first close read as the operand of a reader macro, which is an
+    # error once its top level form is complete.
+    unsupported = None
+
+    quote = Symbol.of("quote")
+    atoms = {}
+
+    # Frames are [kind, start, end, rule, values, closing type]. `opens`
+    # holds just the collection frames.
+    frames = []
+    opens = []
+
+    pos, end = 0, len(buffer)
+    while pos < end:
+        start = pos
+        pos, rule = scan(buffer, start)
+        if rule is None:
+            if not lines:
+                lines.append(LineIndex(buffer))
+            raise ValueError(
+                "Entered invalid state - no candidates for %r at %r!"
+                % (buffer[start], OffsetPosition(start, lines[0])))
+
+        kind = kinds[rule]
+        if kind is _SKIP:
+            continue
+
+        elif kind is _SYMBOL or kind is _KEYWORD:
+            text = buffer[start:pos]
+            value = atoms.get(text)
+            if value is None:
+                groups = more(dfa.patterns[rule], text)
+                cls = Symbol if kind is _SYMBOL else Keyword
+                value = atoms[text] = cls.of(groups.get("name"),
+                                             groups.get("namespace"))
+
+        elif kind is _INTEGER:
+            value = int(buffer[start:pos])
+
+        elif kind is _FLOAT:
+            value = float(buffer[start:pos])
+
+        elif kind is _STRING:
+            value = decode_str(buffer, start, pos)
+
+        elif kind is _LIST or kind is _MAP:
+            frame = [kind, start, pos, rule, [], MATCHING[types[rule]]]
+            frames.append(frame)
+            opens.append(frame)
+            continue
+
+        elif kind is _CLOSE:
+            closing = types[rule]
+            if frames and frames[-1][5] is not None:
+                if frames[-1][5] != closing:
+                    raise unexpected_close(start, pos, rule)
+
+                frame = frames.pop()
+                opens.pop()
+                values = frame[4]
+                if frame[0] is _LIST:
+                    value = Vector.of(values)
+                else:
+                    if len(values) % 2 != 0:
+                        raise CalfParseError("Improper dict!", token(*frame[1:4]))
+                    i = iter(values)
+                    value = Map.of(dict(zip(i, i)))
+
+            # A close where a reader macro expected an operand
+            elif opens and opens[-1][5] == closing:
+                value = _Operand(start, pos, rule)
+
+            else:
+                raise unexpected_close(start, pos, rule)
+
+        else:
+            frames.append([kind, start, pos, rule, [], None])
+            continue
+
+        # Hand the completed value to the innermost frame, completing any
+        # reader macros it's the last operand of.
+        while True:
+            if not frames:
+                if unsupported is not None:
+                    t = token(*unsupported)
+                    raise ValueError(f"Unsupported token type {t!r} ({type(t)})")
+
+                yield value
+                break
+
+            frame = frames[-1]
+            values = frame[4]
+            values.append(value)
+            kind = frame[0]
+            if kind is _LIST or kind is _MAP or len(values) < _OPERANDS[kind]:
+                break
+
+            frames.pop()
+            for operand in values[1:] if kind is _META else values:
+                if isinstance(operand, _Operand) and (
+                        unsupported is None or operand.start < unsupported.start):
+                    unsupported = operand
+
+            if kind is _META:
+                value = values[1]
+
+            elif kind is _QUOTE:
+                value = Vector.of([quote, values[0]])
+
+            elif dispatch is None:
+                raise CalfParseError("# dispatch requires a dispatch handler",
+                                     token(*frame[1:4]))
+
+            elif unsupported is None:
+                value = dispatch(*values)
+
+    if frames:
+        kind, start, end, rule, values, closing = frames[-1]
+        if closing is not None:
+            raise CalfMissingCloseParseError(closing, token(start, end, rule))
+
+        raise CalfParseError(PREFIXES[types[rule]][1][len(values)],
+                             token(start, end, rule))
+
+
+def read_values(buffer, source="<Buffer>", dispatch=None):
+    """Read from a buffer straight to values, producing a lazy sequence of all
+    top level forms.
+
+    Produces the same values as `read_buffer` with the default reader, but
+    without building tokens or a parse tree, so it's considerably cheaper.
+    Tokens are only built to report errors.
+
+    As there are no tokens to preserve, # dispatch forms are read by calling
+    `dispatch(tag, value)` with the tag and value read. A dispatch form with no
+    `dispatch` raises `CalfParseError`.
+
+    Maps may have collection keys, which `read_buffer` can't read.
+
     """
 
-    yield from read_stream(parse_stream(lex_file(file)))
+    if not isinstance(buffer, str):
+        buffer = str(buffer, "utf-8")
+
+    values = _read_values(buffer, intern_source(source), dispatch)
+    profile = profiling.ACTIVE
+    if profile is not None:
+        values = profile.stage("read", values, source)
+
+    yield from values
+
+
+def read_file_values(file, dispatch=None):
+    """Read from a file straight to values, as for `read_values`."""
+
+    with open(file, "r", encoding="utf-8") as f:
+        yield from read_values(f.read(), file, dispatch)
+
+
+class FileResult(NamedTuple):
+    """The result of reading one file with `read_files`.
+
+    `offsets` are the start offsets of each of the `forms`, if requested. If
+    reading the file failed, `error` describes why and `forms` holds the forms
+    read before the failure.
+
+    """
+
+    path: str
+    forms: list
+    offsets: Optional[list]
+    error: Optional[str]
+
+
+def _read_file_result(path, reader: CalfReader = None, offsets: bool = False):
+    reader = reader or CalfReader()
+    forms, form_offsets = [], [] if offsets else None
+    try:
+        for t in parse_stream(lex_file(path)):
+            forms.append(reader.read1(t))
+            if offsets:
+                form_offsets.append(t.offset)
+    except Exception as e:
+        return FileResult(path, forms, form_offsets, f"{type(e).__name__}: {e}")
+
+    return FileResult(path, forms, form_offsets, None)
+
+
+def read_files(paths,
+               workers: int = None,
+               reader: CalfReader = None,
+               offsets: bool = False):
+    """Read many files, fanning the work out across `workers` processes.
+
+    Produces a lazy sequence of one `FileResult` per path, in path order.
+    Errors are reported per file rather than raised. The `reader` (if any) must
+    be picklable.
+
+    `workers` defaults to the number of CPUs. With `workers=1`, files are read
+    in this process.
+
+    """
+
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        for path in paths:
+            yield _read_file_result(path, reader, offsets)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        chunksize = max(1, len(paths) // (workers * 4))
+        yield from executor.map(_read_file_result,
+                                paths,
+                                [reader] * len(paths),
+                                [offsets] * len(paths),
+                                chunksize=chunksize)
+
+
+async def aread(stream,
+                source="<Stream>",
+                reader: CalfReader = None,
+                encoding="utf-8",
+                size=1 << 16):
+    """Read from an `asyncio.StreamReader`, producing values as they arrive.
+
+        async for form in aread(stream_reader):
+            ...
+
+    The stream is read `size` bytes at a time, and each chunk lexed as it
+    arrives by a `CalfPushParser`, so tokens and characters may be split between
+    chunks. Each top level form is read as soon as it balances, without waiting
+    for the rest of the stream. Only the text of the pending token and the
+    frames of the pending form are kept, and no work blocks for longer than it
+    takes to parse one chunk, so many streams may be read concurrently.
+
+    The stream may also produce text, rather than bytes in `encoding`. Raises
+    the same errors as `read_buffer`, as the forms causing them are reached.
+
+    """
+
+    reader = reader or CalfReader()
+    parser = CalfPushParser(source, encoding=encoding)
+
+    while True:
+        chunk = await stream.read(size)
+        if not chunk:
+            break
+
+        for value in reader.read(parser.feed(chunk)):
+            yield value
+
+        # Raise any error as soon as the forms before it are read, rather than
+        # waiting on the next chunk
+        if parser.error is not None:
+            raise parser.error
+
+    for value in reader.read(parser.close()):
+        yield value
 
 
 def main():
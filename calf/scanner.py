@@ -0,0 +1,341 @@
+"""
+A cheap structural pre-scan of Calf text.
+
+Finds where top level forms end without lexing or parsing.  A single regex pass skips over strings
+and comments (as the lexer would scan them) and runs of non-delimiter characters, while tracking the
+stack of open `MATCHING` delimiters and of reader macros awaiting operands.  Only the operands of
+reader macros are ever lexed.
+
+`scan()` goes further, finding the spans of collections, strings, comments and top level forms
+without lexing at all, for tools (bracket matching, folding, "is this input complete?") which
+mustn't pay for a parse.
+"""
+
+import re
+from typing import NamedTuple, Optional
+
+from calf.dfa import compile_tokens
+from calf.grammar import DELIMS, TOKENS
+from calf.io.reader import LineIndex
+
+_OPEN = {"(": ")", "[": "]", "{": "}"}
+
+_CLOSE = set(_OPEN.values())
+
+_PREFIX_ARITY = {"^": 2, "#": 2, "'": 1}
+
+# Note that a " preceded by a backslash never closes a string, as per STRING_PATTERN, and that a
+# """ string runs to the end of its line.
+_DELIMITED = (
+    r'(?P<string>"""[^\n]*|"(?:\\"|[^"])*"?)'
+    r"|(?P<comment>;[^\n\r]*)"
+    r"|(?P<open>[\(\[\{])"
+    r"|(?P<close>[\)\]\}])"
+    r"|(?P<prefix>[\^#'])"
+)
+
+_ATOM = r":?[^%s]+|:" % (DELIMS,)
+
+_STRUCTURE = re.compile(_DELIMITED + r"|(?P<atom>%s)" % (_ATOM,))
+
+
+def _token_ends(text, start, end):
+    """The ends of the tokens the lexer would split a run of non-delimiter text into."""
+
+    dfa = compile_tokens(TOKENS)
+    while start < end:
+        start, _ = dfa.scan(text, start, end)
+        yield start
+
+
+def form_boundaries(text, pos=0):
+    """
+    Lazily produces the offsets in `text` at which top level forms end.
+
+    Only offsets at which the parser would be at the top level, with no reader macro (^, #, ')
+    awaiting operands, are produced.  These are safe places to split text to be parsed separately.
+    Runs of non-delimiter text are taken to be single forms (although "1foo" lexes as two tokens)
+    unless a reader macro is awaiting operands, so not every form boundary is found.
+
+    Stops at the first unbalanced close delimiter, as no later offset is safe.
+    """
+
+    # Frames are the expected closing delimiter of open collections, or the number of operands
+    # reader macros still await.
+    frames = []
+
+    for m in _STRUCTURE.finditer(text, pos):
+        kind = m.lastgroup
+
+        if kind == "comment":
+            continue
+
+        elif kind == "open":
+            frames.append(_OPEN[m.group()])
+            continue
+
+        elif kind == "prefix":
+            frames.append(_PREFIX_ARITY[m.group()])
+            continue
+
+        elif kind == "close":
+            if frames and isinstance(frames[-1], str):
+                if frames.pop() != m.group():
+                    return
+
+            # A close where a reader macro expects an operand is the operand, if it would close
+            # the enclosing collection.
+            elif next((f for f in reversed(frames) if isinstance(f, str)), None) != m.group():
+                return
+
+        if kind == "atom" and frames and not isinstance(frames[-1], str):
+            ends = _token_ends(text, m.start(), m.end())
+        else:
+            ends = (m.end(),)
+
+        for end in ends:
+            # A form just ended, completing any reader macros waiting on it
+            while frames and not isinstance(frames[-1], str):
+                frames[-1] -= 1
+                if frames[-1]:
+                    break
+                frames.pop()
+
+            if not frames:
+                yield end
+
+
+def split_forms(text, n):
+    """
+    Returns up to `n` (start, end) spans of roughly equal size covering `text`, split only between
+    top level forms.
+    """
+
+    spans, start = [], 0
+    target = len(text) // n
+    for end in form_boundaries(text):
+        if end >= target and end < len(text):
+            spans.append((start, end))
+            start = end
+            target = start + max(1, (len(text) - start) // max(1, n - len(spans)))
+            if len(spans) == n - 1:
+                break
+
+    spans.append((start, len(text)))
+    return spans
+
+
+# Skips to the next delimiter (or the end of the text) within each match, rather than leaving the
+# regex engine to search for it one position at a time.  Every delimiter starts a match of some
+# alternative, so the skip never backtracks.
+_DELIMITERS = re.compile(r"""[^"\(\)\[\]\{\};\^#']*(?:%s|\Z)""" % (_DELIMITED,))
+
+_ATOMS = re.compile(_ATOM)
+
+_SPAN = re.Match.span
+
+
+class Span(NamedTuple):
+    """
+    A span of text found by `scan()`, from `start` to `end` (exclusive).
+
+    `end` is None for a collection which is never closed.
+    """
+
+    start: int
+    end: Optional[int]
+
+
+class Structure(NamedTuple):
+    """
+    The structure of a text, as found by `scan()`.
+
+    `collections`, `strings` and `comments` are spans in order of their start, and `forms` the spans
+    of top level forms.  `error` is the offset of an unbalanced close delimiter, after which nothing
+    is scanned, or None.  `complete` is whether the text is a whole number of forms, or would fail
+    to parse however it continued.
+    """
+
+    collections: list
+    strings: list
+    comments: list
+    forms: list
+    error: Optional[int]
+    complete: bool
+
+
+def scan(text, pos=0) -> Structure:
+    """
+    Scans the structure of `text` from `pos`, in a single pass.
+
+    Only delimiters, strings and comments are matched, so the text of collections is skipped over by
+    the regex engine.  Atoms are only looked for at the top level and as the operands of reader
+    macros.  Unlike `form_boundaries` this never lexes, taking every run of non-delimiter
+    characters to be one atom (although "1foo" lexes as two tokens), so it works for any grammar
+    sharing Calf's delimiters.
+    """
+
+    collections, strings, comments, forms = [], [], [], []
+    error = None
+
+    # Frames are as for form_boundaries.  Opens are the closing delimiter and index in collections
+    # of each open collection.
+    frames, opens = [], []
+    start = last = pos
+    complete = True
+
+    def completed(end):
+        # A form just ended, completing any reader macros waiting on it
+        while frames and not isinstance(frames[-1], str):
+            frames[-1] -= 1
+            if frames[-1]:
+                return
+            frames.pop()
+
+        if not frames:
+            forms.append(Span(start, end))
+
+    for m in _DELIMITERS.finditer(text, pos):
+        # No delimiter remains if no group matched
+        kind = m.lastgroup
+        begin = m.start(kind) if kind is not None else m.end()
+
+        # Atoms matter only at the top level, or as the operands of reader macros
+        if last < begin and (not frames or not isinstance(frames[-1], str)):
+            atoms = _ATOMS.finditer(text, last, begin)
+            while frames and not isinstance(frames[-1], str):
+                atom = next(atoms, None)
+                if atom is None:
+                    break
+                completed(atom.end())
+
+            # Each remaining atom is a top level form of its own
+            if not frames:
+                forms.extend(map(Span._make, map(_SPAN, atoms)))
+
+        if kind is None:
+            break
+
+        last = m.end()
+        delim = m.group(kind)
+        if not frames and kind != "comment":
+            start = begin
+
+        if kind == "comment":
+            comments.append(Span(begin, last))
+            continue
+
+        elif kind == "open":
+            opens.append((_OPEN[delim], len(collections)))
+            frames.append(opens[-1][0])
+            collections.append(Span(begin, None))
+            continue
+
+        elif kind == "prefix":
+            frames.append(_PREFIX_ARITY[delim])
+            continue
+
+        elif kind == "string":
+            strings.append(Span(begin, last))
+            if delim.startswith('"""'):
+                terminated = len(delim) >= 6 and delim.endswith('"""')
+            else:
+                terminated = len(delim) >= 2 and delim.endswith('"') \
+                    and not _escaped(text, begin + 1, last - 1)
+
+            # An unterminated string ending the text may yet be continued, but a """ string ends
+            # with its line.
+            if not terminated and last == len(text):
+                complete = False
+
+        elif kind == "close":
+            if frames and isinstance(frames[-1], str):
+                if frames[-1] != delim:
+                    error = begin
+                    break
+                frames.pop()
+                _, idx = opens.pop()
+                collections[idx] = Span(collections[idx].start, last)
+
+            # A close where a reader macro expects an operand is the operand, if it would close the
+            # enclosing collection.
+            elif not opens or opens[-1][0] != delim:
+                error = begin
+                break
+
+        completed(last)
+
+    return Structure(
+        collections,
+        strings,
+        comments,
+        forms,
+        error,
+        error is not None or (complete and not frames),
+    )
+
+
+def _escaped(text, start, end):
+    """Whether the character at `end` follows an odd run of backslashes after `start`."""
+
+    i = end
+    while i > start and text[i - 1] == "\\":
+        i -= 1
+    return (end - i) % 2 == 1
+
+
+def is_complete(text) -> bool:
+    """
+    Whether `text` is a whole number of forms, or would fail to parse however it continued.
+
+    Lets a REPL decide whether to read another line before parsing what it has.
+    """
+
+    return scan(text).complete
+
+
+def matching_delimiters(text) -> dict:
+    """
+    Returns a dict mapping the offset of each matched delimiter in `text` to that of its partner.
+    """
+
+    pairs = {}
+    for start, end in scan(text).collections:
+        if end is not None:
+            pairs[start] = end - 1
+            pairs[end - 1] = start
+    return pairs
+
+
+def folding_ranges(text, lines: LineIndex = None) -> list:
+    """
+    Returns the (first, last) lines of each collection and string spanning lines, and of each run of
+    comments on consecutive lines, in order of their first line.
+
+    Lines are 1-indexed, as for `LineIndex`.
+    """
+
+    lines = lines or LineIndex(text)
+    line = lines.line
+    structure = scan(text)
+
+    ranges = []
+    for start, end in structure.collections + structure.strings:
+        first, last = line(start), line((len(text) if end is None else end) - 1)
+        if first < last:
+            ranges.append((first, last))
+
+    first = last = None
+    for start, _ in structure.comments:
+        n = line(start)
+        if last is not None and n == last + 1:
+            last = n
+            continue
+        if last is not None and first < last:
+            ranges.append((first, last))
+        first = last = n
+    if last is not None and first < last:
+        ranges.append((first, last))
+
+    ranges.sort()
+    return ranges
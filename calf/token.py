@@ -9,21 +9,116 @@ Consequently, this file defines classes which wrap core Python primitives, provi
 bits in terms of acting like values, while preserving fairly extensive source information.
 """
 
+from array import array
 
-class CalfToken:
+from calf import profiling
+
+
+class FrozenMore(dict):
+    """
+    A read-only dict, for the `more` of tokens.
+
+    `more`s are shared between tokens, so mutating one in place would change every token holding
+    it.  Raises TypeError on any attempt to, so that a token's `more` must be replaced instead.
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("The more of a token is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenMore, (dict(self),))
+
+
+NO_MORE = FrozenMore()
+"""The `more` shared by all tokens which have no named groups."""
+
+
+class MoreCache(object):
+    """
+    Computes the `more` (named groups, plus any metadata) of lexed tokens.
+
+    Tokens of rules without named groups share `NO_MORE`.  Otherwise `more`s are memoized by rule
+    and value, so that repeated tokens (symbols, keywords) share one read-only `FrozenMore`.  The
+    memo is cleared once it holds `limit` entries, bounding its size.
+    """
+
+    def __init__(self, metadata=None, limit=4096):
+        self.metadata = metadata or {}
+        self.limit = limit
+        self._memo = {}
+
+    def __call__(self, pattern, value):
+        if not pattern.groupindex and not self.metadata:
+            return NO_MORE
+
+        key = (pattern, value)
+        more = self._memo.get(key)
+        if more is None:
+            if len(self._memo) >= self.limit:
+                self._memo.clear()
+            more = pattern.match(value).groupdict()
+            if profiling.ACTIVE is not None:
+                profiling.ACTIVE.count_regex()
+            more.update(self.metadata)
+            more = self._memo[key] = FrozenMore(more)
+        return more
+
+
+def _restore_value_token(cls, base, value, state):
+    """Unpickles a token which is also a builtin value."""
+
+    token = base.__new__(cls, value)
+    token.__dict__.update(state)
+    return token
+
+
+def _restore_lex_token(cls, type, value, source, start_position, more, lines):
+    """Unpickles a plain token."""
+
+    token = object.__new__(cls)
+    CalfToken.__init__(token, type, value, source, start_position, more, lines)
+    return token
+
+
+class CalfToken(object):
     """
     Token object.
 
     The result of reading a token from the source character feed.
     Encodes the source, and the position in the source from which it was read.
+
+    The start position is either a `Position`-like object, or a plain integer offset.  Offsets are
+    resolved to absolute offsets, lines and columns using the `lines` index (see
+    `calf.io.reader.LineIndex` and `LineSegment`) shared by all the tokens read from one buffer.
+
+    `more` (the named groups of the matched rule) may be shared between tokens, and so is a
+    read-only `FrozenMore` when lexed.
+
+    `CalfToken` itself has no instance storage, so that tokens may also be builtin values (see
+    `CalfIntegerToken` et al.) which can't share a `__slots__` layout.  Plain tokens are
+    `CalfLexToken`s, which is what constructing a `CalfToken` directly produces.
     """
 
-    def __init__(self, type, value, source, start_position, more):
+    __slots__ = ()
+
+    def __new__(cls, *args, **kwargs):
+        # CalfToken has no storage, so constructing one directly makes a CalfLexToken
+        if cls is CalfToken:
+            cls = CalfLexToken
+        return super().__new__(cls)
+
+    def __init__(self, type, value, source, start_position, more, lines=None):
         self.type = type
         self.value = value
         self.source = source
         self.start_position = start_position
-        self.more = more if more is not None else {}
+        self.more = more if more is not None else NO_MORE
+        self.lines = lines
 
     def __repr__(self):
         return "<%s:%s %r %s %r>" % (
@@ -46,18 +141,67 @@ class CalfToken:
 
     @property
     def offset(self):
-        if self.start_position is not None:
-            return self.start_position.offset
+        p = self.start_position
+        if isinstance(p, int):
+            return self.lines.offset(p) if self.lines is not None else p
+        elif p is not None:
+            return p.offset
 
     @property
     def line(self):
-        if self.start_position is not None:
-            return self.start_position.line
+        p = self.start_position
+        if isinstance(p, int):
+            if self.lines is not None:
+                return self.lines.line(p)
+        elif p is not None:
+            return p.line
 
     @property
     def column(self):
-        if self.start_position is not None:
-            return self.start_position.column
+        p = self.start_position
+        if isinstance(p, int):
+            if self.lines is not None:
+                return self.lines.column(p)
+        elif p is not None:
+            return p.column
+
+
+class _Slotted(object):
+    """
+    The first base of the slotted token classes.
+
+    Python keeps a class's C level constructor, rather than the Python level `CalfToken.__new__`,
+    when it's inherited from the class's first base.
+    """
+
+    __slots__ = ()
+
+
+class CalfLexToken(_Slotted, CalfToken):
+    """
+    (Plain) Token object.
+
+    The result of lexing a token.  Compact, having no per-instance `__dict__`.
+    """
+
+    __slots__ = ("type", "value", "source", "start_position", "more", "lines")
+
+    # object's own (C) constructor, as plain tokens are built by the million
+    __new__ = object.__new__
+
+    def __reduce__(self):
+        return (
+            _restore_lex_token,
+            (
+                type(self),
+                self.type,
+                self.value,
+                self.source,
+                self.start_position,
+                self.more,
+                self.lines,
+            ),
+        )
 
 
 class CalfBlockToken(CalfToken):
@@ -67,8 +211,12 @@ class CalfBlockToken(CalfToken):
     The base result of parsing a token with a start and an end position.
     """
 
-    def __init__(self, type, value, source, start_position, end_position, more):
-        CalfToken.__init__(self, type, value, source, start_position, more)
+    __slots__ = ()
+
+    def __init__(
+        self, type, value, source, start_position, end_position, more, lines=None
+    ):
+        CalfToken.__init__(self, type, value, source, start_position, more, lines)
         self.end_position = end_position
 
 
@@ -79,9 +227,9 @@ class CalfListToken(CalfBlockToken, list):
     The final result of reading a parens list through the Calf lexer stack.
     """
 
-    def __init__(self, type, value, source, start_position, end_position):
+    def __init__(self, type, value, source, start_position, end_position, lines=None):
         CalfBlockToken.__init__(
-            self, type, value, source, start_position, end_position, None
+            self, type, value, source, start_position, end_position, None, lines
         )
         list.__init__(self, value)
 
@@ -93,9 +241,9 @@ class CalfDictToken(CalfBlockToken, dict):
     The final(ish) result of reading a braces list through the Calf lexer stack.
     """
 
-    def __init__(self, type, value, source, start_position, end_position):
+    def __init__(self, type, value, source, start_position, end_position, lines=None):
         CalfBlockToken.__init__(
-            self, type, value, source, start_position, end_position, None
+            self, type, value, source, start_position, end_position, None, lines
         )
         dict.__init__(self, value)
 
@@ -111,6 +259,9 @@ class CalfIntegerToken(CalfToken, int):
     def __new__(cls, value):
         return int.__new__(cls, value.value)
 
+    def __reduce__(self):
+        return (_restore_value_token, (type(self), int, int(self), self.__dict__))
+
     def __init__(self, value):
         CalfToken.__init__(
             self,
@@ -119,6 +270,7 @@ class CalfIntegerToken(CalfToken, int):
             value.source,
             value.start_position,
             value.more,
+            value.lines,
         )
 
 
@@ -133,6 +285,9 @@ class CalfFloatToken(CalfToken, float):
     def __new__(cls, value):
         return float.__new__(cls, value.value)
 
+    def __reduce__(self):
+        return (_restore_value_token, (type(self), float, float(self), self.__dict__))
+
     def __init__(self, value):
         CalfToken.__init__(
             self,
@@ -141,6 +296,7 @@ class CalfFloatToken(CalfToken, float):
             value.source,
             value.start_position,
             value.more,
+            value.lines,
         )
 
 
@@ -149,12 +305,15 @@ class CalfStrToken(CalfToken, str):
     (str) Token object.
 
 
-    The final(ish) result of reading a string.
+    The final(ish) result of reading a string.  `raw` is the text of the string in the source.
     """
 
     def __new__(cls, token, buff):
         return str.__new__(cls, buff)
 
+    def __reduce__(self):
+        return (_restore_value_token, (type(self), str, str(self), self.__dict__))
+
     def __init__(self, token, buff):
         CalfToken.__init__(
             self,
@@ -163,13 +322,17 @@ class CalfStrToken(CalfToken, str):
             token.source,
             token.start_position,
             token.more,
+            token.lines,
         )
         str.__init__(self)
+        self.raw = token.value
 
 
-class CalfSymbolToken(CalfToken):
+class CalfSymbolToken(CalfLexToken):
     """A symbol."""
 
+    __slots__ = ()
+
     def __init__(self, token):
         CalfToken.__init__(
             self,
@@ -178,12 +341,15 @@ class CalfSymbolToken(CalfToken):
             token.source,
             token.start_position,
             token.more,
+            token.lines,
         )
 
 
-class CalfKeywordToken(CalfToken):
+class CalfKeywordToken(CalfLexToken):
     """A keyword."""
 
+    __slots__ = ()
+
     def __init__(self, token):
         CalfToken.__init__(
             self,
@@ -192,11 +358,31 @@ class CalfKeywordToken(CalfToken):
             token.source,
             token.start_position,
             token.more,
+            token.lines,
         )
 
 
-class CalfMetaToken(CalfToken):
-    """A ^ meta token."""
+def _macro_state(token, **state):
+    """The slot state of a reader macro token, including its `elements` if any."""
+
+    elements = getattr(token, "elements", None)
+    if elements is not None:
+        state["elements"] = elements
+    return (None, state)
+
+
+class CalfMetaToken(CalfLexToken):
+    """
+    A ^ meta token.
+
+    Like the other reader macro tokens, if whitespace or comments were kept between its operands,
+    `elements` holds them along with the operands, in order.
+    """
+
+    __slots__ = ("meta", "elements")
+
+    def __reduce__(self):
+        return CalfLexToken.__reduce__(self) + (_macro_state(self, meta=self.meta),)
 
     def __init__(self, token, meta, value):
         CalfToken.__init__(
@@ -206,13 +392,19 @@ class CalfMetaToken(CalfToken):
             token.source,
             token.start_position,
             token.more,
+            token.lines,
         )
         self.meta = meta
 
 
-class CalfDispatchToken(CalfToken):
+class CalfDispatchToken(CalfLexToken):
     """A # macro dispatch token."""
 
+    __slots__ = ("tag", "elements")
+
+    def __reduce__(self):
+        return CalfLexToken.__reduce__(self) + (_macro_state(self, tag=self.tag),)
+
     def __init__(self, token, tag, value):
         CalfToken.__init__(
             self,
@@ -221,13 +413,19 @@ class CalfDispatchToken(CalfToken):
             token.source,
             token.start_position,
             token.more,
+            token.lines,
         )
         self.tag = tag
 
 
-class CalfQuoteToken(CalfToken):
+class CalfQuoteToken(CalfLexToken):
     """A ' quotation."""
 
+    __slots__ = ("elements",)
+
+    def __reduce__(self):
+        return CalfLexToken.__reduce__(self) + (_macro_state(self),)
+
     def __init__(self, token, quoted):
         CalfToken.__init__(
             self,
@@ -236,4 +434,84 @@ class CalfQuoteToken(CalfToken):
             token.source,
             token.start_position,
             token.more,
+            token.lines,
         )
+
+
+class CalfArrayToken(CalfLexToken):
+    """
+    A homogeneous numeric list or vector, decoded in bulk (see `calf.numeric`).
+
+    The value is an array of the elements, and `element` the type ("INTEGER" or "FLOAT") of the
+    tokens they would otherwise have been read as.
+    """
+
+    __slots__ = ("element",)
+
+    def __reduce__(self):
+        return CalfLexToken.__reduce__(self) + ((None, {"element": self.element}),)
+
+    def __init__(self, type, value, source, start_position, more, lines=None, element=None):
+        CalfToken.__init__(self, type, value, source, start_position, more, lines)
+        self.element = element
+
+
+class TokenTable(object):
+    """
+    A columnar table of the tokens lexed from a buffer.
+
+    Rather than one object per token, stores parallel arrays of rule ids and start and end offsets
+    into the source buffer (token `i` spans `starts[i]:ends[i]`).  `rules` is the grammar as a list
+    of (type, compiled pattern) pairs, indexed by rule id.
+
+    Token objects are only built on demand, by indexing or iterating the table.
+    """
+
+    def __init__(self, buffer, source, rules, metadata=None, lines=None):
+        self.buffer = buffer
+        self.source = source
+        self.rules = rules
+        self.metadata = metadata or {}
+        self.lines = lines
+        self.more = MoreCache(metadata)
+        self.ids = array("i")
+        self.starts = array("l")
+        self.ends = array("l")
+
+    def append(self, rule, start, end):
+        """Records a token of rule `rule`, spanning `start:end`."""
+        self.ids.append(rule)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def type(self, i):
+        return self.rules[self.ids[i]][0]
+
+    def value(self, i):
+        return self.buffer[self.starts[i] : self.ends[i]]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        type, pattern = self.rules[self.ids[i]]
+        value = self.value(i)
+        return CalfLexToken(
+            type, value, self.source, self.starts[i], self.more(pattern, value), self.lines
+        )
+
+    def __iter__(self):
+        return self.tokens()
+
+    def tokens(self, skip=()):
+        """Lazily builds the tokens of the table, skipping any of the types in `skip`."""
+
+        skip_ids = {idx for idx, (type, _) in enumerate(self.rules) if type in skip}
+        for i, rule in enumerate(self.ids):
+            if rule not in skip_ids:
+                yield self[i]
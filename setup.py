@@ -23,10 +23,14 @@ setup(
             "calfp = calf.parser:main",
             "calfr = calf.reader:main",
             "calffmt = calf.fmt:main",
+            "calfbench = calf.bench:main",
             "calf = calf.server:main",
         ]
     },
     install_requires=[
         "pyrsistent~=0.17.0",
-    ]
+    ],
+    extras_require={
+        "numpy": ["numpy"],
+    },
 )
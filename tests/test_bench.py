@@ -0,0 +1,48 @@
+"""
+Tests of calf.bench
+"""
+
+import json
+import random
+
+from calf import bench
+from calf.parser import parse_buffer
+from conftest import parametrize
+
+
+@parametrize("name", sorted(bench.CORPORA))
+def test_corpora_parse(name):
+    text = bench.CORPORA[name](2000, random.Random(0))
+    assert len(text) >= 2000
+    assert list(parse_buffer(text))
+
+
+def test_run_and_compare(tmp_path):
+    results = bench.run(size=500, corpora=["code", "numbers"], repeat=1)
+    assert set(results["results"]) == {"code", "numbers"}
+
+    stages = results["results"]["code"]["stages"]
+    assert set(stages) == {"lex", "parse", "read", "values"}
+    assert stages["lex"]["peak_bytes"] > 0
+    assert stages["parse"]["forms_per_second"] > 0
+
+    out = tmp_path / "bench.json"
+    bench.main(["--size", "500", "--corpus", "code", "--repeat", "1", "--no-memory",
+                "--output", str(out)])
+    old = json.loads(out.read_text())
+    assert "peak_bytes" not in old["results"]["code"]["stages"]["lex"]
+    assert [(c, s) for c, s, _, _ in bench.compare(old, results)] == [
+        ("code", "lex"), ("code", "parse"), ("code", "read"), ("code", "values")
+    ]
+
+
+def test_main_zero_times(tmp_path, monkeypatch, capsys):
+    """Stages too quick to time are reported, and compared, without failing."""
+
+    monkeypatch.setattr(bench, "_time", lambda fn, repeat: (0.0, fn()))
+    out = tmp_path / "bench.json"
+    bench.main(["--size", "100", "--corpus", "code", "--repeat", "1", "--no-memory",
+                "--output", str(out)])
+    bench.main(["--size", "100", "--corpus", "code", "--repeat", "1", "--no-memory",
+                "--compare", str(out)])
+    assert "nan" in capsys.readouterr().out
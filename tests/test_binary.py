@@ -0,0 +1,143 @@
+"""
+Tests of calf.binary
+"""
+
+import io
+
+from calf import binary
+from calf.parser import parse_buffer
+from calf.reader import read_buffer
+from calf.types import Keyword, Map, Set, Symbol, Vector
+from conftest import parametrize
+
+import pytest
+
+
+VALUES = [
+    0,
+    -1,
+    2 ** 100,
+    -(2 ** 70),
+    1.5,
+    float("inf"),
+    "",
+    "snow ☃ man",
+    Symbol.of("foo"),
+    Symbol.of("foo", "ns"),
+    Keyword.of("bar"),
+    Keyword.of("bar", ""),
+    Vector.of([]),
+    Map.of({}),
+    Set.of([]),
+    Vector.of([1, Symbol.of("a"), Vector.of([Symbol.of("a"), Keyword.of("a")])]),
+    Map.of({Keyword.of("k"): Set.of([1, 2]), "s": Map.of({1: 2.0})}),
+]
+
+
+@parametrize("value", VALUES)
+def test_roundtrip(value):
+    assert binary.loads(binary.dumps([value])) == [value]
+
+
+def test_roundtrip_stream():
+    data = binary.dumps(VALUES)
+    assert data.startswith(binary.MAGIC)
+    assert binary.loads(data) == VALUES
+    assert binary.loads(memoryview(bytearray(data))) == VALUES
+
+    # Fed a byte at a time
+    decoder = binary.Decoder()
+    values = []
+    for i in range(len(data)):
+        values.extend(decoder.feed(data[i : i + 1]))
+    values.extend(decoder.close())
+    assert values == VALUES
+
+    out = io.BytesIO()
+    binary.dump(iter(VALUES), out)
+    assert out.getvalue() == data
+    assert list(binary.load(io.BytesIO(data), size=3)) == VALUES
+
+
+def test_feed_completes_values():
+    """Values are returned by the feed completing them, however they were split."""
+
+    value = Vector.of(["x" * 500, Vector.of([Symbol.of("foo")] * 100), "y" * 300])
+    data = binary.dumps([value, Symbol.of("foo")])
+    end = len(binary.dumps([value]))
+    decoder = binary.Decoder()
+    assert decoder.feed(data[:600]) == []
+    assert decoder.feed(data[600:end]) == [value]
+    assert decoder.feed(data[end:]) == [Symbol.of("foo")]
+    assert decoder.close() == []
+
+    # Ending within a collection, between its items
+    decoder = binary.Decoder()
+    decoder.feed(binary.dumps([Vector.of([1, 2])])[:-1])
+    with pytest.raises(binary.DecodeError):
+        decoder.close()
+
+
+def test_symbol_table():
+    foo = Symbol.of("foo", "some.long.namespace")
+    one = binary.dumps([foo])
+    many = binary.dumps([Vector.of([foo] * 100)])
+    assert len(many) < len(one) + 2 * 100 + 2
+
+    # The table is shared between values of one stream
+    encoder = binary.Encoder()
+    first, second = encoder.encode(foo), encoder.encode(foo)
+    assert len(second) == 2
+    assert binary.loads(first + second) == [foo, foo]
+
+
+def test_empty():
+    assert binary.loads(binary.dumps([])) == []
+    assert binary.loads(binary.dumps(iter([]))) == []
+
+
+def test_deep():
+    value = Vector.of([])
+    for _ in range(10000):
+        value = Vector.of([value])
+
+    value, = binary.loads(binary.dumps([value]))
+    for _ in range(10000):
+        value, = value
+    assert value == Vector.of([])
+
+
+def test_read_values():
+    text = "(defn foo [a b] {:a a, \"b\" {}}) ^:meta [1 2.5 -3] 'quoted"
+    forms = list(read_buffer(text))
+    assert binary.loads(binary.dumps(forms)) == forms
+
+    # Tokens encode as their values
+    tokens = list(parse_buffer('1 "two" 3.0'))
+    assert binary.loads(binary.dumps(tokens)) == [1, "two", 3.0]
+
+
+@parametrize("value", [None, True, object(), [1, 2]])
+def test_unencodable(value):
+    with pytest.raises(TypeError):
+        binary.dumps([value])
+
+
+@parametrize("data", [
+    b"",
+    b"CAL",
+    b"NOPE\x01",
+    b"CALF\x02",
+    b"CALF\x01\x00",
+    b"CALF\x01\x06\x05",  # A reference to nothing
+    b"CALF\x01\x03\x01\xff",  # A string which isn't UTF-8
+    binary.dumps([Vector.of([1, 2])])[:-1],
+])
+def test_bad_data(data):
+    with pytest.raises(binary.DecodeError):
+        binary.loads(data)
+
+    with pytest.raises(binary.DecodeError):
+        decoder = binary.Decoder()
+        decoder.feed(data)
+        decoder.close()
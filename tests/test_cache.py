@@ -0,0 +1,92 @@
+"""
+Tests of calf.cache
+"""
+
+import os
+import pickle
+
+from calf.cache import CalfCache
+from calf.parser import parse_file
+from calf.reader import read_file
+
+
+def entries(cache):
+    return [e for e in os.listdir(cache.path) if e.endswith(CalfCache.SUFFIX)]
+
+
+def test_read_file_cached(tmp_path):
+    cache = CalfCache(str(tmp_path / "cache"))
+    path = tmp_path / "example.calf"
+    path.write_text("(foo :bar) [1 2.5 \"three\"]")
+
+    forms = list(read_file(str(path), cache=cache))
+    assert forms == list(read_file(str(path)))
+    assert len(entries(cache)) == 1
+
+    # Hits
+    assert list(read_file(str(path), cache=cache)) == forms
+    assert len(entries(cache)) == 1
+
+    # Changes miss
+    path.write_text("(foo :baz)")
+    assert list(read_file(str(path), cache=cache)) == list(read_file(str(path)))
+    assert len(entries(cache)) == 2
+
+
+def test_parse_file_cached(tmp_path):
+    cache = CalfCache(str(tmp_path / "cache"))
+    path = tmp_path / "example.calf"
+    path.write_text("(foo\n  :bar)\r\n[1]")
+
+    def summary(forms):
+        return [(f.type, f.offset, f.line, f.column, f.source, repr(f.value)) for f in forms]
+
+    expected = summary(parse_file(str(path)))
+    assert summary(parse_file(str(path), cache=cache)) == expected
+    assert summary(parse_file(str(path), cache=cache)) == expected
+    assert len(entries(cache)) == 1
+
+
+def test_eviction(tmp_path):
+    cache = CalfCache(str(tmp_path / "cache"), max_size=1)
+    cache.put("a", "value a")
+    cache.put("b", "value b")
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert entries(cache) == []
+
+    cache.max_size = 1024
+    cache.put("a", "value a")
+    os.utime(os.path.join(cache.path, "a" + CalfCache.SUFFIX), (0, 0))
+    cache.put("b", "value b")
+    cache.max_size = len(open(os.path.join(cache.path, "b" + CalfCache.SUFFIX), "rb").read())
+    cache.evict()
+    assert cache.get("a") is None
+    assert cache.get("b") == "value b"
+
+
+def test_put_scans_only_when_full(tmp_path, monkeypatch):
+    cache = CalfCache(str(tmp_path / "cache"), max_size=16384)
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+
+    for i in range(100):
+        cache.put(str(i), bytes(200))
+    assert 1 < len(scans) < 10
+    assert sum(os.path.getsize(os.path.join(cache.path, e)) for e in entries(cache)) <= 16384
+
+
+def test_bad_entries_miss(tmp_path):
+    """Entries which can't be loaded, for instance as they name classes which no longer exist, are
+    misses, and are removed."""
+
+    cache = CalfCache(str(tmp_path / "cache"))
+    for key, data in [("module", b"cno_such_module\nThing\n."),
+                      ("attribute", b"ccalf.cache\nNoSuchThing\n."),
+                      ("truncated", pickle.dumps([1, 2, 3])[:5]),
+                      ("type", b"cbuiltins\nint\n(S'x'\nS'y'\ntR.")]:
+        with open(os.path.join(cache.path, key + CalfCache.SUFFIX), "wb") as f:
+            f.write(data)
+        assert cache.get(key, "miss") == "miss"
+    assert entries(cache) == []
@@ -0,0 +1,115 @@
+"""
+Tests of calf.cst
+"""
+
+import pytest
+
+from calf import cst
+from calf.parser import CalfParseError
+from conftest import parametrize
+
+
+SOURCE = """\
+; A comment
+(defn foo [a b] ; trailing
+  {:a 1, :b "x\\ny"}
+  ^:m x #tag [1 2.5e3] 'q)
+
+(defn bar [a b] [a b])
+"""
+
+
+@parametrize("text", [SOURCE, "", "  \n", "^ :m ; comment\n  x", '"""triple"""'])
+def test_lossless(text):
+    tree = cst.parse_tree(text)
+    assert tree.text() == text
+    assert tree.green.width == len(text)
+
+
+def test_positions():
+    tree = cst.parse_tree(SOURCE)
+    node = tree.find(SOURCE.index("trailing"))
+    assert node.kind == "COMMENT"
+    assert node.text() == "; trailing\n"
+    assert (node.line, node.column) == (2, 16)
+
+    # The innermost collection around `b`, and its ancestors
+    b = tree.find(SOURCE.index("b]"))
+    assert b.text() == "b"
+    assert [n.kind for n in b.ancestors()] == ["SQLIST", "LIST", "ROOT"]
+    assert b.parent.text() == "[a b]"
+    assert b.parent.offset == SOURCE.index("[a b]")
+
+    assert tree.find(len(SOURCE)) is None
+
+
+def test_sharing():
+    cache = cst.GreenCache()
+    tree = cst.parse_tree(SOURCE, cache=cache)
+    foo, bar = [n for n in tree.root.children if n.kind == "LIST"]
+
+    # Both [a b]s are the one green node, at different offsets
+    foo_args, bar_args = foo.child(4), bar.child(4)
+    assert foo_args.green is bar_args.green
+    assert foo_args.offset != bar_args.offset
+
+
+def test_replace():
+    tree = cst.parse_tree(SOURCE)
+    name = tree.find(SOURCE.index("foo"))
+    edited = tree.replace(name, "renamed")
+
+    assert edited.text() == SOURCE.replace("foo", "renamed")
+    assert tree.text() == SOURCE
+
+    # Everything but the edited form and the root is shared
+    old, new = tree.green.children, edited.green.children
+    assert [a is b for a, b in zip(old, new)] == [i != 1 for i in range(len(old))]
+
+    # Positions after the edit are moved
+    bar = edited.find(edited.text().index("bar"))
+    assert bar.text() == "bar"
+
+
+def test_edit():
+    tree = cst.parse_tree(SOURCE)
+    edits = [(n, ["b2"]) for n in tree.root.walk() if n.kind == "SYMBOL" and n.text() == "b"]
+    assert len(edits) == 3
+
+    edited = tree.edit(edits)
+    assert edited.text() == SOURCE.replace("a b", "a b2")
+
+    # Removal, and replacement by several nodes
+    q = tree.find(SOURCE.index("'q") + 1)
+    assert q.parent.kind == "SINGLE_QUOTE"
+    assert tree.remove(q.parent).text() == SOURCE.replace(" 'q", " ")
+    assert tree.replace(q, "x y").text() == SOURCE.replace("'q", "'x y")
+
+
+def test_edit_errors():
+    tree = cst.parse_tree(SOURCE)
+    b = tree.find(SOURCE.index("b]"))
+
+    with pytest.raises(ValueError):
+        tree.edit([(b, ["x"]), (b.parent, ["y"])])
+
+    with pytest.raises(ValueError):
+        tree.replace(tree.root, "x")
+
+    # Nodes of another version
+    with pytest.raises(ValueError):
+        tree.replace(b, "x").replace(b, "y")
+
+
+def test_parse_errors():
+    with pytest.raises(CalfParseError):
+        cst.parse_tree("(foo ]")
+
+
+def test_deep():
+    depth = 20000
+    text = "[" * depth + "x" + "]" * depth
+    tree = cst.parse_tree(text)
+    x = tree.find(depth)
+    assert x.text() == "x"
+    assert tree.replace(x, "y").text() == text.replace("x", "y")
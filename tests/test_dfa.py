@@ -0,0 +1,115 @@
+"""
+Tests of calf.dfa
+
+Checks the compiled automaton against a direct (slow) implementation of the lexer's incremental
+matching rules.
+"""
+
+import re
+
+import calf.dfa as cd
+from calf.grammar import TOKENS
+from conftest import parametrize
+
+import pytest
+
+
+def reference_scan(tokens, buffer, pos=0):
+    """Scan one token the way the incremental lexer does, using re.fullmatch on every prefix."""
+
+    candidates = list(range(len(tokens)))
+    end = pos
+    while end < len(buffer):
+        can2 = [i for i in candidates if re.fullmatch(tokens[i][0], buffer[pos:end + 1])]
+        if not can2:
+            break
+        candidates = can2
+        end += 1
+
+    return end, (candidates[0] if end > pos else None)
+
+
+def reference_lex(tokens, buffer):
+    pos = 0
+    while pos < len(buffer):
+        end, rule = reference_scan(tokens, buffer, pos)
+        if rule is None:
+            return
+        yield buffer[pos:end], tokens[rule][1]
+        pos = end
+
+
+def dfa_lex(dfa, buffer):
+    pos = 0
+    while pos < len(buffer):
+        end, rule = dfa.scan(buffer, pos)
+        if rule is None:
+            return
+        yield buffer[pos:end], dfa.tokens[rule][1]
+        pos = end
+
+
+@parametrize("text", [
+    "(defn foo [a b] {:a a, :b/c b})",
+    "foo/bar :foo/bar :: : a:b",
+    "1 -1 +1 1.0 -1.5e3 1e 1.2.3 1foo +-+ - +",
+    '"foo" "foo\\"bar" "unterminated',
+    '"""triple""" tail',
+    '"""multi\nline"""',
+    "; a comment\n(foo) ; another\r\n",
+    " ,,\t\n\r\n,",
+    "^{:tag 1} #foo 'bar",
+    "été ☃ [λ x]",
+])
+def test_dfa_matches_reference(text):
+    dfa = cd.compile_tokens(TOKENS)
+    assert list(dfa_lex(dfa, text)) == list(reference_lex(TOKENS, text))
+
+
+@parametrize("tokens, text", [
+    ([(r"a{2,3}", "A"), (r"b+", "B")], "aaaaabbb"),
+    ([(r"a{,2}", "A"), (r"[^a]", "X")], "aaaxa"),
+    ([(r"(?:ab|a)c?", "AB"), (r".", "ANY")], "abcaacab\n"),
+    ([(r"x", "X1"), (r"x", "X2"), (r"\x79", "Y")], "xxyx"),
+])
+def test_custom_grammars(tokens, text):
+    dfa = cd.compile_tokens(tokens)
+    assert list(dfa_lex(dfa, text)) == list(reference_lex(tokens, text))
+
+
+@parametrize("pattern", [
+    r"^foo",
+    r"foo$",
+    r"(a)\1",
+    r"(?=a)",
+    r"(?i)a",
+    r"\bfoo",
+    r"a*+",
+])
+def test_unsupported_patterns_raise(pattern):
+    with pytest.raises(cd.GrammarCompileError):
+        cd.compile_tokens([(pattern, "X")])
+
+
+def test_compile_is_shared():
+    assert cd.compile_tokens(TOKENS) is cd.compile_tokens(list(TOKENS))
+
+
+def test_grammar_candidates():
+    """The rules a character may start are those matching it alone, in rule order."""
+
+    grammar = cd.compile_grammar(TOKENS)
+    types = lambda chr: [TOKENS[i][1] for i in grammar.candidates(chr)]
+    assert types("(") == ["PAREN_LEFT"]
+    assert types("1") == ["INTEGER", "FLOAT"]
+    assert types("a") == ["SYMBOL"]
+    assert types("\r") == []
+    assert grammar.candidates("(") is grammar.candidates("(")
+
+
+def test_compile_grammar_is_shared():
+    grammar = cd.compile_grammar(TOKENS)
+    assert grammar is cd.compile_grammar(list(TOKENS))
+    assert cd.compile_grammar(grammar) is grammar
+    assert grammar.dfa is cd.compile_tokens(grammar)
+    assert cd.compile_grammar([(r"(?i)a", "A")]).dfa is None
@@ -0,0 +1,124 @@
+"""
+Tests of calf.document
+"""
+
+import random
+
+from calf.document import CalfDocument
+from calf.io.reader import EditableLineIndex, LineIndex, LineSegment
+from conftest import parametrize
+
+import pytest
+
+
+def summary(form):
+    """Everything about a form's tokens which an edit could disturb."""
+
+    if isinstance(form, list):
+        children = [summary(f) for f in form]
+    elif isinstance(form, dict):
+        children = [[summary(k), summary(v)] for k, v in form.value]
+    elif form.type in ("META", "MACRO_DISPATCH"):
+        children = [summary(getattr(form, "meta", None) or form.tag), summary(form.value)]
+    elif form.type == "SINGLE_QUOTE":
+        children = [summary(form.value)]
+    else:
+        children = str(form)
+
+    return (form.type, form.offset, form.line, form.column, children)
+
+
+def check(document):
+    fresh = CalfDocument(document.text)
+    assert [summary(f) for f in document] == [summary(f) for f in fresh]
+    assert document.widths == fresh.widths
+
+
+TEXT = """(defn foo [a b]
+  ; a comment
+  {:a a, :b b})
+
+[1 2 3]
+'quoted ^:meta sym
+#tag {"key" "value"}
+"""
+
+
+@parametrize("offset, removed, text", [
+    (0, 0, "(bar) "),
+    (1, 4, "defmacro"),
+    (10, 0, "\n"),
+    (15, 13, ""),
+    (TEXT.index("})"), len("})\n\n[1 2 3]"), "} [1 2 3])"),
+    (TEXT.index("[1 2 3]"), 0, "^"),
+    (TEXT.index("[1 2 3]"), 0, "'"),
+    (45, 1, ""),
+    (len(TEXT), 0, "(trailing)"),
+    (0, len(TEXT), "replaced"),
+    (33, 2, "b"),
+])
+def test_edits(offset, removed, text):
+    document = CalfDocument(TEXT)
+    document.edit(offset, removed, text)
+    assert document.text == TEXT[:offset] + text + TEXT[offset + removed:]
+    check(document)
+
+
+def test_edit_reuses_forms():
+    document = CalfDocument(TEXT)
+    first, *_, last = document.forms
+    assert len(document.edit(50, 1, "10")) == 1
+    assert document.forms[0] is first
+    assert document.forms[-1] is last
+    check(document)
+
+
+def test_bad_edit_leaves_document():
+    document = CalfDocument(TEXT)
+    with pytest.raises(Exception):
+        document.edit(0, 1, "")
+    assert document.text == TEXT
+    check(document)
+
+
+def test_random_edits():
+    rand = random.Random(0)
+    document = CalfDocument(TEXT)
+    snippets = ["(", ")", "[x]", " ", "\n", "foo", "1.5", ":k", ";c\n", '"s"', "{:a 1}"]
+
+    for _ in range(300):
+        offset = rand.randint(0, len(document.text))
+        removed = rand.randint(0, min(3, len(document.text) - offset))
+        try:
+            document.edit(offset, removed, rand.choice(snippets))
+        except Exception:
+            pass
+        check(document)
+
+
+def test_nearby_edits_move_few_forms(monkeypatch):
+    document = CalfDocument("(foo)\n" * 1000)
+    moved = []
+    move = LineSegment.move
+    monkeypatch.setattr(LineSegment, "move", lambda self, shift: moved.append(self) or move(self, shift))
+
+    for i in range(10):
+        document.edit(1, 0, "x")
+    assert len(moved) <= 2
+    assert document.segments[-1].base == 6 * 999 + 10
+
+
+def test_editable_line_index():
+    rand = random.Random(0)
+    text = TEXT
+    lines = EditableLineIndex(text)
+    for _ in range(300):
+        offset = rand.randint(0, len(text))
+        removed = rand.randint(0, min(5, len(text) - offset))
+        new = rand.choice(["", "x", "\n", "a\nb", "\n\n"])
+        lines.replace(offset, removed, new)
+        text = text[:offset] + new + text[offset + removed:]
+
+        fresh = LineIndex(text)
+        for i in range(len(text) + 1):
+            assert (lines.line(i), lines.column(i)) == (fresh.line(i), fresh.column(i))
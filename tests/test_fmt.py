@@ -0,0 +1,126 @@
+"""
+Tests of calf.fmt
+"""
+
+import array
+import io
+
+from calf import fmt
+from calf.parser import parse_buffer
+from calf.reader import read_buffer
+from calf.types import Map, Set, Symbol, Vector
+from conftest import parametrize
+
+import pytest
+
+
+SOURCE = """\
+; A comment
+(defn foo [a b] ; trailing
+  {:a 1, :b "x\\ny"}
+  ^:m x #tag [1 2.5e3] 'q
+  \"\"\"triple\"\"\"
+  )
+
+{}  [ ]
+"""
+
+
+def formatted(text, mode, width=80):
+    fp = io.StringIO()
+    fmt.format_buffer(text, fp, mode=mode, width=width)
+    return fp.getvalue()
+
+
+@parametrize("text", [
+    SOURCE,
+    "",
+    "  \n\n",
+    "^ :m ; comment\n  x",
+    "{:a ; comment\n 1}",
+    "foo ; no newline",
+])
+def test_lossless_roundtrip(text):
+    assert formatted(text, "lossless") == text
+
+
+@parametrize("mode", ["compact", "pretty"])
+@parametrize("width", [10, 40, 80])
+def test_reformatting_preserves_forms(mode, width):
+    expected = formatted(SOURCE, "compact")
+    assert formatted(formatted(SOURCE, mode, width), "compact") == expected
+
+
+def test_compact():
+    assert formatted("(foo\n  [1   2]\n{:a  \"b\"})", "compact") == '(foo [1 2] {:a "b"})\n'
+
+
+def test_pretty():
+    text = "(defn foo [a b] (+ a b (some-function a b)))"
+    assert formatted(text, "pretty", width=80) == text + "\n"
+    assert formatted(text, "pretty", width=20) == (
+        "(defn foo\n"
+        "  [a b]\n"
+        "  (+ a b\n"
+        "    (some-function a\n"
+        "      b)))\n"
+    )
+    assert formatted("{:a 1 :b [1 2 3]}", "pretty", width=8) == "{:a 1\n :b [1\n     2\n     3]}\n"
+
+
+def test_pretty_comments():
+    text = formatted("(foo ; comment\n)", "pretty")
+    assert text == "(foo\n  ; comment\n  )\n"
+    assert formatted(text, "compact") == formatted("(foo ; comment\n)", "compact")
+
+
+def test_values_roundtrip():
+    values = list(read_buffer(SOURCE.replace("#tag", "")))
+    for mode in ("compact", "pretty"):
+        assert list(read_buffer(fmt.dumps(values, mode))) == values
+
+
+def test_dump_values():
+    values = [
+        Symbol.of("foo", "bar"),
+        Vector.of([1, -2.5, "s"]),
+        Map.of({Symbol.of("a"): Vector.of([])}),
+        array.array("q", [1, 2, 3]),
+    ]
+    assert fmt.dumps(values, "compact") == 'bar/foo\n[1 -2.5 "s"]\n{a []}\n[1 2 3]\n'
+
+
+@parametrize("value", [Set.of([1]), None, True, float("inf"), [1]])
+def test_unprintable(value):
+    with pytest.raises((TypeError, ValueError)):
+        fmt.dumps([value])
+
+
+@parametrize("s", ["", "plain", 'quote " and \\ slash', "line\nbreak\ttab", "trailing\\",
+                   "\x00\x7f", "snow ☃", "emoji \U0001F600", "\x85\u2028\U000e0001"])
+def test_quote(s):
+    assert list(read_buffer(fmt.quote(s))) == [s]
+
+
+def test_quote_keeps_printable_text():
+    assert fmt.quote("λ ☃") == '"λ ☃"'
+    assert fmt.quote("tab\t\u2028") == '"tab\\t\\u2028"'
+
+
+def test_deep():
+    depth = 100000
+    text = "(" * depth + ")" * depth
+    forms = list(parse_buffer(text))
+    assert fmt.dumps(forms, "compact") == text + "\n"
+    assert fmt.dumps(forms, "pretty").count("(") == depth
+
+
+def test_main(tmp_path, capsys):
+    path = tmp_path / "example.calf"
+    path.write_text("(foo\n  bar)")
+
+    fmt.main(["--compact", str(path)])
+    assert capsys.readouterr().out == "(foo bar)\n"
+
+    fmt.main(["-i", str(path)])
+    assert path.read_text() == "(foo bar)\n"
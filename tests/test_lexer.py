@@ -5,6 +5,9 @@ Tests both basic functionality, some examples and makes sure that arbitrary toke
 trip through the lexer.
 """
 
+import io
+
+import calf.dfa as cd
 import calf.lexer as cl
 from conftest import parametrize
 
@@ -87,3 +90,145 @@ def test_lex_compound_examples(text, token_types):
     t = cl.lex_buffer(text)
     result_types = [token.type for token in t]
     assert result_types == token_types
+
+
+def test_lex_uncompilable_grammar():
+    """Grammars the DFA can't express still lex, via the incremental engine."""
+
+    tokens = [(r"(?i)a+", "A"), (r"b", "B")]
+    t = cl.CalfLexer(io.StringIO("aAb"), tokens=tokens)
+    assert [(token.type, token.value) for token in t] == [("A", "aA"), ("B", "b")]
+
+
+def test_lex_uncompilable_grammar_invalid_character_raises():
+    tokens = cd.compile_grammar([(r"(?i)a+", "A"), (r"b", "B")])
+    with pytest.raises(ValueError):
+        list(cl.CalfLexer(io.StringIO("abc"), tokens=tokens))
+
+
+def test_lex_invalid_character_raises():
+    with pytest.raises(ValueError):
+        list(cl.lex_buffer("\r"))
+
+
+@parametrize("text", [
+    "(foo bar)",
+    "(foo\n  bar\n\n  [1 2 3])",
+    '; comment\n"a string\nwith lines" :kw\n',
+    "",
+])
+def test_buffer_lexer_matches_stream_lexer(text):
+    """The whole buffer lexer produces the same tokens and positions as the stream lexer."""
+
+    def summary(tokens):
+        return [(t.type, t.value, t.offset, t.line, t.column, t.more) for t in tokens]
+
+    assert summary(cl.CalfBufferLexer(text)) == summary(cl.CalfLexer(io.StringIO(text)))
+
+
+def test_buffer_lexer_bytes():
+    assert [t.value for t in cl.CalfBufferLexer("(λ)".encode("utf-8"))] == ["(", "λ", ")"]
+
+
+def summarize(tokens):
+    return [(t.type, t.value, t.offset, t.line, t.column, t.more) for t in tokens]
+
+
+@parametrize("size", [1, 2, 3, 7, 64])
+def test_incremental_lexer_chunks(size):
+    """Feeding text in chunks of any size produces the same tokens as lexing the whole buffer."""
+
+    text = '(defn foo\n  "a doc\nstring" [a]\n  ; comment\n  {:a 1.5e3, :b/c -12})\n'
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    assert summarize(cl.lex_chunks(chunks)) == summarize(cl.lex_buffer(text, source=None))
+
+
+def test_incremental_lexer_bytes():
+    """Bytes may be fed in chunks splitting characters, and a token between many chunks."""
+
+    text = '("' + "λ" * 5000 + '" 12345678901234567890)'
+    data = text.encode("utf-8")
+    lexer = cl.CalfIncrementalLexer(None)
+    tokens = []
+    for i in range(len(data)):
+        tokens.extend(lexer.feed(data[i:i + 1]))
+    tokens.extend(lexer.close())
+    assert summarize(tokens) == summarize(cl.lex_buffer(text, source=None))
+
+
+def test_lex_file(tmp_path):
+    path = tmp_path / "example.calf"
+    path.write_bytes("(foo\r\n  [λ 1 2]\r\n  \"bar\")\r\n".encode("utf-8"))
+
+    tokens = cl.lex_file(str(path))
+    assert not isinstance(tokens, list)
+    assert summarize(tokens) == summarize(
+        cl.lex_buffer('(foo\n  [λ 1 2]\n  "bar")\n', source=str(path))
+    )
+
+
+def test_lex_empty_file(tmp_path):
+    path = tmp_path / "empty.calf"
+    path.write_text("")
+    assert list(cl.lex_file(str(path))) == []
+
+
+def test_lex_file_small_chunks(tmp_path):
+    """Multi-byte characters and \\r\\n pairs may be split between chunks."""
+
+    from calf.io.reader import read_file_chunks
+
+    path = tmp_path / "example.calf"
+    path.write_bytes("(λ\r\n☃)".encode("utf-8"))
+    assert [t.value for t in cl.lex_chunks(read_file_chunks(str(path), size=1))] == [
+        "(", "λ", "\n", "☃", ")"
+    ]
+
+
+def test_lex_tokens_are_compact():
+    tokens = list(cl.lex_buffer("foo foo :bar 1"))
+    assert not any(hasattr(t, "__dict__") for t in tokens)
+    assert tokens[0].more is tokens[2].more
+    assert tokens[1].more is tokens[3].more
+
+
+def test_more_is_read_only():
+    """Tokens share `more`s, so mutating one in place is refused."""
+
+    import pickle
+
+    a, _, b = cl.lex_buffer("foo foo")
+    with pytest.raises(TypeError):
+        a.more["name"] = "bar"
+    with pytest.raises(TypeError):
+        a.more.update(name="bar")
+    assert b.more["name"] == "foo"
+
+    a2, b2 = pickle.loads(pickle.dumps([a, b]))
+    assert a2.more == a.more and a2.more is b2.more
+    with pytest.raises(TypeError):
+        a2.more.clear()
+
+
+def test_construct_token():
+    """CalfToken itself has no storage, but may still be constructed."""
+
+    from calf.token import CalfLexToken, CalfToken, NO_MORE
+
+    token = CalfToken("SYMBOL", "foo", "<Buffer>", 3, None)
+    assert isinstance(token, CalfLexToken)
+    assert (token.type, token.value, token.offset, token.more) == ("SYMBOL", "foo", 3, NO_MORE)
+
+
+@parametrize("text", [
+    "(foo bar)",
+    "(foo\n  bar\n\n  [1 2 3])",
+    '; comment\n"a string\nwith lines" :kw\n',
+    "",
+])
+def test_lex_table(text):
+    table = cl.lex_table(text)
+    assert len(table) == len(list(cl.lex_buffer(text)))
+    assert summarize(table) == summarize(cl.lex_buffer(text))
+    assert [table.value(i) for i in range(len(table))] == [t.value for t in cl.lex_buffer(text)]
+    assert list(table.ends) == [t.offset + len(t.value) for t in cl.lex_buffer(text)]
@@ -0,0 +1,83 @@
+"""
+Tests of calf.numeric
+"""
+
+from array import array
+import pickle
+
+from calf.numeric import CalfNumericLexer, decode_array
+from calf.reader import read_buffer, read_file
+from calf.types import Symbol
+from conftest import parametrize
+
+import pytest
+
+
+@parametrize(
+    "text,expected",
+    [
+        ("[1 2 3]", array("q", [1, 2, 3])),
+        ("(-1, +2\n3)", array("q", [-1, 2, 3])),
+        ("[1.5 2. 3e2 4.0e-1]", array("d", [1.5, 2.0, 300.0, 0.4])),
+    ],
+)
+def test_decode_array(text, expected):
+    end, _, values = decode_array(text)
+    assert end == len(text)
+    assert values == expected
+
+
+@parametrize(
+    "text",
+    [
+        "[]",
+        "[1 2.0]",  # Mixed
+        "[1 a]",
+        "[1 ;comment\n]",
+        "[.5]",  # A symbol
+        "[1e]",  # An invalid float
+        "[1a]",
+        "[1 2)",
+        "[[1 2]]",
+        "[99999999999999999999]",  # Too big
+    ],
+)
+def test_decode_array_declines(text):
+    assert decode_array(text) is None
+
+
+def test_read_arrays():
+    forms = list(read_buffer("[1 2] '(1.5) [a [3 4]] [1 2.0]", arrays="array"))
+    assert forms[0] == array("q", [1, 2])
+    assert forms[1] == [Symbol.of("quote"), array("d", [1.5])]
+    assert forms[2] == [Symbol.of("a"), array("q", [3, 4])]
+    assert forms[3] == [1, 2.0]
+    assert list(read_buffer("[1 2]")) == [[1, 2]]
+
+
+def test_read_file_arrays(tmp_path):
+    path = tmp_path / "data.calf"
+    path.write_text("[1 2 3]\n[4.5]")
+    assert list(read_file(str(path), arrays="array")) == [
+        array("q", [1, 2, 3]),
+        array("d", [4.5]),
+    ]
+
+
+def test_array_token():
+    whitespace, token = CalfNumericLexer("\n[1 2]")
+    assert whitespace.type == "WHITESPACE"
+    assert (token.type, token.element, token.line, token.column) == ("ARRAY", "INTEGER", 2, 0)
+    assert pickle.loads(pickle.dumps(token)).element == "INTEGER"
+
+
+def test_numpy_arrays():
+    numpy = pytest.importorskip("numpy")
+    forms = list(read_buffer("[1 2] [1.5]", arrays="numpy"))
+    assert forms[0].dtype == numpy.int64 and list(forms[0]) == [1, 2]
+    assert forms[1].dtype == numpy.float64 and list(forms[1]) == [1.5]
+
+
+def test_unknown_arrays():
+    with pytest.raises(ValueError):
+        CalfNumericLexer("[1]", arrays="tuple")
@@ -0,0 +1,72 @@
+"""
+Tests of calf.packages
+"""
+
+from calf.packages import (
+    CalfDelayedPackage,
+    CalfLoader,
+    CalfLoaderConfig,
+    CalfPackage,
+    index_packages,
+    scan_definitions,
+)
+from calf.types import Symbol
+from conftest import parametrize
+
+
+@parametrize("text, names", [
+    ("(def foo 1)", ["foo"]),
+    ("(defn foo [a] a)\n; (def commented 1)\n(defmacro bar [] ())", ["foo", "bar"]),
+    ('(def s "(def not-this 1)")', ["s"]),
+    ("[def foo 1] (foo def bar) (def :kw 1) 'x (def)", []),
+    ("(\n  def ; the name follows\n  spaced 1)", ["spaced"]),
+    ("(default x) (defer y) (deflate z) (defonce w 1)", ["w"]),
+])
+def test_scan_definitions(text, names):
+    assert scan_definitions(text) == names
+
+
+def make_packages(root):
+    for name, version, modules in [
+        ("core", "1.0.0", {"core.calf": "(def inc 1)\n(defn map [f xs] xs)"}),
+        ("core", "1.10.0", {"core.calf": "(def inc 2)", "sub/more.calf": "(def more 3)"}),
+        ("util", "0.1", {"util.calf": "(default helper 0)\n(defn helper [] (core/inc))"}),
+    ]:
+        for module, text in modules.items():
+            path = root / name / version / module
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+
+
+def test_index_packages(tmp_path):
+    make_packages(tmp_path)
+    index = index_packages(CalfLoaderConfig([str(tmp_path)]))
+    assert sorted(index) == ["core", "util"]
+    assert sorted(index["core"]) == ["1.0.0", "1.10.0"]
+    assert set(index["core"]["1.10.0"].metadata["symbols"]) == {"inc", "more"}
+
+
+def test_index_packages_skips_stray_files(tmp_path):
+    make_packages(tmp_path)
+    (tmp_path / "README").write_text("Packages")
+    (tmp_path / "core" / ".DS_Store").write_bytes(b"")
+    index = index_packages(CalfLoaderConfig([str(tmp_path)]))
+    assert sorted(index) == ["core", "util"]
+    assert sorted(index["core"]) == ["1.0.0", "1.10.0"]
+
+
+def test_loader_is_lazy(tmp_path):
+    make_packages(tmp_path)
+    loader = CalfLoader(CalfLoaderConfig([str(tmp_path)]), ["core", "util@0.1"])
+
+    assert loader.env["core"].version == "1.10.0"
+    assert all(isinstance(p, CalfDelayedPackage) for p in loader.env.values())
+
+    definition = loader.resolve(Symbol.of("helper"))
+    assert definition[:2] == [Symbol.of("defn"), Symbol.of("helper")]
+    assert isinstance(loader.env["util"], CalfPackage)
+    assert isinstance(loader.env["core"], CalfDelayedPackage)
+
+    assert loader.resolve(Symbol.of("more", "core"))[2] == 3
+    assert isinstance(loader.env["core"], CalfPackage)
+    assert loader.resolve(Symbol.of("missing")) is None
@@ -2,6 +2,11 @@
 Tests of calf.parser
 """
 
+import contextlib
+import inspect
+import itertools
+
+from calf import profiling
 import calf.parser as cp
 from conftest import parametrize
 
@@ -22,6 +27,18 @@ def test_bad_strings_raise(text):
         next(cp.parse_buffer(text))
 
 
+def test_parse_stream_is_lazy():
+    """Errors are raised as the forms are read, not when parsing starts, whether or not profiling."""
+
+    for profile in (contextlib.nullcontext(), profiling.profile()):
+        with profile:
+            forms = cp.parse_stream(cp.lex_buffer("foo )"))
+            assert inspect.isgenerator(forms)
+            assert next(forms).value == "foo"
+            with pytest.raises(cp.CalfUnexpectedCloseParseError):
+                next(forms)
+
+
 @parametrize("text", [
     "[1.0",
     "(1.0",
@@ -54,10 +71,45 @@ def test_unbalanced_raises(text):
     ('"foo\\"bar\\""', "foo\"bar\""),
     ('"""foo"""', 'foo'),
     ('"""foo"bar"baz"""', 'foo"bar"baz'),
+    ('"λ ☃ \U0001F600"', "λ ☃ \U0001F600"),
+    ('"λ\\t\\u00e9\\N{SNOWMAN}\\x41\\101\\\n"', "λ\té☃AA"),
+    ('"\\q\\λ\\777"', "\\q\\λ\u01ff"),
+    ('"""λ\\n"""', "λ\n"),
 ])
 def test_strings_round_trip(buff, value):
     assert next(cp.parse_buffer(buff)) == value
 
+
+@parametrize("buff", [
+    '"\\x4"',
+    '"\\u12"',
+    '"\\U00110000"',
+    '"\\N{NO SUCH NAME}"',
+    '"\\N"',
+])
+def test_bad_escapes_raise(buff):
+    with pytest.raises(ValueError):
+        cp.decode_str(buff)
+
+
+def test_decode_str_slice():
+    """Decodes a token within a larger buffer, returning the text as it is if it has no escapes."""
+
+    assert cp.decode_str('(a "λ b")', 3, 8) == "λ b"
+    assert cp.decode_str('("""x\\ty""")', 1, 11) == "x\ty"
+
+
+@parametrize("body", [
+    "a\\tb\\nc\\x41\\101\\u00e9\\N{SNOWMAN}",
+    'λ\\tλ\\nλ\\rλ\\\\λ\\"',
+    "\\q\\λ\\777\\t\\t\\t",
+])
+def test_decode_many_escapes(body):
+    """Strings with many escapes decode as they would one escape at a time."""
+
+    assert cp.decode_str('"%s"' % body) == cp._unescape(body, 0, len(body))
+
+
 @parametrize('text, element_types', [
     # Integers
     ("(1)", ["INTEGER"]),
@@ -217,3 +269,225 @@ def test_examples(text):
     """Shotgun examples showing we can parse some stuff."""
 
     assert list(cp.parse_buffer(text))
+
+
+@parametrize("text", [
+    "(1 1.1 1e2 -2 foo :foo foo/bar :foo/bar [{},])",
+    "; comment\n{:foo bar, :baz [:qux]}\n'foo ^{} bar",
+])
+def test_parse_token_table(text):
+    """Parsing a TokenTable produces the same forms as parsing a token stream."""
+
+    from calf.lexer import lex_table
+
+    def summary(form):
+        if isinstance(form, list):
+            return (form.type, form.offset, form.line, [summary(f) for f in form])
+        return (form.type, form.offset, form.line, repr(form.value))
+
+    assert [summary(f) for f in cp.parse_stream(lex_table(text))] == \
+        [summary(f) for f in cp.parse_buffer(text)]
+
+
+def test_parse_deeply_nested():
+    """Nesting is not limited by Python's recursion limit."""
+
+    depth = 10000
+    l_t = next(cp.parse_buffer("[" * depth + "]" * depth))
+    for _ in range(depth - 1):
+        assert l_t.type == "SQLIST"
+        l_t, = l_t
+
+
+@parametrize("text", [
+    "^",
+    "^foo",
+    "#",
+    "#foo",
+    "'",
+    "['",
+])
+def test_unfinished_reader_macros_raise(text):
+    with pytest.raises(cp.CalfParseError):
+        next(cp.parse_buffer(text))
+
+
+PARALLEL_TEXT = """(defn foo [a b]
+  ; a comment
+  {:a a, :b b})
+^:meta [1 2.5 "three"] 'quoted
+#tag {"key" "value"} sym :kw
+""" * 10
+
+
+@parametrize("workers", [1, 2])
+def test_parse_parallel(workers):
+    """Parallel parsing produces the same forms and positions as serial parsing."""
+
+    def summary(form):
+        if isinstance(form, list):
+            children = [summary(f) for f in form]
+        elif isinstance(form, dict):
+            children = [[summary(k), summary(v)] for k, v in form.value]
+        elif form.type in ("META", "MACRO_DISPATCH", "SINGLE_QUOTE"):
+            children = repr(form.value)
+        else:
+            children = str(form)
+        return (form.type, form.offset, form.line, form.column, children)
+
+    assert [summary(f) for f in cp.parse_parallel(PARALLEL_TEXT, workers=workers)] == \
+        [summary(f) for f in cp.parse_buffer(PARALLEL_TEXT)]
+
+
+@parametrize("workers", [1, 2])
+def test_parse_parallel_errors(workers):
+    with pytest.raises(cp.CalfMissingCloseParseError) as e:
+        list(cp.parse_parallel(PARALLEL_TEXT + "\n  [oops", workers=workers))
+    assert e.value.token.line == PARALLEL_TEXT.count("\n") + 2
+    assert e.value.token.column == 2
+
+
+def test_forms_pickle():
+    import pickle
+
+    text = "(defn foo [a b] ^:m {:a 1, :b \"c\"} #t 2.5 'q)"
+    forms = list(cp.parse_buffer(text))
+    assert repr(pickle.loads(pickle.dumps(forms))) == repr(forms)
+
+
+def test_parse_events():
+    events = list(cp.parse_events(cp.lex_buffer("(a [1 {:b 'c}] ^m #t x)")))
+    assert [(e.kind, e.token.value, e.depth, e.offset) for e in events] == [
+        ("start_list", "(", 0, 0),
+        ("atom", "a", 1, 1),
+        ("start_list", "[", 1, 3),
+        ("atom", "1", 2, 4),
+        ("start_map", "{", 2, 6),
+        ("atom", ":b", 3, 7),
+        ("quote", "'", 3, 10),
+        ("atom", "c", 3, 11),
+        ("end_map", "}", 2, 12),
+        ("end_list", "]", 1, 13),
+        ("meta", "^", 1, 15),
+        ("atom", "m", 1, 16),
+        ("dispatch", "#", 1, 18),
+        ("atom", "t", 1, 19),
+        ("atom", "x", 1, 21),
+        ("end_list", ")", 0, 22),
+    ]
+
+
+def test_parse_events_lazy():
+    def tokens():
+        yield from cp.lex_buffer("[1 2 3")
+        raise AssertionError("Read too far")
+
+    events = cp.parse_events(tokens())
+    assert [e.kind for e in itertools.islice(events, 3)] == ["start_list", "atom", "atom"]
+
+
+@parametrize("text", [
+    "(foo]",
+    "[1 2",
+    "{1}",
+    "^foo",
+    "#",
+    "(')",
+])
+def test_parse_events_errors(text):
+    with pytest.raises(Exception) as expected:
+        list(cp.parse_buffer(text))
+
+    with pytest.raises(expected.type) as actual:
+        list(cp.parse_events(cp.lex_buffer(text)))
+
+    assert str(actual.value) == str(expected.value)
+
+
+def test_kept_whitespace_isnt_an_operand():
+    """Whitespace and comments are kept in maps and macros, but aren't their elements or operands."""
+    d, _, m = cp.parse_buffer("{:a 1, :b ; c\n 2} ^ :m x",
+                              discard_whitespace=False,
+                              discard_comments=False)
+    assert {str(k): int(v) for k, v in d.items()} == {":a": 1, ":b": 2}
+    assert [t.type for t in d.elements][:4] == ["KEYWORD", "WHITESPACE", "INTEGER", "WHITESPACE"]
+
+    assert m.type == "META"
+    assert m.meta.value == ":m"
+    assert m.value.value == "x"
+    assert [t.type for t in m.elements] == ["WHITESPACE", "KEYWORD", "WHITESPACE", "SYMBOL"]
+
+
+def test_discarded_whitespace_keeps_no_elements():
+    d, m = cp.parse_buffer("{:a 1, :b 2} ^:m x")
+    assert getattr(d, "elements", None) is None
+    assert getattr(m, "elements", None) is None
+
+
+def _push(parser, chunks):
+    forms = []
+    for chunk in chunks:
+        forms.extend(parser.feed(chunk))
+    return forms + parser.close()
+
+
+@parametrize("size", [1, 2, 5, 64])
+@parametrize("encode", [False, True])
+def test_push_parser_chunks(size, encode):
+    """Feeding chunks of any size parses as parsing the whole buffer does."""
+
+    text = '(defn f [a] ^:m {:a "λ ☃", :b 1.5e3}) #t x \'q """triple"""\n12345678901234567890 ; c\n'
+    data = text.encode("utf-8") if encode else text
+    for whitespace in [True, False]:
+        forms = _push(cp.CalfPushParser("<Buffer>", discard_whitespace=whitespace, discard_comments=whitespace),
+                      [data[i:i + size] for i in range(0, len(data), size)])
+        assert repr(forms) == repr(list(cp.parse_buffer(text, discard_whitespace=whitespace,
+                                                        discard_comments=whitespace)))
+
+
+def test_push_parser_returns_forms_as_they_complete():
+    parser = cp.CalfPushParser()
+    assert parser.feed("(a [b") == []
+    assert [f.type for f in parser.feed("]) [c] (d")] == ["LIST", "SQLIST"]
+    assert parser.feed(") e") != []
+    assert [f.value for f in parser.close()] == ["e"]
+
+
+@parametrize("text", [
+    "(foo]",
+    "[1 2",
+    "{1}",
+    "^foo",
+    "#",
+    "(')",
+])
+def test_push_parser_errors(text):
+    with pytest.raises(Exception) as expected:
+        list(cp.parse_buffer(text))
+
+    with pytest.raises(expected.type) as actual:
+        _push(cp.CalfPushParser("<Buffer>"), text)
+
+    assert str(actual.value) == str(expected.value)
+
+
+def test_push_parser_error_after_forms():
+    """Forms completed before an error are returned, and the error raised by the next call."""
+
+    parser = cp.CalfPushParser()
+    assert [f.value for f in parser.feed("a b ) c")] == ["a", "b"]
+    with pytest.raises(cp.CalfUnexpectedCloseParseError):
+        parser.feed("d")
+
+
+def test_push_parser_error_is_kept():
+    """An error raised before any form completes is raised again by every later call."""
+
+    parser = cp.CalfPushParser()
+    with pytest.raises(cp.CalfUnexpectedCloseParseError) as e:
+        parser.feed("(a ] ")
+
+    for call in (lambda: parser.feed(") b "), parser.close):
+        with pytest.raises(cp.CalfUnexpectedCloseParseError) as again:
+            call()
+        assert again.value is e.value
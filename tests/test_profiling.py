@@ -0,0 +1,62 @@
+"""
+Tests of calf.profiling
+"""
+
+import io
+import json
+
+from calf import profiling
+from calf.lexer import CalfLexer, lex_buffer
+from calf.parser import parse_buffer
+from calf.reader import read_buffer
+
+
+def test_disabled_by_default():
+    assert profiling.ACTIVE is None
+    assert not isinstance(lex_buffer("foo"), profiling.Stage)
+
+
+def test_profile_read_buffer():
+    with profiling.profile() as p:
+        forms = list(read_buffer("(foo [1 2 {:a \"b\"}]) ; hi\n'x", "example"))
+
+    assert profiling.ACTIVE is None
+    assert len(forms) == 2
+
+    stats = p.stats("example")
+    assert stats.tokens["INTEGER"] == 2
+    assert stats.tokens["COMMENT"] == 1
+    assert sum(stats.tokens.values()) == stats.objects["lex"] == 19
+    assert stats.objects["parse"] == 2
+    assert stats.max_depth == 3
+    assert stats.regex_calls > 0
+    assert set(stats.seconds) == {"lex", "parse", "read"}
+    assert all(s >= 0 for s in stats.seconds.values())
+
+
+def test_profile_per_source():
+    with profiling.profile() as p:
+        list(parse_buffer("((()))"))
+        list(CalfLexer(io.StringIO("a b"), "stream"))
+
+    assert set(p.sources) == {"<Buffer>", "stream"}
+    assert p.stats("<Buffer>").max_depth == 3
+    assert p.stats("stream").tokens == {"SYMBOL": 2, "WHITESPACE": 1}
+
+    dumped = io.StringIO()
+    p.dump(dumped)
+    assert json.loads(dumped.getvalue())["stream"]["objects"] == {"lex": 3}
+
+    report = io.StringIO()
+    p.report(report)
+    assert "stream" in report.getvalue()
+
+
+def test_profile_errors():
+    with profiling.profile() as p:
+        try:
+            list(parse_buffer("(foo]"))
+        except Exception:
+            pass
+
+    assert p.stats("<Buffer>").objects["parse"] == 0
@@ -1,9 +1,26 @@
 """
 """
 
+import asyncio
+import sys
+
 from conftest import parametrize
 
-from calf.reader import read_buffer
+import pytest
+
+from calf.parser import CalfParseError, parse_buffer
+from calf.reader import (
+    CalfInterningReader,
+    CalfReader,
+    InternTable,
+    aread,
+    read_buffer,
+    read_file_values,
+    read_files,
+    read_values,
+)
+from calf.token import CalfStrToken
+from calf.types import Symbol, Vector
 
 @parametrize('text', [
     "()",
@@ -20,3 +37,248 @@ from calf.reader import read_buffer
 ])
 def test_read(text):
     assert list(read_buffer(text))
+
+
+@parametrize('workers', [1, 2])
+def test_read_files(tmp_path, workers):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f"{i}.calf"
+        path.write_text(f"[{i} foo]\n  {{:a {i}}}" if i != 3 else "[3 oops")
+        paths.append(str(path))
+
+    results = list(read_files(paths, workers=workers, offsets=True))
+    assert [r.path for r in results] == paths
+
+    for i, r in enumerate(results):
+        if i == 3:
+            assert r.error.startswith("CalfMissingCloseParseError")
+            assert r.forms == []
+        else:
+            assert r.error is None
+            assert r.forms == list(read_buffer(f"[{i} foo] {{:a {i}}}"))
+            assert r.offsets == [0, 10]
+
+
+def test_interning_reader():
+    reader = CalfInterningReader()
+    a, b = list(read_buffer("[foo :bar ns/foo 'x]\n[foo :bar ns/foo 'x]", reader=reader))
+    assert a == b
+    assert all(x is y for x, y in zip(a[:3], b[:3]))
+    assert a[3][1] is b[3][1]
+    assert a[3][0] is reader.symbols("quote")
+    assert reader.stats() == {
+        "symbols": {"hits": 5, "misses": 4, "size": 4},
+        "keywords": {"hits": 1, "misses": 1, "size": 1},
+    }
+
+
+def test_intern_table_bounded():
+    table = InternTable(Symbol, limit=2)
+    a = table("a")
+    table("b")
+    assert table("a") is a
+    table("c")  # Evicts b, the least recently used
+    assert len(table) == 2
+    assert table("a") is a
+    assert table.stats() == {"hits": 2, "misses": 3, "size": 2}
+    table("b")
+    assert table.misses == 4
+
+
+def test_read_deep():
+    depth = 50000
+    form, = read_buffer("(" * depth + "x" + ")" * depth)
+    for _ in range(depth):
+        form, = form
+    assert form == Symbol.of("x")
+
+
+def test_read_deep_reader_macros():
+    depth = 50000
+    form, = read_buffer("'^:m " * depth + "x")
+    for _ in range(depth):
+        assert form[0] == Symbol.of("quote")
+        form = form[1]
+    assert form == Symbol.of("x")
+
+
+def test_reader_keeps_no_cycles():
+    reader = CalfReader()
+    assert list(read_buffer("(a 'b [1 2.5])", reader=reader))
+    assert sys.getrefcount(reader) == 2
+
+
+def test_reader_hooks():
+    class Reader(CalfReader):
+        def handle_integer(self, t):
+            return -int(t)
+
+        def handle_dict(self, t, values):
+            return values
+
+        def handle_quote(self, t):
+            return ("quoted", self.read1(t.value))
+
+    assert list(read_buffer("[1 {2 3} '1.5]", reader=Reader())) == [[-1, [-2, -3], ("quoted", 1.5)]]
+
+
+def test_reader_instance_hooks():
+    reader = CalfReader()
+    reader.handle_integer = lambda t: -int(t)
+    assert list(read_buffer("[1 2.5]", reader=reader)) == [[-1, 2.5]]
+
+    # Other readers aren't affected
+    assert list(read_buffer("[1 2.5]", reader=CalfReader())) == [[1, 2.5]]
+
+
+def test_reader_subclassed_tokens():
+    class Token(CalfStrToken):
+        pass
+
+    token, = parse_buffer('"foo"')
+    assert CalfReader().read1(Token(token, "bar")) == "bar"
+
+    with pytest.raises(ValueError):
+        CalfReader().read1(object())
+
+
+@parametrize('text', [
+    "()",
+    "[[[[[[[[[]]]]]]]]]",
+    "{1 {2 {}}}",
+    '"foo" """bar"""',
+    "foo ns/bar :baz :ns/qux",
+    "'foo",
+    "^foo bar ^:foo [1 2.5 -3 1e3]",
+    "{\"foo\" '([:bar ^:foo 'baz 3.14159e0])} ; comment",
+])
+def test_read_values(text):
+    assert list(read_values(text)) == list(read_buffer(text))
+
+
+@parametrize('text', [
+    "(foo]",
+    "{1 2",
+    "'",
+    "^foo",
+    "{1}",
+    '"foo',
+    "(') )",
+])
+def test_read_values_errors(text):
+    with pytest.raises(Exception) as expected:
+        list(read_buffer(text))
+
+    with pytest.raises(expected.type) as actual:
+        list(read_values(text))
+
+    assert str(actual.value) == str(expected.value)
+
+
+def test_read_values_improper_dict():
+    with pytest.raises(CalfParseError) as e:
+        list(read_values("[]\n  {1 2 3}"))
+
+    assert e.value.token.type == "BRACE_LEFT"
+    assert e.value.token.start_position == 5
+    assert str(e.value) == "Parse error at '<Buffer>'@2:2: Improper dict!"
+
+
+def test_read_values_dispatch():
+    with pytest.raises(CalfParseError):
+        list(read_values("#foo bar"))
+
+    assert list(read_values("#foo [bar]", dispatch=lambda tag, value: (tag, value))) == [
+        (Symbol.of("foo"), [Symbol.of("bar")])
+    ]
+
+
+def test_read_file_values(tmp_path):
+    path = tmp_path / "example.calf"
+    path.write_text("(foo :bar) [1 2.5 \"three\"]")
+    assert list(read_file_values(str(path))) == list(read_buffer(path.read_text()))
+
+
+async def _aread_chunks(chunks, **kwargs):
+    stream = asyncio.StreamReader()
+    for chunk in chunks:
+        stream.feed_data(chunk)
+    stream.feed_eof()
+    return [form async for form in aread(stream, **kwargs)]
+
+
+@parametrize("size", [1, 2, 5, 1 << 16])
+def test_aread(size):
+    text = '(foo [1 2.5] {:a "snow \u2603"}) ; comment\n\'x ^:m y ^^a b c d """str"""\nbar'
+    data = text.encode("utf-8")
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+    assert asyncio.run(_aread_chunks(chunks)) == list(read_buffer(text))
+
+
+@parametrize("text", ["(foo", "(foo]", "foo ^:m", "{1}"])
+def test_aread_errors(text):
+    with pytest.raises(Exception) as expected:
+        list(read_buffer(text, "<Stream>"))
+
+    with pytest.raises(expected.type) as actual:
+        asyncio.run(_aread_chunks([text.encode()]))
+
+    assert str(actual.value) == str(expected.value)
+
+
+def test_aread_yields_forms_as_they_balance():
+    async def main():
+        stream = asyncio.StreamReader()
+        forms = aread(stream)
+
+        stream.feed_data(b"(foo b")
+        pending = asyncio.ensure_future(forms.__anext__())
+        await asyncio.sleep(0)
+        assert not pending.done()
+
+        stream.feed_data(b"ar) baz")
+        assert await pending == Vector.of([Symbol.of("foo"), Symbol.of("bar")])
+
+        # baz may yet continue
+        pending = asyncio.ensure_future(forms.__anext__())
+        await asyncio.sleep(0)
+        assert not pending.done()
+
+        stream.feed_eof()
+        assert await pending == Symbol.of("baz")
+
+    asyncio.run(main())
+
+
+def test_aread_raises_without_waiting():
+    async def main():
+        stream = asyncio.StreamReader()
+        forms = aread(stream)
+
+        stream.feed_data(b"a ) b")
+        assert await forms.__anext__() == Symbol.of("a")
+        with pytest.raises(CalfParseError):
+            await forms.__anext__()
+
+    asyncio.run(main())
+
+
+def test_aread_concurrent():
+    async def client(i):
+        stream = asyncio.StreamReader()
+        reading = asyncio.ensure_future(_collect(stream))
+        for token in f"(client {i})\n[1 2 3]".split(" "):
+            stream.feed_data(token.encode() + b" ")
+            await asyncio.sleep(0)
+        stream.feed_eof()
+        return await reading
+
+    async def _collect(stream):
+        return [form async for form in aread(stream)]
+
+    async def main():
+        return await asyncio.gather(*[client(i) for i in range(500)])
+
+    results = asyncio.run(main())
+    assert results[42] == [Vector.of([Symbol.of("client"), 42]), Vector.of([1, 2, 3])]
@@ -0,0 +1,149 @@
+"""
+Tests of calf.scanner
+"""
+
+import random
+
+from calf.document import CalfDocument
+from calf.parser import (
+    CalfMissingCloseParseError,
+    CalfParseError,
+    CalfUnexpectedCloseParseError,
+    parse_buffer,
+)
+from calf.scanner import (
+    Span,
+    folding_ranges,
+    form_boundaries,
+    is_complete,
+    matching_delimiters,
+    scan,
+    split_forms,
+)
+from conftest import parametrize
+
+
+@parametrize("text, boundaries", [
+    ("(a b) [c]", [5, 9]),
+    ("foo :bar", [3, 8]),
+    ('"s)" ; c)\n x', [4, 12]),
+    ('"a\\")" b', [6, 8]),
+    ('"""x) y\n(z)', [7, 11]),
+    ("^{:m 1} [x] y", [11, 13]),
+    ("#tag {} 'q", [7, 10]),
+    ("'1x", [2, 3]),
+    ("(a)) b", [3]),
+    ("(a", []),
+])
+def test_form_boundaries(text, boundaries):
+    assert list(form_boundaries(text)) == boundaries
+
+
+def test_form_boundaries_are_form_ends():
+    """Every boundary found is the end of some top level form."""
+
+    rand = random.Random(0)
+    pieces = ["(", ")", "[", "]", "{", "}", "^", "#", "'", "a", " ", "1x", ":k",
+              '"s)"', ";c)\n", "\n", '"""t)\n', "x:y", '"a\\"b"', "-1.5e3"]
+
+    for _ in range(5000):
+        text = "".join(rand.choice(pieces) for _ in range(rand.randint(1, 12)))
+        try:
+            document = CalfDocument(text)
+        except Exception:
+            continue
+        ends = {s.base + w for s, w in zip(document.segments, document.widths)}
+        assert set(form_boundaries(text)) <= ends
+
+
+@parametrize("n", [1, 2, 3, 10])
+def test_split_forms(n):
+    text = "(a b) [c d] {:e f} g h" * 3
+    spans = split_forms(text, n)
+    assert 1 <= len(spans) <= n
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+
+
+@parametrize("text, forms", [
+    ("(a b) [c]", [(0, 5), (6, 9)]),
+    ("foo :bar", [(0, 3), (4, 8)]),
+    ('"s)" ; c)\n x', [(0, 4), (11, 12)]),
+    ('"""x) y\n(z)', [(0, 7), (8, 11)]),
+    ("^{:m 1} [x] y", [(0, 11), (12, 13)]),
+    ("#tag {} 'q", [(0, 7), (8, 10)]),
+    ("(')", []),
+    ("(') )", [(0, 5)]),
+])
+def test_scan_forms(text, forms):
+    assert scan(text).forms == [Span(*f) for f in forms]
+
+
+def test_scan_regions():
+    structure = scan('(a [b] ; c\n "d") (e')
+    assert structure.collections == [Span(0, 16), Span(3, 6), Span(17, None)]
+    assert structure.strings == [Span(12, 15)]
+    assert structure.comments == [Span(7, 10)]
+    assert structure.error is None
+
+
+def test_scan_stops_at_unbalanced_close():
+    structure = scan("(a]) (b)")
+    assert structure.error == 2
+    assert structure.complete
+    assert structure.forms == []
+
+
+@parametrize("text, complete", [
+    ("", True),
+    ("(a [b])", True),
+    ("(a [b]", False),
+    ("'", False),
+    ("#tag", False),
+    ("#tag x", True),
+    ('"abc', False),
+    ('"abc\\"', False),
+    ('"abc\\\\"', True),
+    ('"""abc', False),
+    ('"""abc\n', True),
+    ("(a ; )\n", False),
+    ("(a))", True),
+])
+def test_is_complete(text, complete):
+    assert is_complete(text) == complete
+
+
+def test_is_complete_agrees_with_parser():
+    """Text is incomplete exactly when parsing it fails for want of more text."""
+
+    rand = random.Random(0)
+    pieces = ["(", ")", "[", "]", "^", "#", "'", " a", " ", " :k",
+              ' "s)"', ";c)\n", "\n", ' "a\\"b"', " -1.5e3", ' "x']
+
+    for _ in range(5000):
+        text = "".join(rand.choice(pieces) for _ in range(rand.randint(1, 12)))
+        try:
+            forms = list(parse_buffer(text))
+        except (CalfMissingCloseParseError, ValueError) as e:
+            if isinstance(e, CalfMissingCloseParseError) or "Unterminated quote" in str(e):
+                assert not is_complete(text)
+            continue
+        except CalfUnexpectedCloseParseError:
+            assert scan(text).error is not None
+            continue
+        except CalfParseError:
+            assert not is_complete(text)
+            continue
+
+        structure = scan(text)
+        assert structure.complete
+        assert [f.start for f in structure.forms] == [f.offset for f in forms]
+
+
+def test_matching_delimiters():
+    assert matching_delimiters('(a [b] "(" {c}) (') == {0: 14, 14: 0, 3: 5, 5: 3, 11: 13, 13: 11}
+
+
+def test_folding_ranges():
+    text = "; a\n; b\n(defn f\n  [x]\n  \"doc\nstring\")\n; c\n(g)\n"
+    assert folding_ranges(text) == [(1, 2), (3, 6), (5, 6)]